@@ -0,0 +1,127 @@
+"""
+文章正文去重基准测试
+
+模拟一批真实访问：同一篇公开文章通过带不同追踪参数的分享链接（scene、chksm、#rd 等）
+和长链接多次获取，部分素材文章以不同 media_id 重复发布。对比旧存储方式（按原始链接分别缓存，
+每个条目保存完整正文）与内容寻址存储（链接规范化 + 正文按哈希只存一份）的内存和磁盘占用。
+
+使用方法:
+    python scripts/benchmark_article_dedup.py [文章数]
+"""
+
+import sys
+import random
+import asyncio
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src" / "mcp_server_wechat"))
+
+from utils.cache import CacheManager  # noqa: E402
+from utils.search_client import canonical_article_url  # noqa: E402
+
+SENTENCES = [
+    "微信公众平台是给个人、企业和组织提供业务服务与用户管理能力的全新服务平台。",
+    "开发者可以通过接口获取素材列表、图文内容和账号信息。",
+    "缓存命中率直接决定了接口调用次数和响应延迟。",
+    "在高并发场景下，合并相同请求可以显著降低上游压力。",
+    "文章正文通常占据缓存空间的绝大部分。",
+]
+
+SHARE_SUFFIXES = [
+    "?scene=1",
+    "?chksm=9c1f{n:04x}ab&scene=21#wechat_redirect",
+    "?from=timeline&isappinstalled=0#rd",
+]
+
+
+def build_corpus(count: int) -> tuple:
+    """生成公开文章访问记录和素材文章，返回 (公开文章访问, 素材文章)"""
+    rng = random.Random(42)
+    public_fetches = []
+    for n in range(count):
+        text = "\n".join(rng.choice(SENTENCES) for _ in range(rng.randint(80, 300)))
+        short_url = f"https://mp.weixin.qq.com/s/Art{n:06d}xYz"
+        long_url = f"https://mp.weixin.qq.com/s?__biz=MzA{n:05d}==&mid={2650000000 + n}&idx=1&sn={n:032x}"
+        article = {"title": f"文章 {n}", "author": "示例作者", "publish_time": "2024-01-01",
+                   "content": text, "images": [], "word_count": len(text)}
+        # 每篇文章通过多个分享链接访问，约三分之一还通过长链接访问
+        urls = [short_url + suffix.format(n=n) for suffix in SHARE_SUFFIXES]
+        if n % 3 == 0:
+            urls += [long_url, long_url + "&chksm=abcd&scene=27"]
+        public_fetches += [(url, article) for url in urls]
+
+    materials = []
+    for n in range(count // 2):
+        html = "".join(f"<p><span>{rng.choice(SENTENCES)}</span></p>" for _ in range(rng.randint(80, 300)))
+        article = {"title": f"素材 {n}", "author": "示例作者", "digest": "摘要", "content": html,
+                   "url": f"https://mp.weixin.qq.com/s/Mat{n:06d}", "thumb_media_id": f"thumb_{n}"}
+        # 约四分之一的素材以新的 media_id 重复发布
+        copies = 2 if n % 4 == 0 else 1
+        materials += [(f"media_{n:05d}_{copy}", {**article, "media_id": f"media_{n:05d}_{copy}"})
+                      for copy in range(copies)]
+    return public_fetches, materials
+
+
+def measure(cache_dir: str, public_fetches: list, materials: list, dedup: bool) -> dict:
+    """写入全部访问记录，返回内存和磁盘占用"""
+    cache = CacheManager(cache_dir)
+    cache.memory_budget = 1 << 40  # 不淘汰，统计完整的内存占用
+    bodies = ("content",) if dedup else ()
+
+    for url, article in public_fetches:
+        key_url = canonical_article_url(url) if dedup else url
+        cache.set("public_article", {**article, "url": key_url}, ttl=86400, tags=("public_article",),
+                  bodies=bodies, url=key_url)
+    for media_id, article in materials:
+        cache.set("article_content", article, ttl=86400, stale_ttl=7 * 86400, tags=("material",),
+                  bodies=bodies, media_id=media_id)
+
+    # 读取校验：每个访问链接都能取回完整正文
+    async def verify() -> None:
+        for url, article in public_fetches:
+            key_url = canonical_article_url(url) if dedup else url
+            assert (await cache.aget("public_article", url=key_url))["content"] == article["content"]
+        for media_id, article in materials:
+            assert (await cache.aget("article_content", media_id=media_id))["content"] == article["content"]
+
+    asyncio.run(verify())
+
+    conn = cache.conn
+    rows = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+    payload = conn.execute("SELECT SUM(LENGTH(data)) FROM entries").fetchone()[0]
+    conn.execute("VACUUM")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return {
+        "memory_entries": len(cache.memory_cache),
+        "memory_bytes": cache.memory_bytes,
+        "disk_rows": rows,
+        "disk_payload": payload,
+        "db_file": cache.db_path.stat().st_size,
+    }
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    public_fetches, materials = build_corpus(count)
+    canonical = {canonical_article_url(url) for url, _ in public_fetches}
+    print(f"公开文章: {count} 篇  访问链接: {len(public_fetches)}  规范化后: {len(canonical)}  "
+          f"素材条目: {len(materials)}")
+
+    results = {}
+    for name, dedup in (("按原始链接存储", False), ("内容寻址存储", True)):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            results[name] = measure(cache_dir, public_fetches, materials, dedup)
+
+    print(f"{'':<16}{'内存条目':>10}{'内存占用':>14}{'磁盘条目':>10}{'条目数据':>14}{'数据库文件':>14}")
+    for name, r in results.items():
+        print(f"{name:<14}{r['memory_entries']:>12}{r['memory_bytes'] / 1024:>12.1f} KiB"
+              f"{r['disk_rows']:>12}{r['disk_payload'] / 1024:>12.1f} KiB{r['db_file'] / 1024:>12.1f} KiB")
+
+    before, after = results.values()
+    print(f"内存占用减少 {1 - after['memory_bytes'] / before['memory_bytes']:.1%}，"
+          f"数据库文件减少 {1 - after['db_file'] / before['db_file']:.1%}")
+
+
+if __name__ == "__main__":
+    main()
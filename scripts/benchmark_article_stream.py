@@ -0,0 +1,102 @@
+"""
+文章页流式下载基准测试
+
+真实的微信文章页在正文之后还有大段内联脚本（数百 KB 到数 MB）。本脚本在 scripts/fixtures/html 中的文章页
+正文之后插入指定大小的内联脚本，通过 httpx.MockTransport 按块返回（带 Content-Length），对比：
+
+- 完整下载：读取整个响应后用 extract_article 解析（改动前的行为）
+- 流式下载：SogouWeChatSearchClient._read_article 边下载边解析，正文闭合后停止读取
+
+报告下载字节数、节省的字节数、内存峰值（tracemalloc）和耗时，并校验两种方式的提取结果一致。
+
+使用方法:
+    python scripts/benchmark_article_stream.py [正文后脚本大小 KiB]
+
+提取结果不一致时以非零状态退出。
+"""
+
+import sys
+import time
+import asyncio
+import tracemalloc
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src" / "mcp_server_wechat"))
+
+from utils.html_extract import extract_article  # noqa: E402
+from utils.search_client import SogouWeChatSearchClient  # noqa: E402
+
+FIXTURE_DIR = Path(__file__).resolve().parent / "fixtures" / "html"
+ARTICLE_URL = "https://mp.weixin.qq.com/s/fixture"
+CHUNK_SIZE = 16 * 1024
+
+
+def pad_page(html: str, trailing_kib: int) -> bytes:
+    """在 </body> 前插入内联脚本，模拟正文之后的大段脚本"""
+    script = "<script>var __data = '" + "x" * (trailing_kib * 1024) + "';</script>"
+    head, sep, tail = html.rpartition("</body>")
+    return ((head + script + sep + tail) if sep else html + script).encode("utf-8")
+
+
+def transport_for(page: bytes, sent: list) -> httpx.MockTransport:
+    """按块返回页面的模拟传输层，记录实际发送的字节数"""
+    async def body():
+        for i in range(0, len(page), CHUNK_SIZE):
+            chunk = page[i:i + CHUNK_SIZE]
+            sent[0] += len(chunk)
+            yield chunk
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        headers = {"content-type": "text/html; charset=utf-8", "content-length": str(len(page))}
+        return httpx.Response(200, headers=headers, content=body())
+
+    return httpx.MockTransport(handler)
+
+
+async def measure(page: bytes, read) -> dict:
+    """下载并解析一次，返回结果、发送字节数、内存峰值和耗时"""
+    sent = [0]
+    async with httpx.AsyncClient(transport=transport_for(page, sent)) as client:
+        tracemalloc.start()
+        start = time.perf_counter()
+        async with client.stream("GET", ARTICLE_URL) as response:
+            result = await read(response)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {"result": result, "sent": sent[0], "peak": peak, "elapsed": elapsed}
+
+
+async def read_full(response: httpx.Response) -> dict:
+    """改动前的行为：读取完整响应后解析"""
+    await response.aread()
+    return extract_article(response.text, ARTICLE_URL)
+
+
+async def main():
+    trailing_kib = int(sys.argv[1]) if len(sys.argv) > 1 else 1024
+    client = SogouWeChatSearchClient()
+    failures = 0
+
+    print(f"正文后脚本: {trailing_kib} KiB  分块: {CHUNK_SIZE // 1024} KiB")
+    print(f"{'fixture':<22}{'页面':>10}{'完整下载':>12}{'流式下载':>12}{'内存峰值':>20}{'耗时':>20}  一致性")
+    for path in sorted(FIXTURE_DIR.glob("article_*.html")):
+        page = pad_page(path.read_text(encoding="utf-8"), trailing_kib)
+        full = await measure(page, read_full)
+        stream = await measure(page, lambda response: client._read_article(response, ARTICLE_URL))
+        same = full["result"] == stream["result"]
+        failures += not same
+        print(f"{path.name:<22}{len(page) / 1024:>7.0f} KiB{full['sent'] / 1024:>8.0f} KiB{stream['sent'] / 1024:>8.0f} KiB"
+              f"{full['peak'] / 1024:>9.0f} → {stream['peak'] / 1024:>5.0f} KiB"
+              f"{full['elapsed'] * 1000:>9.1f} → {stream['elapsed'] * 1000:>5.1f} ms  {'✓' if same else '✗'}")
+
+    stats = client.get_download_stats()
+    print(f"\n流式下载 {stats['downloads']} 次，提前停止 {stats['early_stops']} 次，达到上限 {stats['capped']} 次，"
+          f"读取 {stats['bytes_read']} 字节，节省 {stats['bytes_saved']} 字节")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
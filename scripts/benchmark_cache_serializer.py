@@ -0,0 +1,135 @@
+"""
+缓存序列化基准测试
+
+对比旧格式（缩进 JSON 文本）与各序列化方式的磁盘占用和编解码耗时。
+
+使用方法:
+    python scripts/benchmark_cache_serializer.py [cache.db 路径] [轮数]
+
+默认读取 .cache/cache.db 中已缓存的条目（文章内容、搜索结果等真实数据）；
+数据库不存在或为空时，由 scripts/fixtures/html 中的真实页面构造缓存条目。
+"""
+
+import sys
+import json
+import time
+import sqlite3
+import statistics
+from pathlib import Path
+
+from lxml import etree
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src" / "mcp_server_wechat"))
+
+from utils.api_client import _build_content_article  # noqa: E402
+from utils.html_extract import extract_account_results, extract_article, extract_search_results, parse_html  # noqa: E402
+from utils.serializer import CacheSerializer, msgpack, zstandard  # noqa: E402
+
+DEFAULT_DB = ".cache/cache.db"
+FIXTURE_DIR = Path(__file__).resolve().parent / "fixtures" / "html"
+ARTICLE_URL = "https://mp.weixin.qq.com/s/fixture"
+
+
+def load_payloads(db_path: str) -> list:
+    """读取缓存数据库中的全部条目"""
+    if not Path(db_path).exists():
+        return []
+    serializer = CacheSerializer()
+    conn = sqlite3.connect(db_path)
+    payloads = []
+    for (data,) in conn.execute("SELECT data FROM entries"):
+        try:
+            payloads.append(serializer.decode(data)[0])
+        except ValueError:
+            continue
+    conn.close()
+    return payloads
+
+
+def content_html(html: str) -> str:
+    """文章页中正文 div（rich_media_content）的 HTML，即素材接口返回的 content 字段"""
+    root = parse_html(html)
+    if root is None:
+        return ""
+    divs = root.xpath('//div[contains(concat(" ", normalize-space(@class), " "), " rich_media_content ")]')
+    return etree.tostring(divs[0], encoding="unicode", method="html") if divs else ""
+
+
+def sample_payloads() -> list:
+    """由 fixture 页面构造缓存条目：公开文章（public_article）、素材文章（article_content，HTML 正文）和搜索结果"""
+    payloads = []
+    for path in sorted(FIXTURE_DIR.glob("article_*.html")):
+        html = path.read_text(encoding="utf-8")
+        article = extract_article(html, ARTICLE_URL)
+        payloads.append(article)
+        content = content_html(html)
+        if content:  # 验证页没有正文
+            payloads.append(_build_content_article(path.stem, {
+                "title": article["title"],
+                "author": article["author"],
+                "content": content,
+                "url": ARTICLE_URL
+            }))
+    payloads.append(extract_search_results((FIXTURE_DIR / "sogou_articles.html").read_text(encoding="utf-8")))
+    payloads.append(extract_account_results((FIXTURE_DIR / "sogou_accounts.html").read_text(encoding="utf-8")))
+    return payloads
+
+
+def bench(name: str, encode, decode, payloads: list, rounds: int) -> None:
+    """打印磁盘占用和编解码耗时"""
+    encoded = [encode(p) for p in payloads]
+    size = sum(len(e) for e in encoded)
+
+    encode_times, decode_times = [], []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for p in payloads:
+            encode(p)
+        encode_times.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        for e in encoded:
+            decode(e)
+        decode_times.append((time.perf_counter() - start) * 1000)
+
+    print(f"{name:<16} {size / 1024:10.1f} KiB  "
+          f"编码 {statistics.median(encode_times):8.2f} ms  解码 {statistics.median(decode_times):8.2f} ms")
+
+
+def main():
+    db_path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_DB
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    payloads = load_payloads(db_path)
+    source = db_path
+    if not payloads:
+        payloads, source = sample_payloads(), "fixture 页面"
+
+    print(f"数据: {source}  条目: {len(payloads)}  轮数: {rounds}")
+    bench(
+        "旧格式(缩进JSON)",
+        lambda p: json.dumps(p, ensure_ascii=False, indent=2).encode("utf-8"),
+        lambda e: json.loads(e),
+        payloads, rounds
+    )
+
+    variants = [("json", "none"), ("json", "zlib")]
+    if zstandard is not None:
+        variants.append(("json", "zstd"))
+    if msgpack is not None:
+        variants += [("msgpack", "none"), ("msgpack", "zlib")]
+        if zstandard is not None:
+            variants.append(("msgpack", "zstd"))
+
+    for encoding, compression in variants:
+        serializer = CacheSerializer(encoding=encoding, compression=compression)
+        bench(
+            serializer.name,
+            lambda p, s=serializer: s.encode(p)[0],
+            lambda e, s=serializer: s.decode(e),
+            payloads, rounds
+        )
+
+
+if __name__ == "__main__":
+    main()
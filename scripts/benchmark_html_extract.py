@@ -0,0 +1,177 @@
+"""
+HTML 提取基准测试与一致性校验
+
+在 scripts/fixtures/html 下的搜狗搜索结果页和微信文章页上，对比 utils/html_extract（lxml XPath）
+与原 BeautifulSoup 实现：逐字段校验提取结果一致，并报告每页解析耗时。
+
+fixture 按文件名前缀分类：sogou_articles* 为文章搜索结果，sogou_accounts* 为公众号搜索结果，
+article_* 为文章页。可放入真实抓取的页面扩充语料。
+
+使用方法:
+    python scripts/benchmark_html_extract.py [轮数]
+
+存在不一致时以非零状态退出。
+"""
+
+import re
+import sys
+import time
+import statistics
+from pathlib import Path
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src" / "mcp_server_wechat"))
+
+from utils.html_extract import extract_search_results, extract_account_results, extract_article  # noqa: E402
+
+FIXTURE_DIR = Path(__file__).resolve().parent / "fixtures" / "html"
+ARTICLE_URL = "https://mp.weixin.qq.com/s/fixture"
+
+
+# 原 BeautifulSoup 实现（SogouWeChatSearchClient 中被替换前的版本），作为一致性基准
+
+def bs4_search_results(html: str, limit=None) -> list:
+    soup = BeautifulSoup(html, 'lxml')
+    results = []
+    for item in soup.find_all('div', class_='news-box')[:limit]:
+        title_elem = item.find('h3')
+        if not title_elem:
+            continue
+        title_link = title_elem.find('a')
+        if not title_link:
+            continue
+        account_elem = item.find('a', class_='account')
+        digest_elem = item.find('p', class_='txt-info')
+        time_elem = item.find('span', class_='s2')
+        publish_time = time_elem.get_text(strip=True) if time_elem else ""
+        if publish_time:
+            publish_time = re.sub(r'[^\d\-\s:]', '', publish_time).strip()
+        results.append({
+            "title": title_link.get_text(strip=True),
+            "account": account_elem.get_text(strip=True) if account_elem else "未知公众号",
+            "url": title_link.get('href', ''),
+            "digest": digest_elem.get_text(strip=True) if digest_elem else "",
+            "publish_time": publish_time
+        })
+    return results
+
+
+def bs4_account_results(html: str, limit=None) -> list:
+    soup = BeautifulSoup(html, 'lxml')
+    results = []
+    for item in soup.find_all('div', class_='results')[:limit]:
+        name_elem = item.find('h3')
+        if not name_elem:
+            continue
+        name_link = name_elem.find('a')
+        if not name_link:
+            continue
+        desc_elem = item.find('dd')
+        results.append({
+            "name": name_link.get_text(strip=True),
+            "description": desc_elem.get_text(strip=True) if desc_elem else "",
+            "verified": bool(item.find('span', class_='sp-ico'))
+        })
+    return results
+
+
+def bs4_article(html: str, url: str) -> dict:
+    soup = BeautifulSoup(html, 'lxml')
+    title_elem = soup.find('h1', class_='rich_media_title')
+    author_elem = soup.find('a', class_='rich_media_meta_link')
+    time_elem = soup.find('em', id='publish_time')
+    content_elem = soup.find('div', class_='rich_media_content')
+    if content_elem:
+        for script in content_elem(["script", "style"]):
+            script.decompose()
+        content = content_elem.get_text(separator='\n', strip=True)
+        images = []
+        for img in content_elem.find_all('img'):
+            src = img.get('data-src') or img.get('src')
+            if src:
+                images.append(src)
+    else:
+        content = "无法获取文章内容"
+        images = []
+    word_count = len(content)
+    return {
+        "title": title_elem.get_text(strip=True) if title_elem else "无标题",
+        "author": author_elem.get_text(strip=True) if author_elem else "未知作者",
+        "publish_time": time_elem.get_text(strip=True) if time_elem else "",
+        "content": content,
+        "url": url,
+        "images": images,
+        "word_count": word_count,
+        "read_time_minutes": max(1, word_count // 300)
+    }
+
+
+PARSERS = {
+    "sogou_articles": (bs4_search_results, extract_search_results),
+    "sogou_accounts": (bs4_account_results, extract_account_results),
+    "article": (lambda html: bs4_article(html, ARTICLE_URL), lambda html: extract_article(html, ARTICLE_URL)),
+}
+
+
+def kind_of(path: Path) -> str:
+    """按文件名前缀判断页面类型"""
+    for kind in PARSERS:
+        if path.name.startswith(kind):
+            return kind
+    raise ValueError(f"无法识别的 fixture：{path.name}")
+
+
+def diff(expected, actual, path: str = "") -> list:
+    """列出两个提取结果之间不一致的字段"""
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        return [line for key in sorted(set(expected) | set(actual))
+                for line in diff(expected.get(key), actual.get(key), f"{path}.{key}")]
+    if isinstance(expected, list) and isinstance(actual, list) and len(expected) == len(actual):
+        return [line for i, (e, a) in enumerate(zip(expected, actual)) for line in diff(e, a, f"{path}[{i}]")]
+    return [] if expected == actual else [f"{path or '.'}: {expected!r:.80} != {actual!r:.80}"]
+
+
+def median_ms(func, html: str, rounds: int) -> float:
+    """多轮解析耗时的中位数（毫秒）"""
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func(html)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    fixtures = sorted(FIXTURE_DIR.glob("*.html"))
+    failures = 0
+
+    # 边界输入：空文档与空白文档
+    for kind, (reference, candidate) in PARSERS.items():
+        for html in ("", "   \n"):
+            mismatches = diff(reference(html), candidate(html))
+            if mismatches:
+                failures += 1
+                print(f"✗ {kind} 空文档 {html!r}: {mismatches[0]}")
+
+    print(f"{'fixture':<24}{'大小':>10}{'BeautifulSoup':>16}{'lxml XPath':>14}{'加速':>8}  一致性")
+    for path in fixtures:
+        html = path.read_text(encoding="utf-8")
+        reference, candidate = PARSERS[kind_of(path)]
+        mismatches = diff(reference(html), candidate(html))
+        failures += bool(mismatches)
+
+        bs4_time = median_ms(reference, html, rounds)
+        lxml_time = median_ms(candidate, html, rounds)
+        status = "✓" if not mismatches else f"✗ {len(mismatches)} 处不一致"
+        print(f"{path.name:<24}{len(html.encode('utf-8')) / 1024:>8.1f} KiB{bs4_time:>13.2f} ms"
+              f"{lxml_time:>11.2f} ms{bs4_time / lxml_time:>7.1f}x  {status}")
+        for line in mismatches[:5]:
+            print(f"    {line}")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+HTTP 连接池基准测试
+
+对比“每次请求新建 httpx.AsyncClient”与“共享连接池”两种方式的单次调用延迟。
+
+使用方法:
+    python scripts/benchmark_http_pool.py [url] [次数]
+
+默认请求微信 token 接口（无需凭据，会返回错误码但足以测量握手开销）。
+"""
+
+import sys
+import time
+import asyncio
+import statistics
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src" / "mcp_server_wechat"))
+
+from utils.http_client import http_pool  # noqa: E402
+
+DEFAULT_URL = "https://api.weixin.qq.com/cgi-bin/token"
+
+
+async def bench_per_call_client(url: str, rounds: int) -> list:
+    """每次调用新建客户端（旧实现）"""
+    latencies = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        async with httpx.AsyncClient(timeout=30) as client:
+            await client.get(url)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+async def bench_shared_pool(url: str, rounds: int) -> list:
+    """复用共享连接池（新实现）"""
+    latencies = []
+    await http_pool.start()
+    try:
+        for _ in range(rounds):
+            start = time.perf_counter()
+            await http_pool.client.get(url)
+            latencies.append((time.perf_counter() - start) * 1000)
+    finally:
+        await http_pool.close()
+    return latencies
+
+
+def report(name: str, latencies: list) -> None:
+    """打印延迟统计"""
+    ordered = sorted(latencies)
+    p95 = ordered[max(0, int(len(ordered) * 0.95) - 1)]
+    print(f"{name:<12} 均值 {statistics.mean(latencies):8.1f} ms  "
+          f"中位数 {statistics.median(latencies):8.1f} ms  p95 {p95:8.1f} ms")
+
+
+async def main():
+    url = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_URL
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    print(f"目标: {url}  次数: {rounds}  HTTP/2: {http_pool.http2}")
+    report("每次新建", await bench_per_call_client(url, rounds))
+    report("共享连接池", await bench_shared_pool(url, rounds))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,119 @@
+"""
+解析分流的事件循环延迟基准测试
+
+模拟并发负载：多个协程同时解析 scripts/fixtures/html 中的文章页和搜索结果页，
+同时运行一个每 5 ms 唤醒一次的心跳协程，记录它的唤醒延迟（事件循环被阻塞的时长）。
+搜索结果页经 ParsePool.run 解析；文章页与线上一致，按块输入 SogouWeChatSearchClient._read_article 流式解析。
+依次对比 inline（在事件循环中解析，即改动前的行为）、thread 和 process 三种模式。
+
+使用方法:
+    python scripts/benchmark_parse_offload.py [并发数] [每个协程的解析次数]
+"""
+
+import sys
+import time
+import asyncio
+import statistics
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src" / "mcp_server_wechat"))
+
+from utils import search_client as search_module  # noqa: E402
+from utils.html_extract import extract_account_results, extract_search_results  # noqa: E402
+from utils.parse_pool import ParsePool  # noqa: E402
+
+FIXTURE_DIR = Path(__file__).resolve().parent / "fixtures" / "html"
+HEARTBEAT = 0.005
+ARTICLE_URL = "https://mp.weixin.qq.com/s/fixture"
+CHUNK_SIZE = 16 * 1024
+
+# 搜索结果页 fixture 文件名前缀 -> 提取函数；其余（article_*）按文章页流式解析
+EXTRACTORS = {
+    "sogou_articles": extract_search_results,
+    "sogou_accounts": extract_account_results,
+}
+
+
+def article_response(page: bytes) -> httpx.Response:
+    """按块返回文章页的响应（带 Content-Length）"""
+    async def body():
+        for i in range(0, len(page), CHUNK_SIZE):
+            yield page[i:i + CHUNK_SIZE]
+
+    headers = {"content-type": "text/html; charset=utf-8", "content-length": str(len(page))}
+    return httpx.Response(200, headers=headers, content=body())
+
+
+def make_job(path: Path, client: "search_module.SogouWeChatSearchClient"):
+    """返回解析该页面一次的协程工厂，协程使用当前的 search_module.parse_pool"""
+    func = next((func for prefix, func in EXTRACTORS.items() if path.name.startswith(prefix)), None)
+    if func is not None:
+        html = path.read_text(encoding="utf-8")
+        return lambda: search_module.parse_pool.run(func, html)
+    page = path.read_bytes()
+    return lambda: client._read_article(article_response(page), ARTICLE_URL)
+
+
+async def heartbeat(lags: list, stop: asyncio.Event) -> None:
+    """按固定间隔唤醒，记录超出预期的延迟（毫秒）"""
+    while not stop.is_set():
+        expected = time.perf_counter() + HEARTBEAT
+        await asyncio.sleep(HEARTBEAT)
+        lags.append(max(0.0, time.perf_counter() - expected) * 1000)
+
+
+async def run_mode(mode: str, concurrency: int, rounds: int, jobs: list) -> dict:
+    """在指定模式下并发解析，返回耗时和心跳延迟统计"""
+    pool = ParsePool()
+    pool.mode = mode
+    pool.start()
+    # 文章页流式解析使用 search_client 模块中的全局解析池
+    search_module.parse_pool = pool
+
+    async def worker(index: int) -> None:
+        for i in range(rounds):
+            await jobs[(index + i) % len(jobs)]()
+
+    # 预热线程池 / 进程池
+    await asyncio.gather(*(job() for job in jobs))
+
+    lags: list = []
+    stop = asyncio.Event()
+    beat = asyncio.create_task(heartbeat(lags, stop))
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await beat
+    await pool.close()
+
+    lags.sort()
+    return {
+        "elapsed": elapsed,
+        "p50": statistics.median(lags) if lags else 0.0,
+        "p99": lags[int(len(lags) * 0.99)] if lags else 0.0,
+        "max": lags[-1] if lags else 0.0,
+        "stats": pool.get_stats()
+    }
+
+
+async def main():
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    client = search_module.SogouWeChatSearchClient()
+    jobs = [make_job(path, client) for path in sorted(FIXTURE_DIR.glob("*.html"))]
+
+    print(f"并发: {concurrency}  每协程解析: {rounds} 次  页面: {len(jobs)}  心跳间隔: {HEARTBEAT * 1000:.0f} ms")
+    print(f"{'模式':<10}{'总耗时':>10}{'延迟 p50':>12}{'延迟 p99':>12}{'最大延迟':>12}  分流")
+    for mode in ("inline", "thread", "process"):
+        r = await run_mode(mode, concurrency, rounds, jobs)
+        stats = r["stats"]
+        print(f"{mode:<10}{r['elapsed']:>8.2f} s{r['p50']:>9.2f} ms{r['p99']:>9.2f} ms{r['max']:>9.2f} ms"
+              f"  直接 {stats['inline_runs']} / 池中 {stats['offloaded_runs']} / 排队 {stats['queued_waits']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
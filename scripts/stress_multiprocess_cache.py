@@ -0,0 +1,148 @@
+"""
+多进程共享缓存压力测试
+
+模拟同一主机上多个 MCP Server 进程共享同一个缓存目录：
+1. 所有进程同时获取 access_token，应只向 /token 发起一次请求，且各进程拿到同一个 token；
+2. 所有进程并发读写同一批文章缓存，数据库中每篇文章只有一份且内容完整；
+3. 所有进程同时收到 42001（token 失效）后刷新，应只再请求一次 /token；
+4. 配额账本合并了全部进程的计数。
+
+使用方法:
+    python scripts/stress_multiprocess_cache.py [进程数] [每进程文章数]
+
+/token 接口由本地 HTTP 服务模拟，无需真实凭据。
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import asyncio
+import tempfile
+import threading
+import multiprocessing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+SRC_DIR = str(Path(__file__).resolve().parent.parent / "src" / "mcp_server_wechat")
+
+
+class TokenHandler(BaseHTTPRequestHandler):
+    """模拟 /token 接口：每次请求签发新 token"""
+
+    issued = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with TokenHandler.lock:
+            TokenHandler.issued += 1
+            token = f"token-{TokenHandler.issued}"
+        time.sleep(0.2)  # 放大并发刷新的竞争窗口
+        body = json.dumps({"access_token": token, "expires_in": 7200}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def worker(cache_dir: str, base_url: str, articles: int, barrier, results) -> None:
+    """单个服务进程"""
+    os.environ.update({"CACHE_DIR": cache_dir, "WECHAT_APPID": "stress", "WECHAT_SECRET": "stress"})
+    sys.path.insert(0, SRC_DIR)
+
+    from utils.api_client import wechat_client
+    from utils.cache import cache_manager
+    from utils.http_client import http_pool
+
+    wechat_client.base_url = base_url
+
+    async def run() -> dict:
+        await http_pool.start()
+        try:
+            barrier.wait()
+            first_token = await wechat_client.get_access_token()
+
+            for i in range(articles):
+                cache_manager.set("article_content", {"media_id": f"m{i}", "content": "正文" * 500}, ttl=600,
+                                  tags=("material",), media_id=f"m{i}")
+            await cache_manager.flush()
+            readable = 0
+            for i in range(articles):
+                article = await cache_manager.aget_shared("article_content", media_id=f"m{i}")
+                readable += bool(article and article["media_id"] == f"m{i}")
+
+            barrier.wait()
+            second_token = await wechat_client.refresh_access_token(stale_token=first_token)
+            return {"pid": os.getpid(), "first": first_token, "second": second_token, "readable": readable}
+        finally:
+            await cache_manager.flush()
+            await http_pool.close()
+
+    try:
+        results.put(asyncio.run(run()))
+    except BaseException as e:
+        barrier.abort()
+        results.put({"pid": os.getpid(), "error": repr(e)})
+
+
+def main():
+    processes = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    articles = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), TokenHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    ctx = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as cache_dir:
+        barrier = ctx.Barrier(processes)
+        results = ctx.Queue()
+        procs = [ctx.Process(target=worker, args=(cache_dir, base_url, articles, barrier, results))
+                 for _ in range(processes)]
+        start = time.perf_counter()
+        for p in procs:
+            p.start()
+        outcomes = [results.get(timeout=120) for _ in procs]
+        for p in procs:
+            p.join()
+        elapsed = time.perf_counter() - start
+
+        errors = [o for o in outcomes if "error" in o]
+        if errors:
+            for o in errors:
+                print(f"进程 {o['pid']} 失败: {o['error']}")
+            server.shutdown()
+            sys.exit(1)
+
+        conn = sqlite3.connect(str(Path(cache_dir) / "cache.db"))
+        stored = conn.execute("SELECT COUNT(*) FROM entries WHERE key LIKE 'article_content|%'").fetchone()[0]
+        conn.close()
+        ledger = json.loads((Path(cache_dir) / "quota_ledger.json").read_text(encoding="utf-8"))
+
+    server.shutdown()
+
+    first_tokens = {o["first"] for o in outcomes}
+    second_tokens = {o["second"] for o in outcomes}
+    checks = {
+        "首次获取只请求一次 /token": len(first_tokens) == 1,
+        "42001 后只再请求一次 /token": len(second_tokens) == 1 and TokenHandler.issued == 2,
+        "每篇文章只存一份": stored == articles,
+        "所有进程可读到全部文章": all(o["readable"] == articles for o in outcomes),
+        "配额账本合并全部进程计数": ledger["counts"].get("token") == TokenHandler.issued,
+    }
+
+    print(f"进程: {processes}  文章: {articles}  耗时: {elapsed:.2f} s")
+    print(f"/token 请求: {TokenHandler.issued}  首次 token: {sorted(first_tokens)}  刷新后: {sorted(second_tokens)}")
+    print(f"数据库文章条目: {stored}  账本 token 计数: {ledger['counts'].get('token')}")
+    for name, ok in checks.items():
+        print(f"{'✓' if ok else '✗'} {name}")
+    sys.exit(0 if all(checks.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,10 +7,12 @@
 import os
 import sys
 import json
+from contextlib import asynccontextmanager
+from datetime import datetime
 from pathlib import Path
-from typing import Literal, Optional, Union, Dict, Any
+from typing import Literal, Optional, Union, Dict, Any, List
 from pydantic import BaseModel, Field, model_validator
-from fastmcp import FastMCP
+from fastmcp import FastMCP, Context
 from fastmcp.exceptions import ToolError
 
 # 添加当前目录到 Python 路径
@@ -24,14 +26,49 @@ from utils.formatters import (
     format_article_list, 
     format_article_content,
     format_search_results,
+    format_article_batch,
+    format_cache_metrics,
     truncate_response
 )
 from utils.cache import cache_manager
+from utils.http_client import http_pool
+from utils.coalesce import request_coalescer
+from utils.resilience import resilience
+from utils.parse_pool import parse_pool
+from utils.rate_limiter import rate_limiter
+from utils.material_mirror import material_mirror
+
+
+@asynccontextmanager
+async def lifespan(server: FastMCP):
+    """服务器生命周期：启动时创建共享连接池、解析池、token 续期、缓存压缩和指标写入任务，关闭时释放资源并写回缓存和节流状态"""
+    await http_pool.start()
+    parse_pool.start()
+    wechat_client.start_token_renewal()
+    cache_manager.start_compaction()
+    cache_manager.start_metrics_dump()
+    try:
+        yield
+    finally:
+        await cache_manager.stop_metrics_dump()
+        await cache_manager.stop_compaction()
+        await wechat_client.stop_token_renewal()
+        # 先取消仍在使用连接池和素材镜像的后台任务，再关闭它们
+        await wechat_client.stop_background_tasks()
+        await cache_manager.cancel_refreshes()
+        await request_coalescer.cancel_all()
+        await http_pool.close()
+        await parse_pool.close()
+        rate_limiter.save()
+        material_mirror.close()
+        await cache_manager.flush()
+
 
 # 创建 FastMCP 实例
 mcp = FastMCP(
     name="WeChat Official Account MCP Server",
-    instructions="A MCP server for accessing WeChat Official Account articles and content"
+    instructions="A MCP server for accessing WeChat Official Account articles and content",
+    lifespan=lifespan
 )
 
 
@@ -77,9 +114,20 @@ class ListArticlesInput(BaseModel):
     count: int = Field(
         default=10,
         ge=1,
-        le=20,
-        description="获取数量，最多20条",
-        examples=[5, 10, 20]
+        le=500,
+        description="获取数量，最多500条，超过20条时自动并发分页获取",
+        examples=[5, 10, 20, 100]
+    )
+    
+    fetch_all: bool = Field(
+        default=False,
+        description="是否获取 offset 之后的全部文章（忽略 count）"
+    )
+    
+    changed_since: Optional[datetime] = Field(
+        default=None,
+        description="只返回此时间之后更新过的文章（可选），格式如 2024-01-01 或 2024-01-01 08:00:00",
+        examples=["2024-01-01", "2024-06-01 08:00:00"]
     )
     
     format: Literal["json", "markdown"] = Field(
@@ -130,6 +178,11 @@ class GetArticleContentInput(BaseModel):
         default=False,
         description="是否包含原始HTML内容（仅在 json 格式下有效）"
     )
+    
+    force_retry: bool = Field(
+        default=False,
+        description="忽略缓存的失败结果（如无效 media_id），强制重新请求上游"
+    )
 
     @model_validator(mode='before')
     @classmethod
@@ -146,6 +199,52 @@ class GetArticleContentInput(BaseModel):
         return data
 
 
+class BatchGetArticleContentInput(BaseModel):
+    model_config = {"extra": "forbid"}
+    
+    media_ids: List[str] = Field(
+        description="文章的媒体ID列表，从 list_articles 获取",
+        min_length=1,
+        max_length=50,
+        examples=[["BM_Vc7hGvWUiRSqbROjwQ-qGHisVjia6tVPwl2r1NjqzjJFbkCBsZtDvSMJY8bL"]]
+    )
+    
+    format: Literal["json", "markdown"] = Field(
+        default="json",
+        description="响应格式"
+    )
+    
+    detail: Literal["concise", "detailed"] = Field(
+        default="concise",
+        description="详细程度：concise 每篇正文最多1000字，detailed 在总预算内返回全文"
+    )
+    
+    max_chars: int = Field(
+        default=80000,
+        ge=1000,
+        le=100000,
+        description="整个响应的字符预算（扣除标题等元信息后由各篇正文共享），超出时按篇截断正文"
+    )
+    
+    force_retry: bool = Field(
+        default=False,
+        description="忽略缓存的失败结果（如无效 media_id），强制重新请求上游"
+    )
+
+    @model_validator(mode='before')
+    @classmethod
+    def parse_json_string(cls, data: Any) -> Any:
+        """解析 JSON 字符串输入"""
+        if isinstance(data, str):
+            try:
+                parsed = json.loads(data)
+                return parsed
+            except json.JSONDecodeError as e:
+                # stdio 传输下 stdout 是协议通道，不能打印；作为校验错误返回给调用方
+                raise ValueError(f"JSON 解析失败：{e}") from e
+        return data
+
+
 class SearchPublicArticlesInput(BaseModel):
     model_config = {"extra": "forbid"}
     
@@ -178,6 +277,11 @@ class SearchPublicArticlesInput(BaseModel):
         default="concise",
         description="详细程度"
     )
+    
+    force_retry: bool = Field(
+        default=False,
+        description="忽略缓存的失败结果（如验证码页面），强制重新请求上游"
+    )
 
     @model_validator(mode='before')
     @classmethod
@@ -199,7 +303,7 @@ class GetPublicArticleContentInput(BaseModel):
     
     article_url: str = Field(
         description="文章URL地址，通常来自搜索结果",
-        pattern=r"^https?://mp\.weixin\.qq\.com/s/",
+        pattern=r"^https?://mp\.weixin\.qq\.com/s[/?]",
         examples=["https://mp.weixin.qq.com/s/abcdefghijk"]
     )
     
@@ -217,6 +321,11 @@ class GetPublicArticleContentInput(BaseModel):
         default=False,
         description="是否提取图片链接"
     )
+    
+    force_retry: bool = Field(
+        default=False,
+        description="忽略缓存的失败结果（如验证码页面、链接失效），强制重新请求上游"
+    )
 
     @model_validator(mode='before')
     @classmethod
@@ -254,6 +363,11 @@ class SearchAccountsInput(BaseModel):
         default="json",
         description="响应格式"
     )
+    
+    force_retry: bool = Field(
+        default=False,
+        description="忽略缓存的失败结果（如验证码页面），强制重新请求上游"
+    )
 
     @model_validator(mode='before')
     @classmethod
@@ -307,12 +421,21 @@ async def get_account_info(
         - 权限不足：确认公众号类型支持 API 功能
     """
     try:
-        # 清理过期缓存
-        cache_manager.clear_expired()
-        
         # 获取公众号信息
         account_info = await wechat_client.get_account_info()
         
+        # 附加运行时统计（不写入缓存）
+        if detail == "detailed":
+            account_info = {
+                **account_info,
+                "request_dedup": request_coalescer.get_stats(),
+                "circuit_breakers": resilience.get_stats(),
+                "pacing": rate_limiter.get_stats(),
+                "parse_pool": parse_pool.get_stats(),
+                "article_download": search_client.get_download_stats(),
+                "cache": cache_manager.get_stats()
+            }
+        
         # 格式化响应
         response = format_account_info(account_info, format, detail)
         
@@ -333,6 +456,50 @@ export WECHAT_APPID=your_app_id
 export WECHAT_SECRET=your_app_secret""")
 
 
+@mcp.tool(
+    annotations={
+        "readOnlyHint": True,
+        "destructiveHint": False,
+        "idempotentHint": False,
+        "openWorldHint": False
+    }
+)
+async def get_cache_metrics(
+    prefix: Optional[str] = None,
+    format: Literal["json", "markdown"] = "markdown",
+    detail: Literal["concise", "detailed"] = "concise"
+) -> str:
+    """
+    查看各类缓存的命中率、耗时和占用。
+
+    按缓存前缀（search_results、article_content、public_article、range:search_results、
+    negative:* 等）统计自服务器启动以来的命中、过期降级返回、未命中、淘汰和写入字节数，
+    以及读写耗时分布，用于判断缓存是否减少了上游调用并据此调整 TTL。不发起任何上游请求。
+
+    Args:
+        prefix: 只返回指定前缀的指标（可选），如 "search_results"
+        format: 响应格式 - "json" 或 "markdown"
+        detail: 详细程度 - "concise" 返回汇总，"detailed" 额外返回耗时直方图
+
+    Returns:
+        按前缀的缓存指标
+
+    Examples:
+        get_cache_metrics()
+        get_cache_metrics(prefix="public_article", format="json", detail="detailed")
+    """
+    metrics = cache_manager.get_metrics()
+    if prefix:
+        metrics["prefixes"] = {
+            name: value for name, value in metrics["prefixes"].items()
+            if name == prefix or name.endswith(f":{prefix}")
+        }
+        if not metrics["prefixes"]:
+            return f"暂无前缀 {prefix} 的缓存指标（自启动以来未被访问）"
+    
+    return truncate_response(format_cache_metrics(metrics, format, detail))
+
+
 @mcp.tool(
     annotations={
         "readOnlyHint": True,
@@ -341,16 +508,19 @@ export WECHAT_SECRET=your_app_secret""")
         "openWorldHint": True
     }
 )
-async def list_articles(input: ListArticlesInput) -> str:
+async def list_articles(input: ListArticlesInput, ctx: Context) -> str:
     """
     获取公众号的图文消息列表。
 
     此工具用于获取当前公众号发布的图文消息列表，支持分页浏览。
-    只能获取通过微信公众平台发布的永久素材。
+    只能获取通过微信公众平台发布的永久素材。列表从本地素材镜像读取，
+    镜像会按需增量同步，分页浏览不会额外消耗 API 配额。
 
     Args:
         offset: 偏移量，从第几条开始获取（从0开始）
-        count: 获取数量，最多20条
+        count: 获取数量，最多500条；首次同步时并发拉取全部分页并报告进度
+        fetch_all: 是否获取 offset 之后的全部文章
+        changed_since: 只返回此时间之后更新过的文章（可选）
         format: 响应格式 - "json" 或 "markdown"
         detail: 详细程度 - "concise" 返回基本信息，"detailed" 返回完整信息
 
@@ -360,16 +530,24 @@ async def list_articles(input: ListArticlesInput) -> str:
     Examples:
         list_articles(offset=0, count=10, format="json", detail="concise")
         list_articles(offset=10, count=5, format="markdown", detail="detailed")
+        list_articles(changed_since="2024-06-01", count=20)
+        list_articles(fetch_all=True, format="json", detail="concise")
 
     Error Handling:
         - 超出范围：调整 offset 和 count 参数
-        - API 限制：注意每日调用次数限制（10次/天）
+        - API 限制：注意每日调用次数限制（10次/天），首次全量同步按页消耗配额
         - 无内容：确认公众号已发布图文消息
         - 权限不足：确认公众号支持素材管理功能
     """
     try:
         # 获取文章列表
-        articles = await wechat_client.list_articles(input.offset, input.count)
+        changed_since = int(input.changed_since.timestamp()) if input.changed_since else None
+        count = None if input.fetch_all else input.count
+        
+        async def report_progress(done: int, total: int) -> None:
+            await ctx.report_progress(done, total, f"已同步 {done}/{total} 页素材")
+        
+        articles = await wechat_client.list_articles(input.offset, count, changed_since, report_progress)
         
         if not articles:
             return "未找到文章。请确认：\n1. 公众号已发布图文消息\n2. offset 参数设置正确\n3. 公众号权限正常"
@@ -412,6 +590,7 @@ async def get_article_content(input: GetArticleContentInput) -> str:
         format: 响应格式 - "json" 或 "markdown"（推荐）
         detail: 详细程度 - "concise" 或 "detailed"
         include_html: 是否包含原始HTML内容（仅 json 格式有效）
+        force_retry: 忽略缓存的失败结果，强制重新请求
 
     Returns:
         格式化的文章内容，包含标题、作者、正文、统计信息等
@@ -428,7 +607,7 @@ async def get_article_content(input: GetArticleContentInput) -> str:
     """
     try:
         # 获取文章内容
-        article = await wechat_client.get_article_content(input.media_id)
+        article = await wechat_client.get_article_content(input.media_id, input.force_retry)
         
         # 格式化响应
         response = format_article_content(
@@ -457,6 +636,60 @@ async def get_article_content(input: GetArticleContentInput) -> str:
 示例：get_article_content(media_id="正确的media_id")""")
 
 
+@mcp.tool(
+    annotations={
+        "readOnlyHint": True,
+        "destructiveHint": False,
+        "idempotentHint": True,
+        "openWorldHint": False
+    }
+)
+async def batch_get_article_content(input: BatchGetArticleContentInput) -> str:
+    """
+    根据多个 media_id 批量获取文章内容。
+
+    此工具用于一次获取多篇文章，避免逐篇调用 get_article_content。
+    已缓存或已同步到本地镜像的文章立即返回，其余文章并发获取；
+    单篇失败不影响其他文章，每篇结果单独标注成功或错误。
+
+    Args:
+        media_ids: 文章的媒体ID列表，最多50个
+        format: 响应格式 - "json" 或 "markdown"
+        detail: 详细程度 - "concise" 每篇正文最多1000字，"detailed" 返回全文
+        max_chars: 所有文章正文共享的字符预算，超出时按篇截断而不是整体截断
+        force_retry: 忽略缓存的失败结果，强制重新请求
+
+    Returns:
+        每篇文章的标题、作者、正文或错误信息，以及成功/失败统计
+
+    Examples:
+        batch_get_article_content(media_ids=["BM_Vc7h...", "BM_Xa2k..."])
+        batch_get_article_content(media_ids=["BM_Vc7h..."], format="markdown", detail="detailed")
+
+    Error Handling:
+        - 部分失败：失败条目单独返回错误，其余文章正常返回
+        - 内容过长：按篇公平分配字符预算，短文章完整保留
+        - API 限制：注意每日调用次数限制，优先使用已同步的文章
+    """
+    try:
+        results = await wechat_client.get_article_contents(input.media_ids, input.force_retry)
+        
+        # 格式化响应
+        response = format_article_batch(results, input.format, input.detail, input.max_chars)
+        
+        # 截断过长响应
+        return truncate_response(response)
+        
+    except Exception as e:
+        raise ToolError(f"""批量获取文章内容失败：{str(e)}
+
+请检查：
+1. media_ids 是否正确（从 list_articles 获取）
+2. API 调用是否超出限制
+
+示例：batch_get_article_content(media_ids=["media_id_1", "media_id_2"])""")
+
+
 @mcp.tool(
     annotations={
         "readOnlyHint": True,
@@ -478,6 +711,7 @@ async def search_public_articles(input: SearchPublicArticlesInput) -> str:
         limit: 返回结果数量，最多20条
         format: 响应格式 - "json" 或 "markdown"
         detail: 详细程度 - "concise" 或 "detailed"
+        force_retry: 忽略缓存的失败结果（如验证码），强制重新搜索
 
     Returns:
         格式化的搜索结果，包含标题、公众号、发布时间、链接等
@@ -497,7 +731,8 @@ async def search_public_articles(input: SearchPublicArticlesInput) -> str:
         results = await search_client.search_articles(
             input.query, 
             input.account_name, 
-            input.limit
+            input.limit,
+            input.force_retry
         )
         
         if not results:
@@ -557,6 +792,7 @@ async def get_public_article_content(input: GetPublicArticleContentInput) -> str
         format: 响应格式 - "json" 或 "markdown"（推荐）
         detail: 详细程度 - "concise" 或 "detailed"
         extract_images: 是否提取图片链接
+        force_retry: 忽略缓存的失败结果（如验证码），强制重新请求
 
     Returns:
         格式化的文章内容，包含标题、作者、正文、发布时间等
@@ -573,7 +809,7 @@ async def get_public_article_content(input: GetPublicArticleContentInput) -> str
     """
     try:
         # 获取文章内容
-        article = await search_client.get_article_content(input.article_url)
+        article = await search_client.get_article_content(input.article_url, input.force_retry)
         
         # 如果不需要图片，移除图片信息
         if not input.extract_images and "images" in article:
@@ -625,6 +861,7 @@ async def search_accounts(input: SearchAccountsInput) -> str:
         query: 公众号名称或关键词
         limit: 返回结果数量，最多20条
         format: 响应格式 - "json" 或 "markdown"
+        force_retry: 忽略缓存的失败结果（如验证码），强制重新搜索
 
     Returns:
         格式化的公众号列表，包含名称、描述、认证状态等
@@ -640,7 +877,7 @@ async def search_accounts(input: SearchAccountsInput) -> str:
     """
     try:
         # 搜索公众号
-        results = await search_client.search_accounts(input.query, input.limit)
+        results = await search_client.search_accounts(input.query, input.limit, input.force_retry)
         
         if not results:
             return f"""未找到相关公众号。
@@ -8,11 +8,90 @@ import os
 import time
 import httpx
 import asyncio
-from typing import Dict, Any, Optional, List
+from collections import deque
+from typing import Dict, Any, Optional, List, Callable, Awaitable, Deque, Tuple
 from fastmcp.exceptions import ToolError
 
-from .errors import handle_wechat_api_error, handle_environment_error
+from .errors import (
+    WeChatAPIError,
+    AuthenticationError,
+    handle_wechat_api_error,
+    handle_environment_error,
+    handle_quota_exhausted,
+    handle_mirror_incomplete,
+    describe_error,
+    raise_cached_error
+)
 from .cache import cache_manager
+from .http_client import http_pool
+from .coalesce import request_coalescer
+from .quota import quota_ledger
+from .material_mirror import material_mirror
+from .resilience import resilience
+from .file_lock import FileLock
+from .config import env_int
+
+
+# 过期缓存保留 7 天，供配额即将用尽时降级使用
+STALE_RETENTION = 7 * 86400
+
+# batchget_material 单次最多返回 20 条
+MATERIAL_PAGE_SIZE = 20
+
+
+# 过期数据的原因（stale_reason）：配额即将用尽，不再请求上游 / 素材同步失败，返回本地镜像
+STALE_QUOTA = "quota"
+STALE_SYNC_FAILED = "sync_failed"
+
+
+def mark_stale(data: Any, reason: str = STALE_QUOTA) -> Any:
+    """为降级返回的过期数据添加 stale 标记和原因"""
+    if isinstance(data, dict):
+        return {**data, "stale": True, "stale_reason": reason}
+    if isinstance(data, list):
+        return [mark_stale(item, reason) for item in data]
+    return data
+
+
+def _build_list_article(media_id: str, update_time: int, news_item: Dict[str, Any]) -> Dict[str, Any]:
+    """构造文章列表条目"""
+    return {
+        "media_id": media_id,
+        "title": news_item.get("title", ""),
+        "author": news_item.get("author", ""),
+        "digest": news_item.get("digest", ""),
+        "url": news_item.get("url", ""),
+        "content_source_url": news_item.get("content_source_url", ""),
+        "thumb_media_id": news_item.get("thumb_media_id", ""),
+        "show_cover_pic": news_item.get("show_cover_pic", 0),
+        "update_time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(update_time))
+    }
+
+
+def _build_content_article(media_id: str, news_item: Dict[str, Any]) -> Dict[str, Any]:
+    """构造文章详情"""
+    article = {
+        "media_id": media_id,
+        "title": news_item.get("title", ""),
+        "author": news_item.get("author", ""),
+        "digest": news_item.get("digest", ""),
+        "content": news_item.get("content", ""),
+        "content_source_url": news_item.get("content_source_url", ""),
+        "url": news_item.get("url", ""),
+        "thumb_media_id": news_item.get("thumb_media_id", ""),
+        "show_cover_pic": news_item.get("show_cover_pic", 0),
+        "need_open_comment": news_item.get("need_open_comment", 0),
+        "only_fans_can_comment": news_item.get("only_fans_can_comment", 0)
+    }
+    
+    # 估算字数和阅读时间
+    content = article.get("content", "")
+    word_count = len(content)
+    read_time_minutes = max(1, word_count // 300)  # 按每分钟 300 字计算
+    
+    article["word_count"] = word_count
+    article["read_time_minutes"] = read_time_minutes
+    return article
 
 
 class WeChatAPIClient:
@@ -27,21 +106,106 @@ class WeChatAPIClient:
         self.access_token = None
         self.token_expires_at = None
         
+        # token 刷新：并发请求共享同一个刷新任务，后台任务在过期前主动续期
+        self.token_refresh_margin = env_int("WECHAT_TOKEN_REFRESH_MARGIN", 600)
+        # 后台续期失败后的重试间隔：从 60 秒起按次数翻倍，不超过上限
+        self.token_retry_max_delay = env_int("WECHAT_TOKEN_RETRY_MAX_DELAY", 3600)
+        self._token_refresh_task: Optional[asyncio.Task] = None
+        self._token_renewal_task: Optional[asyncio.Task] = None
+        # 共享缓存目录的多个进程通过文件锁串行化刷新，共用同一个 token
+        self._token_lock = FileLock(str(cache_manager.cache_dir / "access_token.lock"))
+        
+        # 素材镜像：超过同步间隔后，下一次读取会触发增量同步
+        self.mirror_sync_interval = env_int("WECHAT_MIRROR_SYNC_INTERVAL", 1800)
+        self.mirror_stale_window = env_int("WECHAT_MIRROR_STALE_WINDOW", 86400)
+        self._sync_task: Optional[asyncio.Task] = None
+        self.page_concurrency = env_int("WECHAT_PAGE_CONCURRENCY", 4)
+        self.batch_concurrency = env_int("WECHAT_BATCH_CONCURRENCY", 4)
+        
     def _check_configuration(self):
         """检查配置是否完整"""
         if not self.configured:
             handle_environment_error()
         
+    async def _load_cached_token(self) -> Optional[str]:
+        """从内存或缓存中读取未过期的 token"""
+        if self.access_token and self.token_expires_at and time.time() < self.token_expires_at:
+            return self.access_token
+        
+        cached_token = await cache_manager.aget("access_token")
+        if isinstance(cached_token, dict):
+            self.access_token = cached_token.get("access_token")
+            self.token_expires_at = cached_token.get("expires_at")
+            return self.access_token
+        if cached_token:
+            # 兼容旧格式（仅保存 token 字符串），过期时间未知
+            self.access_token = cached_token
+            self.token_expires_at = None
+            return cached_token
+        return None
+        
     async def get_access_token(self) -> str:
         """获取或刷新 access_token"""
         self._check_configuration()
         
         # 检查缓存的 token
-        cached_token = cache_manager.get("access_token")
+        cached_token = await self._load_cached_token()
         if cached_token:
             return cached_token
             
-        # 获取新的 token
+        return await self.refresh_access_token()
+    
+    async def refresh_access_token(self, stale_token: Optional[str] = None) -> str:
+        """刷新 access_token（单飞）
+        
+        同一时刻只会有一个 /token 请求在途，其余调用者等待同一结果。
+        传入 stale_token 时，若当前 token 已不同于它（已被其他调用刷新），直接返回当前 token；
+        在途的刷新任务若是在 token 被判定失效前发起的（如后台续期），可能返回同一个 token，此时再强制刷新一次。
+        """
+        self._check_configuration()
+        
+        if stale_token is not None and self.access_token and self.access_token != stale_token:
+            return self.access_token
+        
+        # shield 避免单个调用被取消时中断共享的刷新任务
+        access_token = await asyncio.shield(self._start_token_refresh(stale_token))
+        if stale_token is not None and access_token == stale_token:
+            access_token = await asyncio.shield(self._start_token_refresh(stale_token))
+        return access_token
+    
+    def _start_token_refresh(self, stale_token: Optional[str]) -> asyncio.Task:
+        """返回在途的刷新任务，没有时发起新的刷新"""
+        if self._token_refresh_task is None or self._token_refresh_task.done():
+            self._token_refresh_task = asyncio.create_task(self._refresh_shared_token(stale_token))
+            if stale_token is not None:
+                self.access_token = None
+                self.token_expires_at = None
+        return self._token_refresh_task
+    
+    async def _refresh_shared_token(self, stale_token: Optional[str]) -> str:
+        """在跨进程锁内刷新 token；其他进程已刷新时直接使用共享缓存中的 token"""
+        async with self._token_lock:
+            shared = await cache_manager.aget_shared("access_token")
+            if (isinstance(shared, dict) and shared.get("access_token") != stale_token
+                    and time.time() < shared.get("expires_at", 0) - self.token_refresh_margin):
+                self.access_token = shared["access_token"]
+                self.token_expires_at = shared["expires_at"]
+                return self.access_token
+            
+            if stale_token is not None:
+                # 上游已判定 token 失效：丢弃缓存中的旧 token，刷新失败时不再复用
+                await cache_manager.invalidate("token")
+            
+            access_token = await self._fetch_access_token()
+            # 落盘后再释放锁，其他进程加锁后即可读到新 token
+            await cache_manager.flush()
+            return access_token
+    
+    async def _fetch_access_token(self) -> str:
+        """请求 /token 接口并写入缓存"""
+        if quota_ledger.is_exhausted("token"):
+            handle_quota_exhausted("token", quota_ledger.limit("token"))
+        
         url = f"{self.base_url}/token"
         params = {
             "grant_type": "client_credential",
@@ -49,163 +213,424 @@ class WeChatAPIClient:
             "secret": self.app_secret
         }
         
-        async with httpx.AsyncClient(timeout=30) as client:
+        async def fetch() -> Dict[str, Any]:
+            await quota_ledger.record("token")
+            response = await http_pool.client.get(url, params=params)
+            response.raise_for_status()
+            data = response.json()
+            
+            if "access_token" not in data:
+                error_code = data.get("errcode", 0)
+                error_msg = data.get("errmsg", "未知错误")
+                if error_code == 45009:
+                    await quota_ledger.mark_exhausted("token")
+                handle_wechat_api_error(error_code, error_msg)
+            return data
+        
+        try:
+            data = await resilience.call(url, fetch)
+        except httpx.HTTPError as e:
+            raise ToolError(f"网络请求失败：{str(e)}")
+        
+        access_token = data["access_token"]
+        expires_in = data.get("expires_in", 7200)
+        
+        # 缓存 token，提前 5 分钟过期
+        self.access_token = access_token
+        self.token_expires_at = time.time() + expires_in - 300
+        cache_manager.set(
+            "access_token",
+            {"access_token": access_token, "expires_at": self.token_expires_at},
+            ttl=expires_in - 300,
+            tags=("token",)
+        )
+        return access_token
+    
+    async def _token_renewal_loop(self) -> None:
+        """后台续期：在 token 过期前 token_refresh_margin 秒主动刷新
+        
+        失败后按指数退避重试（每次重试都计入 token 配额）；凭据错误无法通过重试恢复，停止续期。
+        """
+        failures = 0
+        while True:
+            if await self._load_cached_token() and self.token_expires_at:
+                delay = self.token_expires_at - self.token_refresh_margin - time.time()
+            else:
+                delay = 0
+            
+            if delay > 0:
+                await asyncio.sleep(delay)
+            
             try:
-                response = await client.get(url, params=params)
-                response.raise_for_status()
-                data = response.json()
-                
-                if "access_token" in data:
-                    access_token = data["access_token"]
-                    expires_in = data.get("expires_in", 7200)
-                    
-                    # 缓存 token，提前 5 分钟过期
-                    cache_manager.set("access_token", access_token, ttl=expires_in - 300)
-                    return access_token
-                else:
-                    error_code = data.get("errcode", 0)
-                    error_msg = data.get("errmsg", "未知错误")
-                    handle_wechat_api_error(error_code, error_msg)
-                    
-            except httpx.RequestError as e:
-                raise ToolError(f"网络请求失败：{str(e)}")
+                await self.refresh_access_token()
+                failures = 0
+            except asyncio.CancelledError:
+                raise
+            except AuthenticationError:
+                # 调用方按需刷新时会得到同样的错误提示
+                return
+            except Exception:
+                # 刷新失败时稍后重试，调用方仍可按需刷新
+                failures += 1
+                await asyncio.sleep(min(self.token_retry_max_delay, 60 * 2 ** (failures - 1)))
+    
+    def start_token_renewal(self) -> None:
+        """启动后台 token 续期任务（由服务器 lifespan 调用）"""
+        if not self.configured:
+            return
+        if self._token_renewal_task is None or self._token_renewal_task.done():
+            self._token_renewal_task = asyncio.create_task(self._token_renewal_loop())
+    
+    async def stop_token_renewal(self) -> None:
+        """停止后台 token 续期任务"""
+        task = self._token_renewal_task
+        self._token_renewal_task = None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+    
+    async def stop_background_tasks(self) -> None:
+        """取消在途的素材同步和 token 刷新（由服务器 lifespan 在关闭连接池和素材镜像前调用）"""
+        tasks = [task for task in (self._sync_task, self._token_refresh_task) if task is not None and not task.done()]
+        self._sync_task = self._token_refresh_task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
     
     async def make_request(self, endpoint: str, params: Optional[Dict] = None, method: str = "POST") -> Dict[str, Any]:
-        """通用 API 请求方法"""
-        access_token = await self.get_access_token()
+        """通用 API 请求方法
+        
+        相同接口和参数的并发请求会合并为一次上游调用。
+        """
+        params = dict(params or {})
+        key = request_coalescer.make_key(f"{method.upper()} {endpoint}", params, exclude=("access_token",))
+        return await request_coalescer.run(key, lambda: self._make_request(endpoint, params, method))
+    
+    async def _make_request(self, endpoint: str, params: Dict, method: str) -> Dict[str, Any]:
+        """执行 API 请求（含 token 注入、按错误类型重试和主机熔断）"""
         url = f"{self.base_url}/{endpoint}"
+        params["access_token"] = await self.get_access_token()
         
-        if params is None:
-            params = {}
-        params["access_token"] = access_token
+        try:
+            data = await resilience.call(url, lambda: self._send_request(endpoint, url, params, method))
+            
+            # 如果是 token 过期，通过单飞刷新获取新 token 后重发一次
+            if data.get("errcode", 0) == 42001:
+                params["access_token"] = await self.refresh_access_token(stale_token=params["access_token"])
+                data = await resilience.call(url, lambda: self._send_request(endpoint, url, params, method))
+        except httpx.HTTPError as e:
+            raise ToolError(f"网络请求失败：{str(e)}")
         
-        # 添加重试机制
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                async with httpx.AsyncClient(timeout=30) as client:
-                    if method.upper() == "GET":
-                        response = await client.get(url, params=params)
-                    else:
-                        response = await client.post(url, json=params)
-                    
-                    response.raise_for_status()
-                    data = response.json()
-                    
-                    error_code = data.get("errcode", 0)
-                    if error_code != 0:
-                        error_msg = data.get("errmsg", "未知错误")
-                        
-                        # 如果是 token 过期，清除缓存并重试
-                        if error_code == 42001 and attempt < max_retries - 1:
-                            cache_manager.set("access_token", None, ttl=0)  # 清除缓存
-                            await asyncio.sleep(1)  # 等待 1 秒后重试
-                            continue
-                            
-                        handle_wechat_api_error(error_code, error_msg)
-                        
-                    return data
-                    
-            except httpx.RequestError as e:
-                if attempt < max_retries - 1:
-                    await asyncio.sleep(2 ** attempt)  # 指数退避
-                    continue
-                else:
-                    raise ToolError(f"网络请求失败：{str(e)}")
-        
-        raise ToolError("API 请求重试次数超限")
+        error_code = data.get("errcode", 0)
+        if error_code != 0:
+            handle_wechat_api_error(error_code, data.get("errmsg", "未知错误"))
+        
+        return data
+    
+    async def _send_request(self, endpoint: str, url: str, params: Dict, method: str) -> Dict[str, Any]:
+        """发送单个 HTTP 请求并记录配额，除 token 过期外的错误码转换为异常"""
+        # 本地账本判定配额已用尽时不再发送请求，避免触发 45009
+        if quota_ledger.is_exhausted(endpoint):
+            handle_quota_exhausted(endpoint, quota_ledger.limit(endpoint))
+        
+        await quota_ledger.record(endpoint)
+        client = http_pool.client
+        if method.upper() == "GET":
+            response = await client.get(url, params=params)
+        else:
+            response = await client.post(url, json=params)
+        
+        response.raise_for_status()
+        data = response.json()
+        
+        error_code = data.get("errcode", 0)
+        if error_code not in (0, 42001):
+            if error_code == 45009:
+                await quota_ledger.mark_exhausted(endpoint)
+            handle_wechat_api_error(error_code, data.get("errmsg", "未知错误"))
+        
+        return data
+    
+    async def _stale_if_low_quota(self, endpoint: str, prefix: str, **kwargs) -> Optional[Any]:
+        """配额即将用尽时返回带 stale 标记的过期缓存，否则返回 None"""
+        if not quota_ledger.is_nearly_exhausted(endpoint):
+            return None
+        stale_data = await cache_manager.aget_stale(prefix, **kwargs)
+        if stale_data is None:
+            return None
+        return mark_stale(stale_data)
     
     async def get_account_info(self) -> Dict[str, Any]:
-        """获取公众号基本信息"""
-        # 检查缓存
-        cached_info = cache_manager.get("account_info")
-        if cached_info:
-            return cached_info
+        """获取公众号基本信息
+        
+        缓存软过期后立即返回旧值并在后台刷新；配额即将用尽时不再刷新，旧值带 stale 标记返回。
+        """
+        low_quota = quota_ledger.is_nearly_exhausted("material/get_materialcount")
         
-        # 获取基本信息（通过获取素材总数来验证权限）
         try:
-            material_count = await self.make_request("material/get_materialcount")
-            
-            account_info = {
-                "name": "当前公众号",  # 无法通过 API 直接获取名称
-                "type": "公众号",
-                "verified": True,  # 能调用 API 说明已认证
-                "status": "正常",
-                "stats": {
-                    "图片素材": material_count.get("image_count", 0),
-                    "语音素材": material_count.get("voice_count", 0),
-                    "视频素材": material_count.get("video_count", 0),
-                    "图文素材": material_count.get("news_count", 0)
-                },
-                "api_quota": {
-                    "access_token获取": "2000次/天",
-                    "素材管理": "10次/天"
-                }
-            }
-            
-            # 缓存 30 分钟
-            cache_manager.set("account_info", account_info, ttl=1800)
-            return account_info
-            
+            account_info = await cache_manager.get_or_revalidate(
+                "account_info",
+                self._fetch_account_info,
+                ttl=1800,  # 缓存 30 分钟
+                stale_ttl=STALE_RETENTION,
+                revalidate=not low_quota
+            )
         except Exception as e:
             raise ToolError(f"获取公众号信息失败：{str(e)}")
+        
+        if low_quota and await cache_manager.aget("account_info") is None:
+            account_info = mark_stale(account_info)
+        
+        # 配额使用情况实时计算，不随缓存过期
+        return {**account_info, "api_quota": quota_ledger.get_report()}
     
-    async def list_articles(self, offset: int = 0, count: int = 10) -> List[Dict[str, Any]]:
-        """获取图文素材列表"""
-        # 检查缓存
-        cache_key = f"articles_list_{offset}_{count}"
-        cached_articles = cache_manager.get("articles_list", offset=offset, count=count)
-        if cached_articles:
-            return cached_articles
+    async def _fetch_account_info(self) -> Dict[str, Any]:
+        """从微信 API 获取公众号基本信息"""
+        # 获取基本信息（通过获取素材总数来验证权限）
+        material_count = await self.make_request("material/get_materialcount")
         
-        params = {
+        return {
+            "name": "当前公众号",  # 无法通过 API 直接获取名称
+            "type": "公众号",
+            "verified": True,  # 能调用 API 说明已认证
+            "status": "正常",
+            "stats": {
+                "图片素材": material_count.get("image_count", 0),
+                "语音素材": material_count.get("voice_count", 0),
+                "视频素材": material_count.get("video_count", 0),
+                "图文素材": material_count.get("news_count", 0)
+            }
+        }
+    
+    async def sync_materials(
+        self,
+        full: bool = False,
+        on_progress: Optional[Callable[[int, int], Awaitable[None]]] = None,
+        until: Optional[int] = None,
+        covered: Optional[Callable[[], Awaitable[bool]]] = None
+    ) -> int:
+        """同步图文素材到本地镜像（单飞）
+        
+        镜像尚未完整同步过或 full=True 时进行全量同步（可跨调用和重启续传，见 _sync_all_pages），
+        until 和 covered（异步判定）限定本次同步的范围；否则按更新时间倒序逐页拉取，遇到镜像中已有的素材即停止。
+        on_progress(已完成页数, 总页数) 在全量同步时按页回调。返回新增、更新或删除的素材数量。
+        """
+        if self._sync_task is None or self._sync_task.done():
+            self._sync_task = asyncio.create_task(self._sync_materials(full, on_progress, until, covered))
+        return await asyncio.shield(self._sync_task)
+    
+    async def _sync_materials(
+        self,
+        full: bool,
+        on_progress: Optional[Callable[[int, int], Awaitable[None]]],
+        until: Optional[int] = None,
+        covered: Optional[Callable[[], Awaitable[bool]]] = None
+    ) -> int:
+        """执行素材同步"""
+        if full or not await material_mirror.is_complete():
+            changed = await self._sync_all_pages(on_progress, until, covered)
+        else:
+            changed = await self._sync_new_pages()
+        
+        await material_mirror.mark_synced()
+        if changed:
+            # 素材有变更：丢弃缓存的文章内容，之后从镜像读取最新版本
+            await cache_manager.invalidate("material")
+        return changed
+    
+    async def _fetch_material_page(self, offset: int) -> List[Dict[str, Any]]:
+        """拉取一页图文素材"""
+        response = await self.make_request("material/batchget_material", {
             "type": "news",  # 图文消息
             "offset": offset,
-            "count": min(count, 20)  # 最多 20 条
-        }
+            "count": MATERIAL_PAGE_SIZE
+        })
+        return response.get("item", [])
+    
+    async def _sync_new_pages(self) -> int:
+        """增量同步：逐页拉取直到追上水位线（配额进入保留区时停止）"""
+        offset = 0
+        changed = 0
+        while not quota_ledger.is_nearly_exhausted("material/batchget_material"):
+            items = await self._fetch_material_page(offset)
+            stored = await material_mirror.store(items)
+            changed += stored
+            
+            # 已追上水位线：本页出现已同步的素材
+            if stored < len(items) or len(items) < MATERIAL_PAGE_SIZE:
+                break
+            offset += len(items)
         
+        return changed
+    
+    async def _sync_all_pages(
+        self,
+        on_progress: Optional[Callable[[int, int], Awaitable[None]]],
+        until: Optional[int] = None,
+        covered: Optional[Callable[[], Awaitable[bool]]] = None
+    ) -> int:
+        """全量同步：从同步游标处续传，最多 page_concurrency 个分页在途，按顺序写入镜像
+        
+        每写入一页即持久化游标，中断（出错、配额不足、重启）后下次从该处继续，不再从 offset 0 重新开始。
+        以下情况不再发起新的分页，本轮同步暂停：批量素材接口配额进入保留区；已拉取到 until；covered() 为 True。
+        拉取到素材末尾后删除本轮未见到的素材并标记镜像完整。
+        """
+        endpoint = "material/batchget_material"
+        cursor = await material_mirror.sync_cursor()
+        if cursor is None:
+            material_count = await self.make_request("material/get_materialcount")
+            cursor = (0, material_count.get("news_count", 0))
+            await material_mirror.begin_full_sync(cursor[1])
+        start, total = cursor
+        end = total if until is None else min(total, until)
+        
+        pending: Deque[Tuple[int, asyncio.Task]] = deque()
+        next_offset = start
+        total_pages = max(0, -(-(end - start) // MATERIAL_PAGE_SIZE))
+        done_pages = 0
+        changed = 0
+        finished = start >= total
         try:
-            response = await self.make_request("material/batchget_material", params)
+            while not finished:
+                while (len(pending) < self.page_concurrency and next_offset < end
+                        and not quota_ledger.is_nearly_exhausted(endpoint, pending=len(pending))
+                        and not (covered and await covered())):
+                    pending.append((next_offset, asyncio.create_task(self._fetch_material_page(next_offset))))
+                    next_offset += MATERIAL_PAGE_SIZE
+                if not pending:
+                    break
+                
+                offset, task = pending.popleft()
+                items = await task
+                changed += await material_mirror.store(items)
+                await material_mirror.advance_sync(offset + len(items), [item.get("media_id", "") for item in items])
+                done_pages += 1
+                if on_progress:
+                    await on_progress(done_pages, total_pages)
+                finished = offset + MATERIAL_PAGE_SIZE >= total or len(items) < MATERIAL_PAGE_SIZE
+        finally:
+            for _, task in pending:
+                task.cancel()
+            await asyncio.gather(*(task for _, task in pending), return_exceptions=True)
+        
+        if finished:
+            # 清理已在公众号后台删除的素材
+            changed += await material_mirror.finish_full_sync()
+        return changed
+    
+    def _revalidate_mirror(self) -> None:
+        """在后台调度一次同步（已有同步在途时不重复调度）"""
+        if self._sync_task is None or self._sync_task.done():
+            self._sync_task = asyncio.create_task(self._sync_materials(False, None))
+            # 后台同步失败时保留现有镜像，下次读取再试
+            self._sync_task.add_done_callback(lambda t: t.cancelled() or t.exception())
+    
+    async def _ensure_mirror(
+        self,
+        offset: int = 0,
+        count: Optional[int] = None,
+        changed_since: Optional[int] = None,
+        on_progress: Optional[Callable[[int, int], Awaitable[None]]] = None
+    ) -> Optional[str]:
+        """按需同步镜像，使其能回答 list(offset, count, changed_since)；镜像数据可能已过期时返回原因，否则返回 None
+        
+        镜像已覆盖所查询的区间（见 MaterialMirror.covers）时：未超过同步间隔直接返回；
+        超过同步间隔但未超过 mirror_stale_window 时，直接返回现有镜像并在后台同步。
+        其余情况等待同步到覆盖该区间为止，同步失败但镜像已覆盖该区间时返回现有数据；
+        配额进入保留区、同步无法继续时抛出 QuotaExhaustedError。
+        """
+        async def covered() -> bool:
+            return await material_mirror.covers(offset, count, changed_since)
+        
+        if await covered():
+            if await material_mirror.is_fresh(self.mirror_sync_interval):
+                return None
+            
+            # 配额即将用尽时直接使用本地镜像
+            if quota_ledger.is_nearly_exhausted("material/batchget_material"):
+                return STALE_QUOTA
+            
+            # 镜像软过期：立即返回现有数据，后台同步
+            if await material_mirror.is_fresh(self.mirror_sync_interval + self.mirror_stale_window):
+                self._revalidate_mirror()
+                return None
+        
+        until = offset + count if count is not None and changed_since is None else None
+        try:
+            # 第二次用于等待在途的同步（可能只覆盖了更小的区间）结束后，按本次查询继续同步
+            for _ in range(2):
+                await self.sync_materials(on_progress=on_progress, until=until, covered=covered)
+                if await covered():
+                    return None
+        except Exception:
+            if await covered():
+                return STALE_SYNC_FAILED
+            raise
+        
+        cursor = await material_mirror.sync_cursor()
+        handle_mirror_incomplete(await material_mirror.count(), cursor[1] if cursor else None)
+    
+    async def list_articles(
+        self,
+        offset: int = 0,
+        count: Optional[int] = 10,
+        changed_since: Optional[int] = None,
+        on_progress: Optional[Callable[[int, int], Awaitable[None]]] = None
+    ) -> List[Dict[str, Any]]:
+        """获取图文素材列表（从本地镜像读取）
+        
+        count 为 None 时返回 offset 之后的全部素材；changed_since 为 Unix 时间戳，
+        指定时只返回此后更新过的素材。
+        """
+        try:
+            stale_reason = await self._ensure_mirror(offset, count, changed_since, on_progress)
             
             articles = []
-            items = response.get("item", [])
+            for material in await material_mirror.list(offset, count, changed_since):
+                for news_item in material["news_items"]:
+                    articles.append(_build_list_article(material["media_id"], material["update_time"], news_item))
             
-            for item in items:
-                media_id = item.get("media_id", "")
-                update_time = item.get("update_time", 0)
-                
-                # 获取图文消息内容
-                content = item.get("content", {})
-                news_items = content.get("news_item", [])
-                
-                for news_item in news_items:
-                    article = {
-                        "media_id": media_id,
-                        "title": news_item.get("title", ""),
-                        "author": news_item.get("author", ""),
-                        "digest": news_item.get("digest", ""),
-                        "url": news_item.get("url", ""),
-                        "content_source_url": news_item.get("content_source_url", ""),
-                        "thumb_media_id": news_item.get("thumb_media_id", ""),
-                        "show_cover_pic": news_item.get("show_cover_pic", 0),
-                        "update_time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(update_time))
-                    }
-                    articles.append(article)
-            
-            # 缓存 30 分钟
-            cache_manager.set("articles_list", articles, ttl=1800, offset=offset, count=count)
-            return articles
+            return mark_stale(articles, stale_reason) if stale_reason else articles
             
         except Exception as e:
             raise ToolError(f"获取文章列表失败：{str(e)}")
     
-    async def get_article_content(self, media_id: str) -> Dict[str, Any]:
-        """获取文章详细内容"""
+    async def _get_local_article(self, media_id: str) -> Optional[Dict[str, Any]]:
+        """从缓存或本地镜像读取文章详情，不发起上游请求"""
         # 检查缓存
-        cached_content = cache_manager.get("article_content", media_id=media_id)
+        cached_content = await cache_manager.aget("article_content", media_id=media_id)
         if cached_content:
             return cached_content
         
+        # 本地镜像中已有该素材时直接读取
+        material = await material_mirror.get(media_id)
+        if material and material["news_items"]:
+            return _build_content_article(media_id, material["news_items"][0])
+        
+        return None
+    
+    async def get_article_content(self, media_id: str, force_retry: bool = False) -> Dict[str, Any]:
+        """获取文章详细内容
+        
+        上游返回的错误（如无效 media_id）按错误类型短期缓存，期间相同请求直接返回该错误；
+        force_retry=True 时忽略缓存的错误。
+        """
+        local_content = await self._get_local_article(media_id)
+        if local_content:
+            return local_content
+        
+        stale_content = await self._stale_if_low_quota("material/get_material", "article_content", media_id=media_id)
+        if stale_content:
+            return stale_content
+        
+        if not force_retry:
+            cached_error = await cache_manager.aget_negative("article_content", media_id=media_id)
+            if cached_error:
+                raise_cached_error(*cached_error)
+        
         params = {
             "media_id": media_id
         }
@@ -216,39 +641,55 @@ class WeChatAPIClient:
             # 解析响应
             news_items = response.get("news_item", [])
             if not news_items:
-                raise ToolError(f"未找到 media_id 为 {media_id} 的文章")
+                raise WeChatAPIError(f"未找到 media_id 为 {media_id} 的文章")
             
             # 取第一篇文章（通常图文消息只有一篇）
-            news_item = news_items[0]
-            
-            article = {
-                "media_id": media_id,
-                "title": news_item.get("title", ""),
-                "author": news_item.get("author", ""),
-                "digest": news_item.get("digest", ""),
-                "content": news_item.get("content", ""),
-                "content_source_url": news_item.get("content_source_url", ""),
-                "url": news_item.get("url", ""),
-                "thumb_media_id": news_item.get("thumb_media_id", ""),
-                "show_cover_pic": news_item.get("show_cover_pic", 0),
-                "need_open_comment": news_item.get("need_open_comment", 0),
-                "only_fans_can_comment": news_item.get("only_fans_can_comment", 0)
-            }
-            
-            # 估算字数和阅读时间
-            content = article.get("content", "")
-            word_count = len(content)
-            read_time_minutes = max(1, word_count // 300)  # 按每分钟 300 字计算
-            
-            article["word_count"] = word_count
-            article["read_time_minutes"] = read_time_minutes
+            article = _build_content_article(media_id, news_items[0])
             
             # 缓存 24 小时
-            cache_manager.set("article_content", article, ttl=86400, media_id=media_id)
+            cache_manager.set(
+                "article_content", article, ttl=86400, stale_ttl=STALE_RETENTION, tags=("material",),
+                bodies=("content",), media_id=media_id
+            )
             return article
             
         except Exception as e:
-            raise ToolError(f"获取文章内容失败：{str(e)}")
+            # 首次失败与负缓存重放使用同一段错误文本
+            message = f"获取文章内容失败：{str(e)}"
+            cache_manager.set_negative(
+                "article_content", describe_error(e, message), resilience.negative_ttl(e), media_id=media_id
+            )
+            raise ToolError(message)
+    
+    async def get_article_contents(self, media_ids: List[str], force_retry: bool = False) -> List[Dict[str, Any]]:
+        """批量获取文章详细内容
+        
+        缓存和本地镜像命中的文章直接返回，其余文章在 batch_concurrency 限制下并发获取。
+        按输入顺序（去重后）返回 {"media_id", "article"} 或 {"media_id", "error"}。
+        """
+        media_ids = list(dict.fromkeys(media_ids))
+        results: Dict[str, Dict[str, Any]] = {}
+        misses = []
+        
+        for media_id in media_ids:
+            article = await self._get_local_article(media_id)
+            if article:
+                results[media_id] = {"media_id": media_id, "article": article}
+            else:
+                misses.append(media_id)
+        
+        semaphore = asyncio.Semaphore(self.batch_concurrency)
+        
+        async def fetch(media_id: str) -> None:
+            async with semaphore:
+                try:
+                    article = await self.get_article_content(media_id, force_retry)
+                    results[media_id] = {"media_id": media_id, "article": article}
+                except Exception as e:
+                    results[media_id] = {"media_id": media_id, "error": str(e)}
+        
+        await asyncio.gather(*(fetch(media_id) for media_id in misses))
+        return [results[media_id] for media_id in media_ids]
 
 
 # 全局客户端实例
@@ -1,104 +1,890 @@
 """
 缓存管理
 
-提供内存和文件缓存功能，优化 API 调用性能。
+提供内存和磁盘（SQLite）缓存功能，优化 API 调用性能。
 """
 
-import json
-import time
+import os
+import re
 import hashlib
+import time
+import asyncio
+import sqlite3
+import threading
+from collections import OrderedDict
 from pathlib import Path
-from typing import Any, Optional, Dict
+from typing import Any, Awaitable, Callable, Optional, Dict, Iterable, List, Tuple
+
+from .serializer import CacheSerializer, default_serializer
+from .cache_metrics import CacheMetrics, dump_metrics, key_prefix
+from .config import env_int, env_float
+
+
+# 旧版缓存文件名：<md5>.json
+_LEGACY_CACHE_FILE = re.compile(r"^[0-9a-f]{32}\.json$")
+
+# 正文引用标记：元数据条目中被替换为 {"$body": <sha256>} 的字段
+_BODY_REF = "$body"
+_BODY_PREFIX = "body"
 
 
 class CacheManager:
-    """缓存管理器"""
+    """缓存管理器
+    
+    内存层为按字节预算的 LRU；磁盘层为单个 SQLite 文件（WAL 模式），条目经 CacheSerializer 编码，
+    多个进程可共享同一缓存目录。在事件循环中，磁盘读取通过线程池执行，写入进入合并写回队列由后台任务落盘。
+    """
     
-    def __init__(self, cache_dir: str = ".cache"):
+    def __init__(self, cache_dir: str = ".cache", serializer: Optional[CacheSerializer] = None):
         self.cache_dir = Path(cache_dir)
-        self.cache_dir.mkdir(exist_ok=True)
-        self.memory_cache: Dict[str, Dict[str, Any]] = {}
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.cache_dir / "cache.db"
+        self.serializer = serializer or default_serializer()
         
-    def _get_cache_key(self, prefix: str, **kwargs) -> str:
-        """生成缓存键"""
-        key_data = f"{prefix}_{json.dumps(kwargs, sort_keys=True)}"
-        return hashlib.md5(key_data.encode()).hexdigest()
+        # 内存层：按字节预算的 LRU，淘汰的条目仍保留在磁盘
+        self.memory_budget = env_int("WECHAT_CACHE_MEMORY_BYTES", 64 * 1024 * 1024)
+        self.memory_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.memory_bytes = 0
+        self._memory_sizes: Dict[str, int] = {}
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "negative_hits": 0}
+        self._refresh_tasks: Dict[str, asyncio.Task] = {}
+        self._conn: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.RLock()
+        
+        # 写回队列：同一键的多次写入只保留最后一次，由后台任务批量落盘
+        self.flush_delay = env_float("WECHAT_CACHE_FLUSH_DELAY", 0.05)
+        self._pending: Dict[str, Tuple[Dict[str, Any], bytes, int]] = {}
+        self._writing: Dict[str, Tuple[Dict[str, Any], bytes, int]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        # 已删除但磁盘删除尚未完成的键 -> 删除时间，早于该时间写入的磁盘条目视为不存在
+        self._tombstones: Dict[str, float] = {}
+        
+        # 磁盘层：字节预算和后台压缩；_accessed 记录上次压缩以来读取过的键 -> 访问时间
+        self.disk_budget = env_int("WECHAT_CACHE_DISK_BYTES", 512 * 1024 * 1024)
+        self.compact_interval = env_float("WECHAT_CACHE_COMPACT_INTERVAL", 600)
+        self._accessed: Dict[str, float] = {}
+        self._compact_task: Optional[asyncio.Task] = None
+        self.last_compaction: Optional[Dict[str, Any]] = None
+        self._disk_usage: Dict[str, Dict[str, int]] = {}
+        
+        # 按前缀的指标；设置 metrics_file 时后台任务每隔 metrics_interval 秒写入一次快照
+        self.metrics = CacheMetrics()
+        self.metrics_file = os.getenv("WECHAT_CACHE_METRICS_FILE", "")
+        self.metrics_interval = env_float("WECHAT_CACHE_METRICS_INTERVAL", 60)
+        self._metrics_task: Optional[asyncio.Task] = None
     
-    def get(self, prefix: str, ttl: int = 3600, **kwargs) -> Optional[Any]:
-        """获取缓存"""
-        cache_key = self._get_cache_key(prefix, **kwargs)
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """延迟打开缓存数据库，首次打开时迁移旧版 JSON 文件缓存"""
+        with self._db_lock:
+            return self._open()
+    
+    def _open(self) -> sqlite3.Connection:
+        """打开数据库连接（调用方持有 _db_lock）"""
+        if self._conn is None:
+            # 其他进程持有写锁时最多等待 30 秒
+            conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False)
+            # 只对新建的数据库生效；旧数据库在首次压缩时转换
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    data BLOB NOT NULL,
+                    expires_at REAL NOT NULL,
+                    remove_at REAL NOT NULL,
+                    created_at REAL NOT NULL,
+                    size INTEGER NOT NULL DEFAULT 0,
+                    accessed_at REAL NOT NULL DEFAULT 0
+                );
+                CREATE INDEX IF NOT EXISTS idx_entries_remove_at ON entries (remove_at);
+                CREATE TABLE IF NOT EXISTS tags (
+                    tag TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    PRIMARY KEY (tag, key)
+                );
+                CREATE INDEX IF NOT EXISTS idx_tags_key ON tags (key);
+            """)
+            self._migrate(conn)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_accessed_at ON entries (accessed_at)")
+            self._conn = conn
+            self._remove_legacy_files()
+        return self._conn
+    
+    def _migrate(self, conn: sqlite3.Connection) -> None:
+        """为旧版数据库补充淘汰索引所需的 size 和 accessed_at 列"""
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(entries)")}
+        migrations = {
+            "size": ("INTEGER NOT NULL DEFAULT 0", "length(data)"),
+            "accessed_at": ("REAL NOT NULL DEFAULT 0", "created_at"),
+        }
+        for column, (definition, initial) in migrations.items():
+            if column in columns:
+                continue
+            try:
+                with conn:
+                    conn.execute(f"ALTER TABLE entries ADD COLUMN {column} {definition}")
+                    conn.execute(f"UPDATE entries SET {column} = {initial}")
+            except sqlite3.OperationalError:
+                pass  # 其他进程已完成迁移
+    
+    def _remove_legacy_files(self) -> None:
+        """删除旧版 .cache/<md5>.json 文件缓存（其键格式已不再使用）"""
+        for cache_file in self.cache_dir.glob("*.json"):
+            # 只处理缓存条目文件，跳过配额账本等其他 JSON 文件
+            if not _LEGACY_CACHE_FILE.match(cache_file.name):
+                continue
+            try:
+                cache_file.unlink()
+            except OSError:
+                pass
+    
+    def _write_batch(self, batch: Dict[str, Tuple[Dict[str, Any], bytes, int]]) -> None:
+        """在一个事务中写入多条磁盘缓存及其标签"""
+        current_time = time.time()
+        rows = [
+            (
+                cache_key,
+                payload,
+                cache_data["expires_at"],
+                cache_data.get("stale_until", cache_data["expires_at"]),
+                cache_data.get("created_at", current_time),
+                len(payload),
+                current_time
+            )
+            for cache_key, (cache_data, payload, _) in batch.items()
+        ]
+        tag_rows = [
+            (tag, cache_key)
+            for cache_key, (cache_data, _, _) in batch.items()
+            for tag in cache_data.get("tags", ())
+        ]
+        # 正文条目内容相同，多个进程或元数据条目写入同一正文时保留最晚的过期时间
+        body_rows = [row for row in rows if row[0].startswith(f"{_BODY_PREFIX}|")]
+        rows = [row for row in rows if not row[0].startswith(f"{_BODY_PREFIX}|")]
+        with self._db_lock:
+            conn = self._open()
+            with conn:
+                conn.executemany("DELETE FROM tags WHERE key = ?", [(key,) for key in batch])
+                conn.executemany(
+                    "INSERT OR REPLACE INTO entries (key, data, expires_at, remove_at, created_at, size, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+                conn.executemany(
+                    "INSERT INTO entries (key, data, expires_at, remove_at, created_at, size, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (key) DO UPDATE SET "
+                    "expires_at = max(expires_at, excluded.expires_at), remove_at = max(remove_at, excluded.remove_at), "
+                    "accessed_at = max(accessed_at, excluded.accessed_at)",
+                    body_rows
+                )
+                conn.executemany("INSERT OR IGNORE INTO tags (tag, key) VALUES (?, ?)", tag_rows)
+    
+    def _delete(self, cache_key: str, before: Optional[float] = None) -> None:
+        """删除一条磁盘缓存；指定 before 时只删除该时间之前写入的条目"""
+        with self._db_lock:
+            conn = self._open()
+            with conn:
+                if before is None:
+                    cursor = conn.execute("DELETE FROM entries WHERE key = ?", (cache_key,))
+                else:
+                    cursor = conn.execute(
+                        "DELETE FROM entries WHERE key = ? AND created_at <= ?", (cache_key, before)
+                    )
+                if cursor.rowcount:
+                    conn.execute("DELETE FROM tags WHERE key = ?", (cache_key,))
+    
+    def _delete_tag(self, tag: str, before: float) -> List[str]:
+        """删除带有 tag 且在 before 之前写入的磁盘条目，返回被删除的键"""
+        with self._db_lock:
+            conn = self._open()
+            with conn:
+                keys = [
+                    row[0] for row in conn.execute(
+                        "SELECT t.key FROM tags t JOIN entries e ON e.key = t.key "
+                        "WHERE t.tag = ? AND e.created_at <= ?",
+                        (tag, before)
+                    )
+                ]
+                conn.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key in keys])
+                conn.executemany("DELETE FROM tags WHERE key = ?", [(key,) for key in keys])
+        return keys
+    
+    def _schedule_flush(self) -> None:
+        """调度写回；不在事件循环中时直接同步落盘"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._flush_pending()
+            return
+        
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = loop.create_task(self._flush_later())
+    
+    async def _flush_later(self) -> None:
+        """等待片刻合并写入，然后在线程池中批量落盘，直到队列清空"""
+        await asyncio.sleep(self.flush_delay)
+        while self._pending:
+            self._writing, self._pending = self._pending, {}
+            try:
+                await asyncio.to_thread(self._write_batch, self._writing)
+            except sqlite3.Error:
+                pass  # 磁盘缓存失败不影响功能
+            finally:
+                self._writing = {}
+    
+    def _flush_pending(self) -> None:
+        """同步写入队列中的全部条目"""
+        batch, self._pending = self._pending, {}
+        if batch:
+            try:
+                self._write_batch(batch)
+            except sqlite3.Error:
+                pass  # 磁盘缓存失败不影响功能
+    
+    async def flush(self) -> None:
+        """等待写回队列全部落盘（服务器关闭时调用）"""
+        if self._flush_task is not None and not self._flush_task.done():
+            await self._flush_task
+        if self._pending:
+            batch, self._pending = self._pending, {}
+            try:
+                await asyncio.to_thread(self._write_batch, batch)
+            except sqlite3.Error:
+                pass  # 磁盘缓存失败不影响功能
+        
+    def _remember(self, cache_key: str, cache_data: Dict[str, Any], size: int) -> None:
+        """放入内存层，超出字节预算时淘汰最久未使用的条目"""
+        self._forget(cache_key)
+        if size > self.memory_budget:
+            return  # 超过整个预算的条目只保存在磁盘
+        
+        self.memory_cache[cache_key] = cache_data
+        self._memory_sizes[cache_key] = size
+        self.memory_bytes += size
         
-        # 检查内存缓存
+        while self.memory_bytes > self.memory_budget:
+            evicted_key, _ = self.memory_cache.popitem(last=False)
+            self.memory_bytes -= self._memory_sizes.pop(evicted_key, 0)
+            self.stats["evictions"] += 1
+            self.metrics.record_eviction(evicted_key)
+    
+    def _forget(self, cache_key: str) -> None:
+        """从内存层移除条目"""
+        if self.memory_cache.pop(cache_key, None) is not None:
+            self.memory_bytes -= self._memory_sizes.pop(cache_key, 0)
+    
+    def _get_cache_key(self, prefix: str, **kwargs) -> str:
+        """生成缓存键：prefix 加按参数名排序的 name=repr(value)，repr 保证参数边界无歧义"""
+        if not kwargs:
+            return prefix
+        return prefix + "".join(f"|{name}={kwargs[name]!r}" for name in sorted(kwargs))
+    
+    def _is_removable(self, cache_data: Dict[str, Any], current_time: float) -> bool:
+        """条目是否已超过过期数据保留期，可以删除"""
+        return current_time >= cache_data.get("stale_until", cache_data["expires_at"])
+    
+    def _load_memory(self, cache_key: str, current_time: float) -> Optional[Dict[str, Any]]:
+        """从内存层或写回队列读取条目"""
         if cache_key in self.memory_cache:
             cache_data = self.memory_cache[cache_key]
-            if time.time() < cache_data["expires_at"]:
-                return cache_data["data"]
-            else:
-                del self.memory_cache[cache_key]
+            if not self._is_removable(cache_data, current_time):
+                self.memory_cache.move_to_end(cache_key)
+                self.stats["memory_hits"] += 1
+                self._accessed[cache_key] = current_time
+                return cache_data
+            self._forget(cache_key)
+        
+        # 已淘汰出内存但尚未落盘的条目
+        pending = self._pending.get(cache_key) or self._writing.get(cache_key)
+        if pending is not None and not self._is_removable(pending[0], current_time):
+            cache_data, _, size = pending
+            self.stats["memory_hits"] += 1
+            self._remember(cache_key, cache_data, size)
+            return cache_data
         
-        # 检查文件缓存
-        cache_file = self.cache_dir / f"{cache_key}.json"
-        if cache_file.exists():
-            try:
-                with open(cache_file, 'r', encoding='utf-8') as f:
-                    cache_data = json.load(f)
-                    
-                if time.time() < cache_data["expires_at"]:
-                    # 加载到内存缓存
-                    self.memory_cache[cache_key] = cache_data
-                    return cache_data["data"]
-                else:
-                    cache_file.unlink()  # 删除过期文件
-            except (json.JSONDecodeError, KeyError):
-                cache_file.unlink()  # 删除损坏文件
-                
         return None
     
-    def set(self, prefix: str, data: Any, ttl: int = 3600, **kwargs) -> None:
-        """设置缓存"""
+    def _read_disk(self, cache_key: str, current_time: float) -> Optional[Tuple[Dict[str, Any], int]]:
+        """从磁盘读取并解码条目，返回 (条目, 未压缩字节数)；过期或损坏的条目会被删除（可在线程池中执行）"""
+        with self._db_lock:
+            row = self._open().execute(
+                "SELECT data, expires_at, remove_at, created_at FROM entries WHERE key = ?", (cache_key,)
+            ).fetchone()
+        if row is None:
+            return None
+        
+        data, expires_at, remove_at, created_at = row
+        if current_time >= remove_at:
+            self._delete(cache_key)  # 删除过期条目
+            return None
+        
+        try:
+            value, size = self.serializer.decode(data)
+        except ValueError:
+            self._delete(cache_key)  # 删除损坏条目
+            return None
+        cache_data = {"data": value, "expires_at": expires_at, "created_at": created_at}
+        if remove_at > expires_at:
+            cache_data["stale_until"] = remove_at
+        
+        return cache_data, size
+    
+    def _accept_disk(self, cache_key: str, result: Optional[Tuple[Dict[str, Any], int]]) -> Optional[Dict[str, Any]]:
+        """记录磁盘读取结果并加载到内存层"""
+        deleted_at = self._tombstones.get(cache_key)
+        if result is not None and deleted_at is not None and result[0]["created_at"] <= deleted_at:
+            result = None  # 已删除，磁盘删除尚未完成
+        
+        if result is None:
+            self.stats["misses"] += 1
+            return None
+        
+        cache_data, size = result
+        self.stats["disk_hits"] += 1
+        self._accessed[cache_key] = time.time()
+        self._remember(cache_key, cache_data, size)
+        return cache_data
+    
+    async def _aload(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        """异步读取缓存条目，磁盘读取在线程池中执行
+        
+        内存中的条目已软过期时仍读取磁盘：其他进程可能已写入更新的值，按 created_at 保留较新的一份，
+        避免每个进程各自回源消耗配额。
+        """
+        current_time = time.time()
+        cache_data = self._load_memory(cache_key, current_time)
+        if cache_data is not None and current_time < cache_data["expires_at"]:
+            return cache_data
+        result = await asyncio.to_thread(self._read_disk, cache_key, current_time)
+        current = self.memory_cache.get(cache_key)
+        if current is not None and current is not cache_data:
+            return current  # 读取期间已写入更新的值
+        if result is None or (cache_data is not None and result[0]["created_at"] <= cache_data["created_at"]):
+            return cache_data if cache_data is not None else self._accept_disk(cache_key, None)
+        return self._accept_disk(cache_key, result) or cache_data
+    
+    def _body_key(self, digest: str) -> str:
+        """正文条目的缓存键"""
+        return self._get_cache_key(_BODY_PREFIX, digest=digest)
+    
+    def _body_refs(self, data: Any) -> Dict[str, str]:
+        """元数据条目中引用的正文：字段名 -> 正文哈希"""
+        if not isinstance(data, dict):
+            return {}
+        return {
+            field: value[_BODY_REF] for field, value in data.items()
+            if isinstance(value, dict) and _BODY_REF in value
+        }
+    
+    async def _aresolve(self, data: Any) -> Optional[Any]:
+        """异步还原元数据条目引用的正文"""
+        refs = self._body_refs(data)
+        if not refs:
+            return data
+        resolved = dict(data)
+        for field, digest in refs.items():
+            body = await self._aload(self._body_key(digest))
+            if body is None:
+                return None
+            resolved[field] = body["data"]
+        return resolved
+    
+    def _set_body(self, body: str, remove_at: float) -> str:
+        """按内容哈希保存正文，返回哈希；相同正文已缓存时只延长其保留期"""
+        digest = hashlib.sha256(body.encode("utf-8")).hexdigest()
+        cache_key = self._body_key(digest)
+        
+        existing = self.memory_cache.get(cache_key)
+        if existing is not None and existing["expires_at"] >= remove_at:
+            self.memory_cache.move_to_end(cache_key)
+            return digest
+        
+        started = time.perf_counter()
+        cache_data = {"data": body, "expires_at": remove_at, "created_at": time.time()}
+        payload, size = self.serializer.encode(body)
+        self.metrics.record_set(_BODY_PREFIX, len(payload), started)
+        self._remember(cache_key, cache_data, size)
+        self._pending[cache_key] = (cache_data, payload, size)
+        return digest
+    
+    def _outcome(self, cache_data: Optional[Dict[str, Any]], data: Optional[Any]) -> str:
+        """读取结果分类：hit（未过期）、stale（过期数据降级返回）、miss"""
+        if data is None:
+            return "miss"
+        return "hit" if time.time() < cache_data["expires_at"] else "stale"
+    
+    async def aget(self, prefix: str, **kwargs) -> Optional[Any]:
+        """异步获取缓存（不阻塞事件循环）"""
+        started = time.perf_counter()
+        cache_data = await self._aload(self._get_cache_key(prefix, **kwargs))
+        data = None
+        if cache_data is not None and time.time() < cache_data["expires_at"]:
+            data = await self._aresolve(cache_data["data"])
+        self.metrics.record_get(prefix, self._outcome(cache_data, data), started)
+        return data
+    
+    async def aget_stale(self, prefix: str, **kwargs) -> Optional[Any]:
+        """异步获取缓存，允许返回已过期但仍在保留期内的数据"""
+        started = time.perf_counter()
+        cache_data = await self._aload(self._get_cache_key(prefix, **kwargs))
+        data = await self._aresolve(cache_data["data"]) if cache_data is not None else None
+        self.metrics.record_get(prefix, self._outcome(cache_data, data), started)
+        return data
+    
+    async def aget_shared(self, prefix: str, **kwargs) -> Optional[Any]:
+        """跳过内存层读取未过期的缓存，可读取到其他进程写入的最新值"""
+        started = time.perf_counter()
+        cache_key = self._get_cache_key(prefix, **kwargs)
+        current_time = time.time()
+        
+        pending = self._pending.get(cache_key) or self._writing.get(cache_key)
+        if pending is not None:
+            cache_data = pending[0]
+        else:
+            result = await asyncio.to_thread(self._read_disk, cache_key, current_time)
+            cache_data = self._accept_disk(cache_key, result)
+        
+        data = None
+        if cache_data is not None and current_time < cache_data["expires_at"]:
+            data = await self._aresolve(cache_data["data"])
+        self.metrics.record_get(prefix, self._outcome(cache_data, data), started)
+        return data
+    
+    async def get_or_revalidate(
+        self,
+        prefix: str,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: int = 3600,
+        stale_ttl: int = 0,
+        revalidate: bool = True,
+        **kwargs
+    ) -> Any:
+        """获取缓存（stale-while-revalidate）
+        
+        ttl 内（软过期前）直接返回缓存；软过期后、硬过期（ttl + stale_ttl）前立即返回旧值，
+        并在后台调度一次刷新；没有可用缓存时等待 loader 加载。同一键的刷新会合并为一次。
+        revalidate=False 时只返回旧值，不调度后台刷新。
+        """
+        started = time.perf_counter()
+        cache_key = self._get_cache_key(prefix, **kwargs)
+        cache_data = await self._aload(cache_key)
+        data = await self._aresolve(cache_data["data"]) if cache_data is not None else None
+        self.metrics.record_get(prefix, self._outcome(cache_data, data), started)
+        
+        if data is not None:
+            if time.time() >= cache_data["expires_at"] and revalidate:
+                self._refresh(cache_key, prefix, loader, ttl, stale_ttl, kwargs)
+            return data
+        
+        return await asyncio.shield(self._refresh(cache_key, prefix, loader, ttl, stale_ttl, kwargs))
+    
+    def _refresh(
+        self,
+        cache_key: str,
+        prefix: str,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: int,
+        stale_ttl: int,
+        kwargs: Dict[str, Any]
+    ) -> asyncio.Task:
+        """调度（或复用在途的）刷新任务，加载成功后写入缓存"""
+        task = self._refresh_tasks.get(cache_key)
+        if task is not None and not task.done():
+            return task
+        
+        async def refresh() -> Any:
+            data = await loader()
+            self.set(prefix, data, ttl=ttl, stale_ttl=stale_ttl, **kwargs)
+            return data
+        
+        task = asyncio.create_task(refresh())
+        self._refresh_tasks[cache_key] = task
+        task.add_done_callback(lambda t: self._release_refresh(cache_key, t))
+        return task
+    
+    def _release_refresh(self, cache_key: str, task: asyncio.Task) -> None:
+        """刷新完成后移除任务记录；后台刷新失败时保留旧值"""
+        if self._refresh_tasks.get(cache_key) is task:
+            del self._refresh_tasks[cache_key]
+        if not task.cancelled():
+            task.exception()  # 标记异常已读取，避免无人等待时的告警
+    
+    async def cancel_refreshes(self) -> None:
+        """取消在途的后台刷新（由服务器 lifespan 在关闭连接池前调用）"""
+        tasks = list(self._refresh_tasks.values())
+        self._refresh_tasks.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    
+    def set(
+        self,
+        prefix: str,
+        data: Any,
+        ttl: int = 3600,
+        stale_ttl: int = 0,
+        tags: Iterable[str] = (),
+        bodies: Iterable[str] = (),
+        **kwargs
+    ) -> None:
+        """设置缓存
+        
+        ttl 为软过期时间；stale_ttl 为软过期后继续保留的秒数（硬过期 = ttl + stale_ttl），
+        保留期内的数据可通过 aget_stale 或 get_or_revalidate 读取。tags 用于 invalidate 批量失效。
+        bodies 为 data（字典）中按内容寻址单独存储的正文字段，条目本身只保存正文哈希。
+        """
+        started = time.perf_counter()
         cache_key = self._get_cache_key(prefix, **kwargs)
         expires_at = time.time() + ttl
         
+        if bodies and isinstance(data, dict):
+            # 正文保留到元数据条目硬过期之后，保证过期数据降级读取时正文仍在
+            remove_at = expires_at + max(stale_ttl, 0)
+            data = dict(data)
+            for field in bodies:
+                if isinstance(data.get(field), str) and data[field]:
+                    data[field] = {_BODY_REF: self._set_body(data[field], remove_at)}
+        
         cache_data = {
             "data": data,
             "expires_at": expires_at,
             "created_at": time.time()
         }
+        if stale_ttl > 0:
+            cache_data["stale_until"] = expires_at + stale_ttl
+        if tags:
+            cache_data["tags"] = tuple(tags)
+        
+        try:
+            payload, size = self.serializer.encode(data)
+        except (TypeError, ValueError):
+            return  # 无法序列化的数据不缓存
         
         # 保存到内存缓存
-        self.memory_cache[cache_key] = cache_data
+        self._remember(cache_key, cache_data, size)
         
-        # 保存到文件缓存
-        cache_file = self.cache_dir / f"{cache_key}.json"
-        try:
-            with open(cache_file, 'w', encoding='utf-8') as f:
-                json.dump(cache_data, f, ensure_ascii=False, indent=2)
-        except Exception:
-            pass  # 文件缓存失败不影响功能
+        # 加入写回队列，同一键的重复写入合并为一次
+        self._pending[cache_key] = (cache_data, payload, size)
+        self.metrics.record_set(prefix, len(payload), started)
+        self._schedule_flush()
+    
+    async def _aload_ranges(self, prefix: str, kwargs: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """读取未过期的区间缓存条目（不计入指标）"""
+        cache_data = await self._aload(self._get_cache_key(f"range:{prefix}", **kwargs))
+        if cache_data is not None and time.time() < cache_data["expires_at"]:
+            return cache_data["data"]
+        return None
     
-    def clear_expired(self) -> None:
-        """清理过期缓存"""
+    async def aget_range(self, prefix: str, start: int, count: int, **kwargs) -> Optional[List[Any]]:
+        """读取区间 [start, start + count)；被某个未过期的连续区间覆盖（或已到达结果末尾）时返回切片"""
+        started = time.perf_counter()
+        items = self._slice_range(await self._aload_ranges(prefix, kwargs), start, count)
+        self.metrics.record_get(f"range:{prefix}", "miss" if items is None else "hit", started)
+        return items
+    
+    def _slice_range(self, ranges: Optional[Dict[str, Any]], start: int, count: int) -> Optional[List[Any]]:
+        """从区间缓存中取出 [start, start + count)，未被覆盖时返回 None"""
+        if not ranges:
+            return None
+        
+        end = start + count
+        total = ranges.get("total")
+        if total is not None:
+            end = min(end, total)
+            if start >= end:
+                return []
+        
+        current_time = time.time()
+        for seg_start, items, expires_at in ranges["segments"]:
+            if current_time < expires_at and seg_start <= start and end <= seg_start + len(items):
+                return items[start - seg_start:end - seg_start]
+        return None
+    
+    async def set_range(
+        self,
+        prefix: str,
+        start: int,
+        items: List[Any],
+        total: Optional[int] = None,
+        ttl: int = 3600,
+        tags: Iterable[str] = (),
+        **kwargs
+    ) -> None:
+        """缓存区间 [start, start + len(items))，与已缓存的重叠或相邻区间合并；total 为已知的结果总数"""
         current_time = time.time()
+        ranges = await self._aload_ranges(prefix, kwargs) or {"segments": []}
+        end = start + len(items)
+        
+        # 旧区间去掉与新区间重叠的部分（新数据优先），丢弃已过期的区间
+        segments = [[start, list(items), current_time + ttl]]
+        for seg_start, seg_items, expires_at in ranges["segments"]:
+            if expires_at <= current_time:
+                continue
+            seg_end = seg_start + len(seg_items)
+            if seg_start < start:
+                segments.append([seg_start, seg_items[:max(0, min(seg_end, start) - seg_start)], expires_at])
+            if seg_end > end:
+                cut = max(seg_start, end)
+                segments.append([cut, seg_items[cut - seg_start:], expires_at])
+        
+        # 合并相邻区间，合并后的区间按最早的过期时间过期
+        merged: List[List[Any]] = []
+        for segment in sorted((seg for seg in segments if seg[1]), key=lambda seg: seg[0]):
+            if merged and merged[-1][0] + len(merged[-1][1]) == segment[0]:
+                merged[-1][1] = merged[-1][1] + segment[1]
+                merged[-1][2] = min(merged[-1][2], segment[2])
+            else:
+                merged.append(segment)
+        
+        if total is None:
+            total = ranges.get("total")
+        ttl = max(int(max((seg[2] for seg in merged), default=current_time) - current_time), 1)
+        self.set(f"range:{prefix}", {"segments": merged, "total": total}, ttl=ttl, tags=tags, **kwargs)
+    
+    def set_negative(self, prefix: str, error: Dict[str, Any], ttl: int, **kwargs) -> None:
+        """缓存一次失败结果（负缓存），ttl 内相同请求直接返回该错误；ttl <= 0 时不缓存
+        
+        负缓存条目与正常数据分开存放（键前缀 negative:），不会覆盖可降级读取的旧数据。
+        """
+        if ttl <= 0:
+            return
+        self.set(f"negative:{prefix}", error, ttl=ttl, tags=("negative",), **kwargs)
+    
+    async def aget_negative(self, prefix: str, **kwargs) -> Optional[Tuple[Dict[str, Any], float]]:
+        """读取未过期的负缓存，返回 (错误记录, 剩余秒数)"""
+        started = time.perf_counter()
+        cache_data = await self._aload(self._get_cache_key(f"negative:{prefix}", **kwargs))
+        retry_after = cache_data["expires_at"] - time.time() if cache_data is not None else 0
+        if retry_after <= 0:
+            self.metrics.record_get(f"negative:{prefix}", "miss", started)
+            return None
+        self.stats["negative_hits"] += 1
+        self.metrics.record_get(f"negative:{prefix}", "hit", started)
+        return cache_data["data"], retry_after
+    
+    async def delete(self, prefix: str, **kwargs) -> None:
+        """删除一条缓存（内存、写回队列和磁盘）"""
+        cache_key = self._get_cache_key(prefix, **kwargs)
+        deleted_at = time.time()
+        self._forget(cache_key)
+        self._pending.pop(cache_key, None)
+        self._tombstones[cache_key] = deleted_at
+        try:
+            # 等待在途写回完成，避免旧值在删除后落盘
+            await self.flush()
+            await asyncio.to_thread(self._delete, cache_key, deleted_at)
+        finally:
+            if self._tombstones.get(cache_key) == deleted_at:
+                del self._tombstones[cache_key]
+    
+    async def invalidate(self, tag: str) -> int:
+        """删除所有带有 tag 的缓存条目，返回删除数量
         
-        # 清理内存缓存
+        通过标签索引只访问带该标签的条目；失效开始后写入的新值不受影响。
+        """
+        invalidated_at = time.time()
+        await self.flush()
+        keys = await asyncio.to_thread(self._delete_tag, tag, invalidated_at)
+        for key in keys:
+            cache_data = self.memory_cache.get(key)
+            if cache_data is not None and cache_data["created_at"] <= invalidated_at:
+                self._forget(key)
+        return len(keys)
+    
+    def _clear_expired_memory(self, current_time: float) -> None:
+        """清理内存缓存"""
         expired_keys = [
             key for key, data in self.memory_cache.items()
-            if current_time >= data["expires_at"]
+            if self._is_removable(data, current_time)
         ]
         for key in expired_keys:
-            del self.memory_cache[key]
+            self._forget(key)
+    
+    def _disk_file_bytes(self) -> int:
+        """缓存数据库文件（含 WAL）占用的字节数"""
+        total = 0
+        for path in (self.db_path, self.db_path.with_name(self.db_path.name + "-wal")):
+            try:
+                total += path.stat().st_size
+            except OSError:
+                pass
+        return total
+    
+    def _eviction_order(self, conn: sqlite3.Connection, current_time: float):
+        """淘汰顺序：先是已软过期的条目，再按最近访问时间从旧到新"""
+        yield from conn.execute(
+            "SELECT key, size FROM entries WHERE expires_at <= ? ORDER BY accessed_at", (current_time,)
+        )
+        yield from conn.execute(
+            "SELECT key, size FROM entries WHERE expires_at > ? ORDER BY accessed_at", (current_time,)
+        )
+    
+    def _compact(self, current_time: float, accessed: Dict[str, float]) -> Dict[str, Any]:
+        """写回访问时间，删除过期条目，超出磁盘预算时淘汰到预算的 90%，最后归还空闲页面（在线程池中执行）"""
+        file_bytes = self._disk_file_bytes()
+        with self._db_lock:
+            conn = self._open()
+            with conn:
+                conn.executemany(
+                    "UPDATE entries SET accessed_at = max(accessed_at, ?) WHERE key = ?",
+                    [(accessed_at, key) for key, accessed_at in accessed.items()]
+                )
+                expired = conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries WHERE remove_at <= ?", (current_time,)
+                ).fetchone()
+                conn.execute(
+                    "DELETE FROM tags WHERE key IN (SELECT key FROM entries WHERE remove_at <= ?)", (current_time,)
+                )
+                conn.execute("DELETE FROM entries WHERE remove_at <= ?", (current_time,))
+            
+            disk_usage = {
+                prefix: {"disk_entries": entries, "disk_bytes": size}
+                for prefix, entries, size in conn.execute(
+                    "SELECT CASE WHEN instr(key, '|') > 0 THEN substr(key, 1, instr(key, '|') - 1) ELSE key END "
+                    "AS prefix, COUNT(*), SUM(size) FROM entries GROUP BY prefix"
+                )
+            }
+            disk_bytes = sum(usage["disk_bytes"] for usage in disk_usage.values())
+            evicted, evicted_bytes = [], 0
+            if disk_bytes > self.disk_budget:
+                target = disk_bytes - int(self.disk_budget * 0.9)
+                candidates = self._eviction_order(conn, current_time)
+                for key, size in candidates:
+                    evicted.append(key)
+                    evicted_bytes += size
+                    if evicted_bytes >= target:
+                        break
+                candidates.close()
+                with conn:
+                    conn.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key in evicted])
+                    conn.executemany("DELETE FROM tags WHERE key = ?", [(key,) for key in evicted])
+                disk_bytes -= evicted_bytes
+            
+            # 旧数据库不支持增量回收，转换一次（重建整个文件）
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                conn.execute("VACUUM")
+            conn.executescript("PRAGMA incremental_vacuum;")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
         
-        # 清理文件缓存
-        for cache_file in self.cache_dir.glob("*.json"):
+        return {
+            "compacted_at": current_time,
+            "expired": expired[0],
+            "expired_bytes": expired[1],
+            "evicted": len(evicted),
+            "evicted_bytes": evicted_bytes,
+            "disk_bytes": disk_bytes,
+            "reclaimed_bytes": max(0, file_bytes - self._disk_file_bytes()),
+            "evicted_keys": evicted,
+            "disk_usage": disk_usage
+        }
+    
+    async def compact(self) -> Dict[str, Any]:
+        """压缩磁盘缓存，返回本次删除的条目数和回收的文件空间"""
+        await self.flush()
+        current_time = time.time()
+        accessed, self._accessed = self._accessed, {}
+        self._clear_expired_memory(current_time)
+        try:
+            result = await asyncio.to_thread(self._compact, current_time, accessed)
+        except sqlite3.Error:
+            # 下次压缩时重新写回访问时间
+            self._accessed = {**accessed, **self._accessed}
+            raise
+        for key in result.pop("evicted_keys"):
+            self._forget(key)
+            self.metrics.record_eviction(key, disk=True)
+        self._disk_usage = result.pop("disk_usage")
+        self.last_compaction = result
+        return result
+    
+    async def _compaction_loop(self) -> None:
+        """后台压缩：启动时执行一次，之后每隔 compact_interval 秒执行一次"""
+        while True:
+            try:
+                await self.compact()
+            except asyncio.CancelledError:
+                raise
+            except (sqlite3.Error, OSError):
+                pass  # 磁盘缓存失败不影响功能，下个周期重试
+            await asyncio.sleep(self.compact_interval)
+    
+    def start_compaction(self) -> None:
+        """启动后台压缩任务（由服务器 lifespan 调用）"""
+        if self._compact_task is None or self._compact_task.done():
+            self._compact_task = asyncio.create_task(self._compaction_loop())
+    
+    async def stop_compaction(self) -> None:
+        """停止后台压缩任务"""
+        task = self._compact_task
+        self._compact_task = None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """按前缀的缓存指标，附带当前内存占用和上次压缩时统计的磁盘占用"""
+        gauges: Dict[str, Dict[str, int]] = {
+            prefix: dict(usage) for prefix, usage in self._disk_usage.items()
+        }
+        for cache_key, size in self._memory_sizes.items():
+            usage = gauges.setdefault(key_prefix(cache_key), {})
+            usage["memory_entries"] = usage.get("memory_entries", 0) + 1
+            usage["memory_bytes"] = usage.get("memory_bytes", 0) + size
+        return self.metrics.snapshot(gauges)
+    
+    async def _metrics_loop(self) -> None:
+        """每隔 metrics_interval 秒把指标快照写入 metrics_file"""
+        while True:
+            await asyncio.sleep(self.metrics_interval)
+            try:
+                await asyncio.to_thread(dump_metrics, self.metrics_file, self.get_metrics())
+            except OSError:
+                pass  # 指标文件写入失败不影响功能
+    
+    def start_metrics_dump(self) -> None:
+        """设置了 metrics_file 时启动指标写入任务（由服务器 lifespan 调用）"""
+        if not self.metrics_file:
+            return
+        if self._metrics_task is None or self._metrics_task.done():
+            self._metrics_task = asyncio.create_task(self._metrics_loop())
+    
+    async def stop_metrics_dump(self) -> None:
+        """停止指标写入任务，并写入最后一次快照"""
+        task = self._metrics_task
+        self._metrics_task = None
+        if task is None:
+            return
+        if not task.done():
+            task.cancel()
             try:
-                with open(cache_file, 'r', encoding='utf-8') as f:
-                    cache_data = json.load(f)
-                    
-                if current_time >= cache_data["expires_at"]:
-                    cache_file.unlink()
-            except Exception:
-                cache_file.unlink()  # 删除损坏文件
+                await task
+            except asyncio.CancelledError:
+                pass
+        try:
+            dump_metrics(self.metrics_file, self.get_metrics())
+        except OSError:
+            pass
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """缓存命中、淘汰和内存占用统计"""
+        return {
+            **self.stats,
+            "memory_entries": len(self.memory_cache),
+            "memory_bytes": self.memory_bytes,
+            "memory_budget": self.memory_budget,
+            "pending_writes": len(self._pending) + len(self._writing),
+            "serializer": self.serializer.name,
+            "disk_budget": self.disk_budget,
+            "last_compaction": self.last_compaction
+        }
 
 
 # 全局缓存实例
-cache_manager = CacheManager()
\ No newline at end of file
+cache_manager = CacheManager(os.getenv("CACHE_DIR", ".cache"))
\ No newline at end of file
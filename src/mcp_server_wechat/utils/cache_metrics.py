@@ -0,0 +1,158 @@
+"""
+缓存指标
+
+按缓存键前缀（search_results、article_content、public_article、range:search_results、negative:... 等）
+统计命中、未命中、过期数据降级返回、淘汰、写入字节数，以及读写耗时直方图，
+用于判断各类缓存是否真正减少了上游调用，并据此调整 TTL。
+"""
+
+import os
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+
+# 耗时直方图桶上限（毫秒），最后一个桶收纳超出范围的样本
+LATENCY_BUCKETS_MS: List[float] = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000]
+
+
+def key_prefix(cache_key: str) -> str:
+    """缓存键的前缀部分（第一个参数分隔符之前）"""
+    return cache_key.split("|", 1)[0]
+
+
+class LatencyHistogram:
+    """固定桶的耗时直方图"""
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+
+    def observe(self, elapsed_ms: float) -> None:
+        """记录一次耗时"""
+        index = 0
+        while index < len(LATENCY_BUCKETS_MS) and elapsed_ms > LATENCY_BUCKETS_MS[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total_ms += elapsed_ms
+
+    def quantile(self, q: float) -> Optional[float]:
+        """按桶上限估算分位数（毫秒），超出最大桶时返回 None"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else None
+        return None
+
+    def snapshot(self) -> Dict[str, Any]:
+        """直方图摘要：次数、平均值、分位数上限和各桶计数"""
+        labels = [f"<={bound:g}ms" for bound in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]:g}ms"]
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "p99_ms": self.quantile(0.99),
+            "buckets": {label: count for label, count in zip(labels, self.counts) if count}
+        }
+
+
+class PrefixMetrics:
+    """单个前缀的计数器"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.stale_serves = 0
+        self.sets = 0
+        self.bytes_written = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+        self.get_latency = LatencyHistogram()
+        self.set_latency = LatencyHistogram()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """计数器快照"""
+        lookups = self.hits + self.stale_serves + self.misses
+        return {
+            "hits": self.hits,
+            "stale_serves": self.stale_serves,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.stale_serves) / lookups, 4) if lookups else None,
+            "sets": self.sets,
+            "bytes_written": self.bytes_written,
+            "evictions": self.evictions,
+            "disk_evictions": self.disk_evictions,
+            "get_latency": self.get_latency.snapshot(),
+            "set_latency": self.set_latency.snapshot()
+        }
+
+
+class CacheMetrics:
+    """按前缀汇总的缓存指标"""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.prefixes: Dict[str, PrefixMetrics] = {}
+
+    def _prefix(self, prefix: str) -> PrefixMetrics:
+        """获取（或创建）前缀的计数器"""
+        metrics = self.prefixes.get(prefix)
+        if metrics is None:
+            metrics = self.prefixes[prefix] = PrefixMetrics()
+        return metrics
+
+    def record_get(self, prefix: str, outcome: str, started: float) -> None:
+        """记录一次读取：outcome 为 hit / stale / miss，started 为 time.perf_counter() 起点"""
+        metrics = self._prefix(prefix)
+        if outcome == "hit":
+            metrics.hits += 1
+        elif outcome == "stale":
+            metrics.stale_serves += 1
+        else:
+            metrics.misses += 1
+        metrics.get_latency.observe((time.perf_counter() - started) * 1000)
+
+    def record_set(self, prefix: str, size: int, started: float) -> None:
+        """记录一次写入及其编码后的字节数"""
+        metrics = self._prefix(prefix)
+        metrics.sets += 1
+        metrics.bytes_written += size
+        metrics.set_latency.observe((time.perf_counter() - started) * 1000)
+
+    def record_eviction(self, cache_key: str, disk: bool = False) -> None:
+        """记录一次内存淘汰（disk=True 时为磁盘预算淘汰）"""
+        metrics = self._prefix(key_prefix(cache_key))
+        if disk:
+            metrics.disk_evictions += 1
+        else:
+            metrics.evictions += 1
+
+    def snapshot(self, gauges: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """全部前缀的指标快照；gauges 为各前缀当前的内存 / 磁盘占用"""
+        gauges = gauges or {}
+        prefixes = {}
+        for prefix in sorted(set(self.prefixes) | set(gauges)):
+            metrics = self.prefixes.get(prefix)
+            prefixes[prefix] = {**(metrics or PrefixMetrics()).snapshot(), **gauges.get(prefix, {})}
+        return {
+            "started_at": self.started_at,
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "prefixes": prefixes
+        }
+
+
+def dump_metrics(metrics_file: str, snapshot: Dict[str, Any]) -> None:
+    """原子写入指标快照（临时文件按进程区分，再 os.replace 覆盖）"""
+    path = os.path.abspath(metrics_file)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_file = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump({**snapshot, "pid": os.getpid(), "dumped_at": time.time()}, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_file, path)
@@ -0,0 +1,67 @@
+"""
+请求合并
+
+将同一时刻发起的相同上游请求合并为一次调用，所有调用者共享同一个结果或异常。
+"""
+
+import json
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+class RequestCoalescer:
+    """在途请求去重器"""
+
+    def __init__(self):
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.upstream_calls = 0
+        self.dedup_hits = 0
+
+    @staticmethod
+    def make_key(namespace: str, params: Optional[Dict[str, Any]] = None, exclude: tuple = ()) -> str:
+        """由命名空间（接口/URL）和规范化参数生成合并键"""
+        normalized = {
+            k: v for k, v in (params or {}).items()
+            if k not in exclude and v is not None
+        }
+        return f"{namespace}?{json.dumps(normalized, sort_keys=True, ensure_ascii=False, default=str)}"
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """执行请求；若相同键的请求已在途，则等待其结果"""
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.dedup_hits += 1
+        else:
+            self.upstream_calls += 1
+            future = asyncio.ensure_future(factory())
+            self._in_flight[key] = future
+            future.add_done_callback(lambda f: self._release(key, f))
+
+        # shield 避免单个调用者被取消时中断共享请求
+        return await asyncio.shield(future)
+
+    def _release(self, key: str, future: asyncio.Future) -> None:
+        """请求完成后移除在途记录"""
+        if self._in_flight.get(key) is future:
+            del self._in_flight[key]
+        if not future.cancelled():
+            future.exception()  # 标记异常已读取，避免无人等待时的告警
+
+    async def cancel_all(self) -> None:
+        """取消全部在途请求（由服务器 lifespan 在关闭连接池前调用）"""
+        futures = list(self._in_flight.values())
+        for future in futures:
+            future.cancel()
+        await asyncio.gather(*futures, return_exceptions=True)
+
+    def get_stats(self) -> Dict[str, int]:
+        """获取合并统计"""
+        return {
+            "upstream_calls": self.upstream_calls,
+            "dedup_hits": self.dedup_hits,
+            "in_flight": len(self._in_flight)
+        }
+
+
+# 全局请求合并实例
+request_coalescer = RequestCoalescer()
@@ -0,0 +1,23 @@
+"""
+配置读取
+
+读取数值型环境变量，值缺失或格式错误时使用默认值，避免配置错误导致模块导入失败。
+"""
+
+import os
+
+
+def env_int(name: str, default: int) -> int:
+    """读取整数环境变量"""
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def env_float(name: str, default: float) -> float:
+    """读取浮点数环境变量"""
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
@@ -5,12 +5,15 @@
 """
 
 from fastmcp.exceptions import ToolError
-from typing import Optional
+from typing import Any, Dict, Optional
 
 
 class WeChatAPIError(ToolError):
     """微信 API 错误"""
-    pass
+    
+    def __init__(self, message: str, error_code: Optional[int] = None):
+        super().__init__(message)
+        self.error_code = error_code
 
 
 class RateLimitError(ToolError):
@@ -23,6 +26,38 @@ class AuthenticationError(ToolError):
     pass
 
 
+class WeChatAuthenticationError(WeChatAPIError, AuthenticationError):
+    """凭据错误（AppSecret 错误、AppID 不合法等），重试无法恢复"""
+    pass
+
+
+class QuotaExhaustedError(RateLimitError):
+    """接口当日配额已用尽"""
+    pass
+
+
+class AntiCrawlError(RateLimitError):
+    """触发反爬验证码"""
+    pass
+
+
+class SearchHTTPError(ToolError):
+    """搜索请求 HTTP 错误"""
+    
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class CircuitOpenError(ToolError):
+    """主机熔断中，请求被快速拒绝"""
+    pass
+
+
+# 凭据错误码：AppSecret 错误、AppID 不合法、AppSecret 无效、调用 IP 不在白名单
+WECHAT_AUTH_ERROR_CODES = {40001, 40013, 40125, 40164}
+
+
 def handle_wechat_api_error(error_code: int, error_msg: str) -> None:
     """处理微信 API 错误"""
     error_messages = {
@@ -70,10 +105,11 @@ export WECHAT_SECRET=your_app_secret""",
 3. 联系微信客服开通权限"""
     }
     
+    error_class = WeChatAuthenticationError if error_code in WECHAT_AUTH_ERROR_CODES else WeChatAPIError
     if error_code in error_messages:
-        raise WeChatAPIError(error_messages[error_code])
+        raise error_class(error_messages[error_code], error_code)
     else:
-        raise WeChatAPIError(f"微信 API 错误 ({error_code}): {error_msg}")
+        raise error_class(f"微信 API 错误 ({error_code}): {error_msg}", error_code)
 
 
 def handle_search_error(status_code: int, response_text: str) -> None:
@@ -93,8 +129,8 @@ def handle_search_error(status_code: int, response_text: str) -> None:
 
 如果问题持续，请稍后再试。""")
     
-    elif "验证码" in response_text or "captcha" in response_text.lower():
-        raise ToolError("""触发验证码验证
+    elif "验证码" in response_text or "captcha" in response_text.lower() or "antispider" in response_text:
+        raise AntiCrawlError("""触发验证码验证
 
 这是正常的反爬保护机制。
 
@@ -106,7 +142,74 @@ def handle_search_error(status_code: int, response_text: str) -> None:
 验证码无法自动处理，请稍后重试。""")
     
     else:
-        raise ToolError(f"搜索请求失败 (HTTP {status_code})")
+        raise SearchHTTPError(f"搜索请求失败 (HTTP {status_code})", status_code)
+
+
+def handle_circuit_open(host: str, state: str, retry_after: float) -> None:
+    """处理熔断拒绝"""
+    if retry_after > 0:
+        detail = f"约 {int(retry_after) + 1} 秒后将放行一次探测请求"
+    else:
+        detail = "探测请求进行中，等待探测结果"
+    raise CircuitOpenError(f"""{host} 暂时不可用（熔断状态：{state}）
+
+该主机近期连续请求失败，为避免请求堆积已快速失败。
+{detail}，探测成功后自动恢复。""")
+
+
+def handle_quota_exhausted(endpoint: str, limit: int) -> None:
+    """处理本地配额账本判定的配额用尽"""
+    raise QuotaExhaustedError(f"""接口 {endpoint} 今日调用次数已用尽（{limit}次/天）
+
+为避免触发微信 45009 限制，本次请求未发送。
+
+建议：
+1. 使用已缓存的数据
+2. 明天（北京时间 0 点后）重试""")
+
+
+def handle_mirror_incomplete(synced: int, total: Optional[int]) -> None:
+    """处理素材镜像尚未同步到所查询区间、且配额已进入保留区的情况"""
+    progress = f"已同步 {synced} / {total} 条" if total is not None else f"已同步 {synced} 条"
+    raise QuotaExhaustedError(f"""素材镜像尚未同步到所查询的位置（{progress}）
+
+素材列表接口今日剩余配额已进入保留区，同步已暂停，之后会从当前位置继续。
+
+建议：
+1. 查询已同步的范围（从 offset=0 开始）
+2. 明天（北京时间 0 点后）重试""")
+
+
+def describe_error(error: BaseException, message: Optional[str] = None) -> Dict[str, Any]:
+    """将异常转为可缓存的记录（负缓存），message 为返回给调用方的错误文本（默认 str(error)）"""
+    return {
+        "type": type(error).__name__,
+        "message": str(error) if message is None else message,
+        "error_code": getattr(error, "error_code", None),
+        "status_code": getattr(error, "status_code", None)
+    }
+
+
+def raise_cached_error(record: Dict[str, Any], retry_after: float) -> None:
+    """按负缓存记录重新抛出原类型的异常，标记为来自缓存"""
+    message = f"""{record.get("message", "")}
+
+（缓存的失败结果：约 {int(retry_after) + 1} 秒内不会再次请求上游。如需立即重试，请设置 force_retry=true）"""
+    error_type = record.get("type")
+    if error_type == "WeChatAPIError":
+        error = WeChatAPIError(message, record.get("error_code"))
+    elif error_type == "WeChatAuthenticationError":
+        error = WeChatAuthenticationError(message, record.get("error_code"))
+    elif error_type == "SearchHTTPError":
+        error = SearchHTTPError(message, record.get("status_code") or 0)
+    elif error_type == "AntiCrawlError":
+        error = AntiCrawlError(message)
+    elif error_type == "RateLimitError":
+        error = RateLimitError(message)
+    else:
+        error = ToolError(message)
+    error.from_cache = True
+    raise error
 
 
 def handle_environment_error() -> None:
@@ -0,0 +1,85 @@
+"""
+跨进程文件锁
+
+同一主机上的多个 MCP Server 进程共享 .cache 目录时，用文件锁串行化
+token 刷新和配额账本的读-改-写。POSIX 使用 fcntl.flock，Windows 使用 msvcrt.locking。
+"""
+
+import os
+import time
+import asyncio
+from pathlib import Path
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class FileLock:
+    """基于锁文件的跨进程互斥锁（同一进程内不可重入）"""
+
+    def __init__(self, lock_file: str, poll_interval: float = 0.05):
+        self.lock_file = Path(lock_file)
+        self.poll_interval = poll_interval
+        self._fd: Optional[int] = None
+
+    def _try_lock(self) -> bool:
+        """尝试加锁，成功返回 True"""
+        self.lock_file.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(str(self.lock_file), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        except OSError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
+
+    def acquire(self, timeout: Optional[float] = None) -> None:
+        """阻塞加锁，超时抛出 TimeoutError"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._try_lock():
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"等待文件锁超时：{self.lock_file}")
+            time.sleep(self.poll_interval)
+
+    async def acquire_async(self, timeout: Optional[float] = None) -> None:
+        """异步加锁（轮询等待，不阻塞事件循环），超时抛出 TimeoutError"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._try_lock():
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"等待文件锁超时：{self.lock_file}")
+            await asyncio.sleep(self.poll_interval)
+
+    def release(self) -> None:
+        """释放锁"""
+        fd, self._fd = self._fd, None
+        if fd is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            else:
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(fd)
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+    async def __aenter__(self) -> "FileLock":
+        await self.acquire_async()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self.release()
@@ -5,10 +5,33 @@
 """
 
 import json
-from typing import Any, Dict, List, Literal
+from typing import Any, Callable, Dict, List, Literal
 from datetime import datetime
 
 
+# 过期数据提示：按 stale_reason 区分，未知原因时使用 STALE_NOTICE
+STALE_NOTICES = {
+    "quota": "> ⚠️ 接口配额即将用尽，以下为过期缓存数据",
+    "sync_failed": "> ⚠️ 素材同步失败，以下为本地镜像中的数据，可能已过期",
+}
+STALE_NOTICE = "> ⚠️ 以下数据可能已过期"
+
+
+def _stale_fields(data: Dict[str, Any]) -> Dict[str, Any]:
+    """复制 stale 标记及其原因，未标记时返回空字典"""
+    if not data.get("stale"):
+        return {}
+    fields = {"stale": True}
+    if data.get("stale_reason"):
+        fields["stale_reason"] = data["stale_reason"]
+    return fields
+
+
+def _stale_notice(data: Dict[str, Any]) -> str:
+    """按 stale_reason 选择过期数据提示"""
+    return STALE_NOTICES.get(data.get("stale_reason"), STALE_NOTICE)
+
+
 def format_article_list(
     articles: List[Dict[str, Any]], 
     format: Literal["json", "markdown"],
@@ -19,18 +42,23 @@ def format_article_list(
         if detail == "concise":
             simplified = []
             for article in articles:
-                simplified.append({
+                item = {
                     "title": article.get("title", ""),
                     "url": article.get("url", ""),
                     "update_time": article.get("update_time", ""),
                     "author": article.get("author", "")
-                })
+                }
+                item.update(_stale_fields(article))
+                simplified.append(item)
             return json.dumps(simplified, ensure_ascii=False, indent=2)
         else:
             return json.dumps(articles, ensure_ascii=False, indent=2)
     
     else:  # markdown
         lines = ["# 文章列表\n"]
+        stale = next((article for article in articles if article.get("stale")), None)
+        if stale is not None:
+            lines.append(_stale_notice(stale) + "\n")
         for i, article in enumerate(articles, 1):
             title = article.get("title", "无标题")
             author = article.get("author", "未知作者")
@@ -66,12 +94,14 @@ def format_article_content(
             content = article.get("content", "")
             if len(content) > 1000:
                 content = content[:1000] + "..."
-            return json.dumps({
+            result = {
                 "title": article.get("title", ""),
                 "author": article.get("author", ""),
                 "content": content,
                 "url": article.get("url", "")
-            }, ensure_ascii=False, indent=2)
+            }
+            result.update(_stale_fields(article))
+            return json.dumps(result, ensure_ascii=False, indent=2)
         else:
             result = article.copy()
             if not include_html and "content_html" in result:
@@ -85,6 +115,8 @@ def format_article_content(
         content = article.get("content", "")
         
         lines.append(f"# {title}\n")
+        if article.get("stale"):
+            lines.append(_stale_notice(article) + "\n")
         lines.append(f"**作者**: {author}")
         
         if detail == "detailed":
@@ -106,6 +138,126 @@ def format_article_content(
         return "\n".join(lines)
 
 
+def allocate_budget(lengths: List[int], budget: int) -> List[int]:
+    """在多个条目之间公平分配字符预算
+    
+    较短的条目按实际长度分配，剩余预算平均分给较长的条目。
+    """
+    allowances = [0] * len(lengths)
+    remaining = max(0, budget)
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    for rank, i in enumerate(order):
+        share = remaining // (len(lengths) - rank)
+        allowances[i] = min(lengths[i], share)
+        remaining -= allowances[i]
+    return allowances
+
+
+def _json_length(text: str) -> int:
+    """文本在 JSON 输出中（转义引号、换行等之后）的长度"""
+    return len(json.dumps(text, ensure_ascii=False)) - 2
+
+
+def _clip_content(content: str, allowance: int, measure: Callable[[str], int] = len) -> str:
+    """按分配的预算截断正文，预算按 measure 计算的长度"""
+    if measure(content) <= allowance:
+        return content
+    # 按比例估计截断位置；转义字符集中在前部时继续缩短（每个字符至少占 1 个长度）
+    cut = allowance * len(content) // measure(content)
+    while cut > 0 and measure(content[:cut]) > allowance:
+        cut -= measure(content[:cut]) - allowance
+    return f"{content[:max(cut, 0)]}...[已截断，全文 {len(content)} 字]"
+
+
+# 每篇被截断的正文附加的截断标记预留长度
+_CLIP_MARK_CHARS = 32
+
+
+def format_article_batch(
+    results: List[Dict[str, Any]],
+    format: Literal["json", "markdown"],
+    detail: Literal["concise", "detailed"],
+    max_chars: int = 80000
+) -> str:
+    """格式化批量文章内容
+    
+    整个响应不超过 max_chars 字符：先按正文为空时的实际输出长度扣除元信息，剩余预算按篇分配给正文，
+    避免整体截断时切断文章。JSON 格式按转义后的长度计算。
+    """
+    measure = _json_length if format == "json" else len
+    content_limit = 1000 if detail == "concise" else None
+    
+    items = []
+    contents = []  # (条目, 正文)
+    for result in results:
+        if "article" not in result:
+            # 错误信息只保留第一行
+            error = str(result.get("error", "未知错误")).strip().splitlines()[0]
+            items.append({"media_id": result["media_id"], "error": error})
+            continue
+        
+        article = result["article"]
+        item = {
+            "media_id": result["media_id"],
+            "title": article.get("title", ""),
+            "author": article.get("author", ""),
+            "url": article.get("url", ""),
+            "content": ""
+        }
+        if detail == "detailed":
+            item["digest"] = article.get("digest", "")
+            item["word_count"] = article.get("word_count", 0)
+        item.update(_stale_fields(article))
+        items.append(item)
+        contents.append((item, article.get("content", "")))
+    
+    overhead = len(_render_article_batch(items, format, detail)) + _CLIP_MARK_CHARS * len(contents)
+    lengths = [measure(content[:content_limit]) for _, content in contents]
+    for (item, content), allowance in zip(contents, allocate_budget(lengths, max_chars - overhead)):
+        item["content"] = _clip_content(content, allowance, measure)
+    
+    return _render_article_batch(items, format, detail)
+
+
+def _render_article_batch(
+    items: List[Dict[str, Any]],
+    format: Literal["json", "markdown"],
+    detail: Literal["concise", "detailed"]
+) -> str:
+    """输出批量文章条目"""
+    succeeded = sum(1 for item in items if "error" not in item)
+    
+    if format == "json":
+        return json.dumps({
+            "total": len(items),
+            "succeeded": succeeded,
+            "failed": len(items) - succeeded,
+            "items": items
+        }, ensure_ascii=False, indent=2)
+    
+    else:  # markdown
+        lines = [f"# 批量文章内容（成功 {succeeded}/{len(items)}）\n"]
+        for i, item in enumerate(items, 1):
+            if "error" in item:
+                lines.append(f"## {i}. ❌ {item['media_id']}")
+                lines.append(f"**错误**: {item['error']}")
+                lines.append("")
+                continue
+            
+            lines.append(f"## {i}. {item['title'] or '无标题'}")
+            if item.get("stale"):
+                lines.append(_stale_notice(item))
+            lines.append(f"**media_id**: {item['media_id']}")
+            lines.append(f"**作者**: {item['author'] or '未知作者'}")
+            if detail == "detailed" and item.get("digest"):
+                lines.append(f"**摘要**: {item['digest']}")
+            lines.append("")
+            lines.append(item["content"])
+            lines.append("")  # 空行分隔
+            
+        return "\n".join(lines)
+
+
 def format_account_info(
     account_info: Dict[str, Any],
     format: Literal["json", "markdown"],
@@ -114,17 +266,21 @@ def format_account_info(
     """格式化公众号信息"""
     if format == "json":
         if detail == "concise":
-            return json.dumps({
+            result = {
                 "name": account_info.get("name", ""),
                 "type": account_info.get("type", ""),
                 "verified": account_info.get("verified", False),
                 "status": account_info.get("status", "")
-            }, ensure_ascii=False, indent=2)
+            }
+            result.update(_stale_fields(account_info))
+            return json.dumps(result, ensure_ascii=False, indent=2)
         else:
             return json.dumps(account_info, ensure_ascii=False, indent=2)
     
     else:  # markdown
         lines = ["# 公众号信息\n"]
+        if account_info.get("stale"):
+            lines.append(_stale_notice(account_info) + "\n")
         
         name = account_info.get("name", "未知")
         account_type = account_info.get("type", "未知")
@@ -148,7 +304,78 @@ def format_account_info(
                 lines.append("\n## API 配额")
                 for key, value in api_quota.items():
                     lines.append(f"**{key}**: {value}")
-        
+                    
+            request_dedup = account_info.get("request_dedup", {})
+            if request_dedup:
+                lines.append("\n## 请求合并")
+                lines.append(f"**上游请求**: {request_dedup.get('upstream_calls', 0)}")
+                lines.append(f"**合并命中**: {request_dedup.get('dedup_hits', 0)}")
+                lines.append(f"**在途请求**: {request_dedup.get('in_flight', 0)}")
+                    
+            circuit_breakers = account_info.get("circuit_breakers", {})
+            if circuit_breakers:
+                lines.append("\n## 熔断状态")
+                for host, state in circuit_breakers.items():
+                    line = f"**{host}**: {state.get('state')}（连续失败 {state.get('failures', 0)} 次）"
+                    if "retry_after" in state:
+                        line += f"，{state['retry_after']} 秒后探测"
+                    lines.append(line)
+                    
+            pacing = account_info.get("pacing", {})
+            if pacing:
+                lines.append("\n## 请求节流")
+                for host, state in pacing.items():
+                    line = (
+                        f"**{host}**: {state.get('rate')} 次/秒（间隔 {state.get('interval')} 秒），"
+                        f"令牌 {state.get('tokens')} / {state.get('capacity')}，"
+                        f"成功 {state.get('successes', 0)} 次，限流 {state.get('throttles', 0)} 次"
+                    )
+                    if "last_throttle_ago" in state:
+                        line += f"，上次限流于 {state['last_throttle_ago']} 秒前"
+                    lines.append(line)
+                    
+            parse_stats = account_info.get("parse_pool", {})
+            if parse_stats:
+                lines.append("\n## HTML 解析")
+                lines.append(f"**模式**: {parse_stats.get('mode')}（{parse_stats.get('workers', 0)} 个工作线程/进程）")
+                lines.append(f"**直接解析**: {parse_stats.get('inline_runs', 0)}")
+                lines.append(f"**池中解析**: {parse_stats.get('offloaded_runs', 0)}")
+                lines.append(f"**排队等待**: {parse_stats.get('queued_waits', 0)}")
+                    
+            download_stats = account_info.get("article_download", {})
+            if download_stats:
+                lines.append("\n## 文章下载")
+                lines.append(f"**下载次数**: {download_stats.get('downloads', 0)}")
+                lines.append(f"**正文结束后提前停止**: {download_stats.get('early_stops', 0)}")
+                lines.append(f"**达到字节上限**: {download_stats.get('capped', 0)}（上限 {download_stats.get('max_bytes', 0)} 字节）")
+                lines.append(f"**已读取**: {download_stats.get('bytes_read', 0)} 字节")
+                lines.append(f"**节省下载**: {download_stats.get('bytes_saved', 0)} 字节")
+                    
+            cache_stats = account_info.get("cache", {})
+            if cache_stats:
+                lines.append("\n## 缓存")
+                lines.append(f"**内存命中**: {cache_stats.get('memory_hits', 0)}")
+                lines.append(f"**磁盘命中**: {cache_stats.get('disk_hits', 0)}")
+                lines.append(f"**未命中**: {cache_stats.get('misses', 0)}")
+                lines.append(f"**负缓存命中**: {cache_stats.get('negative_hits', 0)}")
+                lines.append(f"**内存淘汰**: {cache_stats.get('evictions', 0)}")
+                lines.append(
+                    f"**内存占用**: {cache_stats.get('memory_bytes', 0)} / {cache_stats.get('memory_budget', 0)} 字节"
+                    f"（{cache_stats.get('memory_entries', 0)} 条）"
+                )
+                lines.append(f"**待写回**: {cache_stats.get('pending_writes', 0)} 条")
+                if cache_stats.get("serializer"):
+                    lines.append(f"**序列化**: {cache_stats['serializer']}")
+                compaction = cache_stats.get("last_compaction")
+                if compaction:
+                    lines.append(
+                        f"**磁盘占用**: {compaction['disk_bytes']} / {cache_stats.get('disk_budget', 0)} 字节"
+                    )
+                    lines.append(
+                        f"**上次压缩**: 删除过期 {compaction['expired']} 条，淘汰 {compaction['evicted']} 条，"
+                        f"回收 {compaction['reclaimed_bytes']} 字节"
+                    )
+
         return "\n".join(lines)
 
 
@@ -201,6 +428,55 @@ def format_search_results(
         return "\n".join(lines)
 
 
+def format_cache_metrics(
+    metrics: Dict[str, Any],
+    format: Literal["json", "markdown"],
+    detail: Literal["concise", "detailed"]
+) -> str:
+    """格式化按前缀的缓存指标"""
+    if format == "json":
+        if detail == "concise":
+            for prefix_metrics in metrics["prefixes"].values():
+                for latency in ("get_latency", "set_latency"):
+                    prefix_metrics[latency].pop("buckets", None)
+        return json.dumps(metrics, ensure_ascii=False, indent=2)
+
+    else:  # markdown
+        lines = ["# 缓存指标\n", f"**统计时长**: {metrics['uptime_seconds']} 秒\n"]
+        for prefix, m in metrics["prefixes"].items():
+            hit_ratio = f"{m['hit_ratio']:.1%}" if m["hit_ratio"] is not None else "-"
+            get_latency, set_latency = m["get_latency"], m["set_latency"]
+
+            lines.append(f"## {prefix}")
+            lines.append(
+                f"**命中率**: {hit_ratio}（命中 {m['hits']}，过期降级 {m['stale_serves']}，未命中 {m['misses']}）"
+            )
+            lines.append(f"**写入**: {m['sets']} 次，{m['bytes_written']} 字节")
+            lines.append(f"**淘汰**: 内存 {m['evictions']} 条，磁盘 {m['disk_evictions']} 条")
+            lines.append(
+                f"**占用**: 内存 {m.get('memory_bytes', 0)} 字节（{m.get('memory_entries', 0)} 条），"
+                f"磁盘 {m.get('disk_bytes', 0)} 字节（{m.get('disk_entries', 0)} 条）"
+            )
+            lines.append(
+                f"**读取耗时**: 平均 {get_latency['mean_ms']} ms，p95 ≤ {get_latency['p95_ms']} ms"
+                f"（{get_latency['count']} 次）"
+            )
+            lines.append(
+                f"**写入耗时**: 平均 {set_latency['mean_ms']} ms，p95 ≤ {set_latency['p95_ms']} ms"
+                f"（{set_latency['count']} 次）"
+            )
+
+            if detail == "detailed":
+                for label, latency in (("读取", get_latency), ("写入", set_latency)):
+                    if latency["buckets"]:
+                        buckets = "，".join(f"{bucket}: {count}" for bucket, count in latency["buckets"].items())
+                        lines.append(f"**{label}耗时分布**: {buckets}")
+
+            lines.append("")  # 空行分隔
+
+        return "\n".join(lines)
+
+
 def truncate_response(text: str, max_chars: int = 100000) -> str:
     """截断过长的响应"""
     if len(text) <= max_chars:
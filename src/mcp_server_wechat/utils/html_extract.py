@@ -0,0 +1,213 @@
+"""
+HTML 字段提取
+
+用预编译的 lxml XPath 从搜狗搜索结果页和微信文章页中提取字段，直接在 libxml2 解析树上求值，
+不构建 BeautifulSoup 对象树。提取结果与原 BeautifulSoup 实现逐字段一致：文本按 get_text 的规则拼接
+（去掉 script / style 内容和注释，strip=True 时丢弃空白片段），类名按空白分隔的类列表匹配。
+scripts/benchmark_html_extract.py 在 scripts/fixtures/html 上校验一致性并对比耗时。
+"""
+
+import re
+import threading
+from typing import Any, Dict, List, Optional
+
+from lxml import etree
+
+
+def _has_class(name: str) -> str:
+    """XPath 谓词：class 属性（按空白分隔）包含 name"""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+def _xpath(expr: str) -> etree.XPath:
+    """预编译 XPath，返回普通 str 而不是带父节点引用的 smart string"""
+    return etree.XPath(expr, smart_strings=False)
+
+
+# 与 BeautifulSoup get_text 相同：不包含 script / style 中的文本和注释
+_TEXT = _xpath(".//text()[not(ancestor::script or ancestor::style)]")
+
+# 搜狗文章搜索结果
+_NEWS_BOXES = _xpath(f"//div[{_has_class('news-box')}]")
+_FIRST_H3 = _xpath("(.//h3)[1]")
+_FIRST_LINK = _xpath("(.//a)[1]")
+_ACCOUNT = _xpath(f"(.//a[{_has_class('account')}])[1]")
+_DIGEST = _xpath(f"(.//p[{_has_class('txt-info')}])[1]")
+_PUBLISH_TIME = _xpath(f"(.//span[{_has_class('s2')}])[1]")
+
+# 搜狗公众号搜索结果
+_ACCOUNT_RESULTS = _xpath(f"//div[{_has_class('results')}]")
+_DESCRIPTION = _xpath("(.//dd)[1]")
+_VERIFIED = _xpath(f"(.//span[{_has_class('sp-ico')}])[1]")
+
+# 微信文章页
+_ARTICLE_TITLE = _xpath(f"(//h1[{_has_class('rich_media_title')}])[1]")
+_ARTICLE_AUTHOR = _xpath(f"(//a[{_has_class('rich_media_meta_link')}])[1]")
+_ARTICLE_TIME = _xpath("(//em[@id='publish_time'])[1]")
+_ARTICLE_CONTENT = _xpath(f"(//div[{_has_class('rich_media_content')}])[1]")
+_IMAGES = _xpath(".//img")
+
+_local = threading.local()
+
+
+def _parser() -> etree.HTMLParser:
+    """每个线程一个解析器（lxml 解析器实例在线程间共享时会串行化）"""
+    parser = getattr(_local, "parser", None)
+    if parser is None:
+        parser = _local.parser = etree.HTMLParser(encoding="utf-8")
+    return parser
+
+
+def parse_html(html: str) -> Optional[etree._Element]:
+    """解析 HTML，空文档返回 None
+
+    以 UTF-8 字节输入，避免 str 输入中的编码声明报错。
+    """
+    if not html or not html.strip():
+        return None
+    try:
+        return etree.fromstring(html.encode("utf-8"), _parser())
+    except etree.XMLSyntaxError:
+        return None
+
+
+def _first(xpath: etree.XPath, node: Any) -> Optional[etree._Element]:
+    """XPath 的第一个结果"""
+    found = xpath(node)
+    return found[0] if found else None
+
+
+def element_text(node: etree._Element, separator: str = "", strip: bool = True) -> str:
+    """元素文本，等价于 BeautifulSoup 的 get_text(separator, strip)"""
+    texts = _TEXT(node)
+    if strip:
+        texts = [text.strip() for text in texts]
+        texts = [text for text in texts if text]
+    return separator.join(texts)
+
+
+def extract_search_results(html: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """提取文章搜索结果，limit 为 None 时返回整页结果"""
+    root = parse_html(html)
+    if root is None:
+        return []
+
+    results = []
+    for item in _NEWS_BOXES(root)[:limit]:
+        # 提取标题和链接
+        title_elem = _first(_FIRST_H3, item)
+        if title_elem is None:
+            continue
+        title_link = _first(_FIRST_LINK, title_elem)
+        if title_link is None:
+            continue
+
+        account_elem = _first(_ACCOUNT, item)
+        digest_elem = _first(_DIGEST, item)
+        time_elem = _first(_PUBLISH_TIME, item)
+
+        # 清理时间格式
+        publish_time = element_text(time_elem) if time_elem is not None else ""
+        if publish_time:
+            publish_time = re.sub(r'[^\d\-\s:]', '', publish_time).strip()
+
+        results.append({
+            "title": element_text(title_link),
+            "account": element_text(account_elem) if account_elem is not None else "未知公众号",
+            "url": title_link.get("href", ""),
+            "digest": element_text(digest_elem) if digest_elem is not None else "",
+            "publish_time": publish_time
+        })
+    return results
+
+
+def extract_account_results(html: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """提取公众号搜索结果，limit 为 None 时返回整页结果"""
+    root = parse_html(html)
+    if root is None:
+        return []
+
+    results = []
+    for item in _ACCOUNT_RESULTS(root)[:limit]:
+        name_elem = _first(_FIRST_H3, item)
+        if name_elem is None:
+            continue
+        name_link = _first(_FIRST_LINK, name_elem)
+        if name_link is None:
+            continue
+
+        desc_elem = _first(_DESCRIPTION, item)
+        results.append({
+            "name": element_text(name_link),
+            "description": element_text(desc_elem) if desc_elem is not None else "",
+            "verified": _first(_VERIFIED, item) is not None
+        })
+    return results
+
+
+def extract_article(html: str, url: str) -> Dict[str, Any]:
+    """提取文章标题、作者、发布时间、正文纯文本和图片链接"""
+    return _extract_article_tree(parse_html(html), url)
+
+
+def _extract_article_tree(root: Optional[etree._Element], url: str) -> Dict[str, Any]:
+    """从已解析的文章页中提取字段，root 为 None 时按空文档处理"""
+    title_elem = _first(_ARTICLE_TITLE, root) if root is not None else None
+    author_elem = _first(_ARTICLE_AUTHOR, root) if root is not None else None
+    time_elem = _first(_ARTICLE_TIME, root) if root is not None else None
+    content_elem = _first(_ARTICLE_CONTENT, root) if root is not None else None
+
+    if content_elem is not None:
+        # 纯文本不含脚本和样式（由 element_text 跳过），图片优先取懒加载地址
+        content = element_text(content_elem, separator="\n")
+        images = [src for src in (img.get("data-src") or img.get("src") for img in _IMAGES(content_elem)) if src]
+    else:
+        content = "无法获取文章内容"
+        images = []
+
+    # 估算字数和阅读时间
+    word_count = len(content)
+    return {
+        "title": element_text(title_elem) if title_elem is not None else "无标题",
+        "author": element_text(author_elem) if author_elem is not None else "未知作者",
+        "publish_time": element_text(time_elem) if time_elem is not None else "",
+        "content": content,
+        "url": url,
+        "images": images,
+        "word_count": word_count,
+        "read_time_minutes": max(1, word_count // 300)
+    }
+
+
+class ArticleStreamParser:
+    """增量解析微信文章页
+
+    逐块 feed 响应字节，正文 rich_media_content 的 div 闭合后 feed 返回 True，调用方即可停止读取：
+    标题、作者和发布时间都位于正文之前，之后的内容（大段内联脚本、页脚等）不影响提取结果。
+    """
+
+    def __init__(self, encoding: str = "utf-8"):
+        self._parser = etree.HTMLPullParser(events=("start", "end"), encoding=encoding)
+        self._content: Optional[etree._Element] = None
+        self.bytes_fed = 0
+        self.complete = False
+
+    def feed(self, chunk: bytes) -> bool:
+        """输入一块字节，返回正文是否已经完整"""
+        self.bytes_fed += len(chunk)
+        self._parser.feed(chunk)
+        for event, elem in self._parser.read_events():
+            if self._content is None:
+                if event == "start" and elem.tag == "div" and "rich_media_content" in (elem.get("class") or "").split():
+                    self._content = elem
+            elif event == "end" and elem is self._content:
+                self.complete = True
+        return self.complete
+
+    def close(self, url: str) -> Dict[str, Any]:
+        """结束解析（未闭合的元素自动闭合）并提取文章字段"""
+        try:
+            root = self._parser.close() if self.bytes_fed else None
+        except etree.XMLSyntaxError:
+            root = None
+        return _extract_article_tree(root, url)
@@ -0,0 +1,69 @@
+"""
+HTTP 连接池
+
+提供长连接复用的共享 httpx.AsyncClient，供微信 API 客户端和搜狗搜索客户端共同使用。
+"""
+
+import os
+import httpx
+from typing import Optional
+
+from .config import env_int, env_float
+
+
+def _http2_available() -> bool:
+    """检查是否安装了 HTTP/2 支持（h2 包）"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class HTTPClientPool:
+    """共享 HTTP 连接池
+
+    httpx.AsyncClient 内部按主机维护连接池，所有请求复用同一个客户端即可
+    在重试和多次工具调用之间保持 keep-alive 连接，避免重复 TCP+TLS 握手。
+    """
+
+    def __init__(self):
+        self.max_connections = env_int("WECHAT_HTTP_MAX_CONNECTIONS", 100)
+        self.max_keepalive_connections = env_int("WECHAT_HTTP_MAX_KEEPALIVE", 20)
+        self.keepalive_expiry = env_float("WECHAT_HTTP_KEEPALIVE_EXPIRY", 60.0)
+        self.timeout = env_float("WECHAT_HTTP_TIMEOUT", 30.0)
+        self.connect_timeout = env_float("WECHAT_HTTP_CONNECT_TIMEOUT", 10.0)
+        self.http2 = os.getenv("WECHAT_HTTP2", "true").lower() in ("1", "true", "yes") and _http2_available()
+
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _create_client(self) -> httpx.AsyncClient:
+        """创建底层 httpx 客户端"""
+        limits = httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry
+        )
+        timeout = httpx.Timeout(self.timeout, connect=self.connect_timeout)
+        return httpx.AsyncClient(limits=limits, timeout=timeout, http2=self.http2)
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """获取共享客户端，未启动时按需创建"""
+        if self._client is None or self._client.is_closed:
+            self._client = self._create_client()
+        return self._client
+
+    async def start(self) -> None:
+        """启动连接池（由服务器 lifespan 调用）"""
+        _ = self.client
+
+    async def close(self) -> None:
+        """关闭连接池并释放所有连接"""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+
+# 全局连接池实例
+http_pool = HTTPClientPool()
@@ -0,0 +1,210 @@
+"""
+图文素材本地镜像
+
+使用 SQLite 保存全部图文素材（按 media_id 存储），以 update_time 作为增量同步水位线，
+使素材列表和文章内容可以直接从本地读取，不再消耗素材管理接口配额。
+数据库操作在线程池中执行（其他进程持有写锁时最多等待 30 秒），不阻塞事件循环。
+"""
+
+import os
+import json
+import sqlite3
+import time
+import asyncio
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class MaterialMirror:
+    """图文素材本地镜像"""
+
+    def __init__(self, db_path: str = ".cache/materials.db"):
+        self.db_path = Path(db_path)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.RLock()
+
+    def _open(self) -> sqlite3.Connection:
+        """延迟打开数据库连接并初始化表结构（调用方持有 _db_lock）"""
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            # 其他进程持有写锁时最多等待 30 秒
+            conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS materials (
+                    media_id TEXT PRIMARY KEY,
+                    update_time INTEGER NOT NULL,
+                    news_items TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_materials_update_time
+                    ON materials (update_time DESC, media_id);
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS sync_seen (
+                    media_id TEXT PRIMARY KEY
+                );
+            """)
+            self._conn = conn
+        return self._conn
+
+    def _locked(self, func: Callable[..., Any], *args: Any) -> Any:
+        """持有 _db_lock 执行 func(conn, *args)"""
+        with self._db_lock:
+            return func(self._open(), *args)
+
+    async def _run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """在线程池中执行数据库操作"""
+        return await asyncio.to_thread(self._locked, func, *args)
+
+    def close(self) -> None:
+        """关闭数据库连接（由服务器 lifespan 在关闭时调用）"""
+        with self._db_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    @staticmethod
+    def _row(row: Tuple[str, int, str]) -> Dict[str, Any]:
+        """数据库行转为素材字典"""
+        return {"media_id": row[0], "update_time": row[1], "news_items": json.loads(row[2])}
+
+    @staticmethod
+    def _store(conn: sqlite3.Connection, items: List[Dict[str, Any]]) -> int:
+        """写入新增或变更的素材，已有相同或更新版本的跳过"""
+        rows = []
+        for item in items:
+            media_id = item.get("media_id")
+            if not media_id:
+                continue
+            update_time = int(item.get("update_time", 0))
+            known = conn.execute("SELECT update_time FROM materials WHERE media_id = ?", (media_id,)).fetchone()
+            if known is not None and known[0] >= update_time:
+                continue
+            rows.append((
+                media_id,
+                update_time,
+                json.dumps(item.get("content", {}).get("news_item", []), ensure_ascii=False)
+            ))
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO materials (media_id, update_time, news_items) VALUES (?, ?, ?)",
+                rows
+            )
+        return len(rows)
+
+    async def store(self, items: List[Dict[str, Any]]) -> int:
+        """写入 batchget_material 返回的素材条目中新增或变更的部分，返回写入数量"""
+        return await self._run(self._store, items)
+
+    async def get(self, media_id: str) -> Optional[Dict[str, Any]]:
+        """按 media_id 读取素材"""
+        def get(conn: sqlite3.Connection) -> Optional[Dict[str, Any]]:
+            row = conn.execute(
+                "SELECT media_id, update_time, news_items FROM materials WHERE media_id = ?", (media_id,)
+            ).fetchone()
+            return self._row(row) if row else None
+        return await self._run(get)
+
+    async def list(self, offset: int = 0, count: Optional[int] = 20, changed_since: Optional[int] = None) -> List[Dict[str, Any]]:
+        """按更新时间倒序分页读取素材，count 为 None 时返回全部，可只返回 changed_since 之后更新的素材"""
+        sql = "SELECT media_id, update_time, news_items FROM materials"
+        params: List[Any] = []
+        if changed_since is not None:
+            sql += " WHERE update_time > ?"
+            params.append(changed_since)
+        sql += " ORDER BY update_time DESC, media_id LIMIT ? OFFSET ?"
+        params.extend([-1 if count is None else count, offset])
+        return await self._run(lambda conn: [self._row(row) for row in conn.execute(sql, params)])
+
+    async def count(self) -> int:
+        """镜像中的素材数量"""
+        return await self._run(lambda conn: conn.execute("SELECT COUNT(*) FROM materials").fetchone()[0])
+
+    @staticmethod
+    def _covers(conn: sqlite3.Connection, offset: int, count: Optional[int], changed_since: Optional[int]) -> bool:
+        if MaterialMirror._get_meta(conn, "complete") == "1":
+            return True
+        synced, oldest = conn.execute("SELECT COUNT(*), MIN(update_time) FROM materials").fetchone()
+        if not synced:
+            return False
+        if changed_since is not None:
+            return changed_since >= oldest
+        return count is not None and offset + count <= synced
+
+    async def covers(self, offset: int, count: Optional[int], changed_since: Optional[int] = None) -> bool:
+        """镜像能否回答 list(offset, count, changed_since)
+
+        全量同步按更新时间倒序逐页写入，未完成时镜像中是最新的一段连续素材：
+        完整的镜像可回答任意查询；部分镜像可回答落在已同步数量之内的区间，
+        以及 changed_since 不早于已同步素材中最早更新时间的查询。
+        """
+        return await self._run(self._covers, offset, count, changed_since)
+
+    @staticmethod
+    def _get_meta(conn: sqlite3.Connection, key: str) -> Optional[str]:
+        row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def _set_meta(conn: sqlite3.Connection, key: str, value: str) -> None:
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    async def sync_cursor(self) -> Optional[Tuple[int, int]]:
+        """进行中的全量同步：(下一页的 offset, 素材总数)，没有时返回 None"""
+        def sync_cursor(conn: sqlite3.Connection) -> Optional[Tuple[int, int]]:
+            offset, total = self._get_meta(conn, "sync_offset"), self._get_meta(conn, "sync_total")
+            if offset is None or total is None:
+                return None
+            return int(offset), int(total)
+        return await self._run(sync_cursor)
+
+    async def begin_full_sync(self, total: int) -> None:
+        """开始新一轮全量同步"""
+        def begin(conn: sqlite3.Connection) -> None:
+            with conn:
+                conn.execute("DELETE FROM sync_seen")
+                conn.executemany(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                    [("sync_offset", "0"), ("sync_total", str(total))]
+                )
+        await self._run(begin)
+
+    async def advance_sync(self, next_offset: int, media_ids: List[str]) -> None:
+        """记录已写入的一页：同步游标前移，并记下本轮见过的素材（跨重启保留，用于完成时清理）"""
+        def advance(conn: sqlite3.Connection) -> None:
+            with conn:
+                conn.executemany("INSERT OR IGNORE INTO sync_seen (media_id) VALUES (?)", [(m,) for m in media_ids])
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('sync_offset', ?)", (str(next_offset),))
+        await self._run(advance)
+
+    async def finish_full_sync(self) -> int:
+        """完成全量同步：删除本轮未见到的素材（已在后台删除），清除游标并标记完整，返回删除数量"""
+        def finish(conn: sqlite3.Connection) -> int:
+            with conn:
+                cursor = conn.execute("DELETE FROM materials WHERE media_id NOT IN (SELECT media_id FROM sync_seen)")
+                conn.execute("DELETE FROM sync_seen")
+                conn.execute("DELETE FROM meta WHERE key IN ('sync_offset', 'sync_total')")
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('complete', '1')")
+            return cursor.rowcount
+        return await self._run(finish)
+
+    async def is_complete(self) -> bool:
+        """是否已完成过一次全量同步"""
+        return await self._run(self._get_meta, "complete") == "1"
+
+    async def mark_synced(self) -> None:
+        """记录同步完成时间"""
+        await self._run(self._set_meta, "last_sync", str(time.time()))
+
+    async def is_fresh(self, max_age: float) -> bool:
+        """距上次同步是否未超过 max_age 秒"""
+        value = await self._run(self._get_meta, "last_sync")
+        return time.time() - (float(value) if value else 0.0) < max_age
+
+
+# 全局素材镜像实例
+material_mirror = MaterialMirror(str(Path(os.getenv("CACHE_DIR", ".cache")) / "materials.db"))
@@ -0,0 +1,134 @@
+"""
+HTML 解析线程池 / 进程池
+
+大页面（如 300KB+ 的微信文章页）的解析和文本提取会占用数十毫秒 CPU，在事件循环中执行时
+其他在途的工具调用都会被阻塞。解析任务按大小分流：小于 inline_chars 个字符的页面直接在事件循环中解析
+（线程切换的开销高于解析本身），较大的页面交给线程池或进程池执行。
+同时提交的任务数不超过 max_pending，超出时调用方等待，避免突发请求在池中堆积。
+流式解析（增量解析器）通过 session 固定在同一个线程中执行。
+"""
+
+import os
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from .config import env_int
+
+
+class ParsePool:
+    """按页面大小分流的解析执行器"""
+
+    def __init__(self):
+        # thread：lxml 解析时释放 GIL，适合大多数场景；process：完全隔离 CPU；inline：不使用池
+        self.mode = os.getenv("WECHAT_PARSE_POOL", "thread").lower()
+        self.workers = max(1, env_int("WECHAT_PARSE_WORKERS", min(4, os.cpu_count() or 1)))
+        self.max_pending = max(1, env_int("WECHAT_PARSE_MAX_PENDING", self.workers * 4))
+        self.inline_chars = env_int("WECHAT_PARSE_INLINE_CHARS", 32 * 1024)
+
+        self._executor: Optional[Executor] = None
+        # 解析会话使用的单线程执行器，每个会话固定在其中一个
+        self._lanes: List[ThreadPoolExecutor] = []
+        self._next_lane = 0
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.inline_runs = 0
+        self.offloaded_runs = 0
+        self.queued_waits = 0
+        self.in_flight = 0
+
+    def _create_executor(self) -> Optional[Executor]:
+        """按模式创建执行器，inline 模式返回 None"""
+        if self.mode == "process":
+            return ProcessPoolExecutor(max_workers=self.workers)
+        if self.mode == "thread":
+            return ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="html-parse")
+        return None
+
+    def start(self) -> None:
+        """创建执行器（由服务器 lifespan 调用；未启动时首次使用按需创建）"""
+        if self._executor is None:
+            self._executor = self._create_executor()
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+
+    async def close(self) -> None:
+        """关闭执行器，等待已提交的任务完成"""
+        executor, self._executor = self._executor, None
+        lanes, self._lanes = self._lanes, []
+        self._slots = None
+        for executor in [executor, *lanes]:
+            if executor is not None:
+                await asyncio.to_thread(executor.shutdown, True)
+
+    async def run(self, func: Callable[..., Any], html: str, *args: Any) -> Any:
+        """执行 func(html, *args)；小页面在当前线程执行，大页面交给池执行
+
+        func 需为模块级函数（进程池模式下需要可序列化）。
+        """
+        if self.mode not in ("thread", "process") or len(html) < self.inline_chars:
+            self.inline_runs += 1
+            return func(html, *args)
+
+        self.start()
+        return await self._offload(self._executor, func, html, *args)
+
+    def session(self, size: int) -> "ParseSession":
+        """创建解析会话，用于逐步操作有状态对象（如增量解析器），size 为预计的数据量
+
+        lxml 解析器不能在多个线程间交替使用，会话内的所有调用都在同一个线程中执行：
+        size 小于 inline_chars 或 inline 模式时在当前线程，否则在轮流分配的专用线程（process 模式同样使用线程）。
+        """
+        if self.mode not in ("thread", "process") or size < self.inline_chars:
+            return ParseSession(self, None)
+
+        self.start()
+        if not self._lanes:
+            self._lanes = [
+                ThreadPoolExecutor(max_workers=1, thread_name_prefix="html-stream") for _ in range(self.workers)
+            ]
+        self._next_lane = (self._next_lane + 1) % len(self._lanes)
+        return ParseSession(self, self._lanes[self._next_lane])
+
+    async def _offload(self, executor: Optional[Executor], func: Callable[..., Any], *args: Any) -> Any:
+        """占用一个提交名额，在 executor（None 为默认线程池）中执行 func(*args)"""
+        slots = self._slots
+        if slots.locked():
+            self.queued_waits += 1
+        async with slots:
+            self.offloaded_runs += 1
+            self.in_flight += 1
+            try:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(executor, func, *args)
+            finally:
+                self.in_flight -= 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """分流统计"""
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "inline_runs": self.inline_runs,
+            "offloaded_runs": self.offloaded_runs,
+            "queued_waits": self.queued_waits,
+            "in_flight": self.in_flight
+        }
+
+
+class ParseSession:
+    """绑定到单个线程的解析会话（由 ParsePool.session 创建）"""
+
+    def __init__(self, pool: ParsePool, executor: Optional[ThreadPoolExecutor]):
+        self._pool = pool
+        self._executor = executor
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """在会话的线程中执行 func(*args)；调用需依次 await，不能并发"""
+        if self._executor is None:
+            self._pool.inline_runs += 1
+            return func(*args)
+        return await self._pool._offload(self._executor, func, *args)
+
+
+# 全局解析池实例
+parse_pool = ParsePool()
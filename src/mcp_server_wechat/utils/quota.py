@@ -0,0 +1,179 @@
+"""
+接口配额账本
+
+按接口记录微信 API 每日调用次数，按微信的每日边界（北京时间 0 点）重置，并持久化到磁盘。
+共享缓存目录的多个进程在文件锁内合并计数，读取时按文件修改时间加载其他进程的记录。
+记录调用时的加锁和文件读写在线程池中执行，等待其他进程释放文件锁时不阻塞事件循环。
+"""
+
+import os
+import json
+import time
+import asyncio
+import threading
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+from .file_lock import FileLock
+from .config import env_float
+
+
+# 每日调用上限（与 errors.py 中 45009 的提示保持一致）
+DAILY_QUOTAS: Dict[str, int] = {
+    "token": 2000,
+    "material/get_materialcount": 10,
+    "material/batchget_material": 10,
+    "material/get_material": 10,
+}
+
+# 报告中使用的接口名称
+QUOTA_LABELS: Dict[str, str] = {
+    "token": "access_token获取",
+    "material/get_materialcount": "素材总数",
+    "material/batchget_material": "素材列表",
+    "material/get_material": "素材内容",
+}
+
+# 微信配额按北京时间（UTC+8）每日重置
+_WECHAT_UTC_OFFSET = 8 * 3600
+
+
+def _wechat_today() -> str:
+    """当前微信配额日（北京时间日期）"""
+    return time.strftime("%Y-%m-%d", time.gmtime(time.time() + _WECHAT_UTC_OFFSET))
+
+
+class QuotaLedger:
+    """每日接口配额账本"""
+
+    def __init__(self, ledger_file: str = ".cache/quota_ledger.json"):
+        self.ledger_file = Path(ledger_file)
+        self.reserve_ratio = env_float("WECHAT_QUOTA_RESERVE_RATIO", 0.2)
+        self.day = _wechat_today()
+        self.counts: Dict[str, int] = {}
+        self._lock = FileLock(str(self.ledger_file.with_suffix(".lock")))
+        # 串行化本进程内在线程池中执行的更新
+        self._update_lock = threading.Lock()
+        self._mtime_ns: Optional[int] = None
+        self._load()
+
+    def _load(self) -> None:
+        """从磁盘加载当日计数"""
+        try:
+            self._mtime_ns = os.stat(self.ledger_file).st_mtime_ns
+            with open(self.ledger_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            counts = {}
+            if data.get("day") == self.day:
+                counts = {k: int(v) for k, v in data.get("counts", {}).items()}
+            # 整体替换，事件循环中的读取不会看到加载到一半的计数
+            self.counts = counts
+        except (OSError, json.JSONDecodeError, ValueError, AttributeError):
+            self.counts = {}
+
+    def _reload_if_changed(self) -> None:
+        """其他进程更新了账本文件时重新加载"""
+        try:
+            mtime_ns = os.stat(self.ledger_file).st_mtime_ns
+        except OSError:
+            return
+        if mtime_ns != self._mtime_ns:
+            self._load()
+
+    def _save(self) -> None:
+        """原子写入磁盘（临时文件按进程区分，再 os.replace 覆盖）"""
+        try:
+            self.ledger_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = self.ledger_file.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump({"day": self.day, "counts": self.counts}, f, ensure_ascii=False)
+            os.replace(tmp_file, self.ledger_file)
+            self._mtime_ns = os.stat(self.ledger_file).st_mtime_ns
+        except OSError:
+            pass  # 账本持久化失败不影响功能
+
+    def _roll_over(self) -> None:
+        """跨越每日边界时重置计数，并加载其他进程写入的最新计数"""
+        today = _wechat_today()
+        if today != self.day:
+            self.day = today
+            self.counts = {}
+            self._mtime_ns = None
+        self._reload_if_changed()
+
+    def _update(self, endpoint: str, count: Optional[int] = None) -> None:
+        """在文件锁内重新加载、更新并写回计数（count 为 None 时加一），避免多个进程互相覆盖
+
+        会阻塞等待文件锁，需在线程池中调用。
+        """
+        with self._update_lock:
+            try:
+                self._lock.acquire(timeout=5)
+            except (OSError, TimeoutError):
+                locked = False  # 无法加锁时仍记录到本进程
+            else:
+                locked = True
+
+            try:
+                self._roll_over()
+                if locked:
+                    self._load()
+                self.counts[endpoint] = self.counts.get(endpoint, 0) + 1 if count is None else count
+                self._save()
+            finally:
+                if locked:
+                    self._lock.release()
+
+    def limit(self, endpoint: str) -> Optional[int]:
+        """接口每日上限，未知接口返回 None"""
+        return DAILY_QUOTAS.get(endpoint)
+
+    def used(self, endpoint: str) -> int:
+        """当日已用次数"""
+        self._roll_over()
+        return self.counts.get(endpoint, 0)
+
+    def remaining(self, endpoint: str) -> Optional[int]:
+        """当日剩余次数，未知接口返回 None"""
+        limit = self.limit(endpoint)
+        if limit is None:
+            return None
+        return max(0, limit - self.used(endpoint))
+
+    def is_exhausted(self, endpoint: str) -> bool:
+        """配额是否已用尽"""
+        remaining = self.remaining(endpoint)
+        return remaining is not None and remaining <= 0
+
+    def is_nearly_exhausted(self, endpoint: str, pending: int = 0) -> bool:
+        """剩余配额是否已进入保留区（应优先使用缓存）；pending 为已发起但可能尚未记录的调用数"""
+        remaining = self.remaining(endpoint)
+        if remaining is None:
+            return False
+        reserve = max(1, int(self.limit(endpoint) * self.reserve_ratio))
+        return remaining - pending <= reserve
+
+    async def record(self, endpoint: str) -> None:
+        """记录一次上游调用"""
+        if endpoint not in DAILY_QUOTAS:
+            return
+        await asyncio.to_thread(self._update, endpoint)
+
+    async def mark_exhausted(self, endpoint: str) -> None:
+        """收到 45009 时将接口标记为当日已用尽"""
+        limit = self.limit(endpoint)
+        if limit is None:
+            return
+        await asyncio.to_thread(self._update, endpoint, max(self.used(endpoint), limit))
+
+    def get_report(self) -> Dict[str, Any]:
+        """各接口当日配额使用情况"""
+        report = {}
+        for endpoint, limit in DAILY_QUOTAS.items():
+            used = self.used(endpoint)
+            report[QUOTA_LABELS.get(endpoint, endpoint)] = f"已用 {used} / {limit} 次，剩余 {max(0, limit - used)} 次"
+        return report
+
+
+# 全局配额账本实例
+quota_ledger = QuotaLedger(str(Path(os.getenv("CACHE_DIR", ".cache")) / "quota_ledger.json"))
@@ -0,0 +1,182 @@
+"""
+自适应请求节流
+
+为每个主机维护一个令牌桶：空闲一段时间后的请求立即发出，突发请求按当前速率排队，
+排队等待时加入随机抖动。速率按 AIMD 调整：收到 429 或验证码页面时乘性降低，
+之后每次成功请求加性恢复，直到主机的速率上限。
+各主机的速率和令牌状态持久化到缓存目录，重启后沿用上次降低后的速率，避免立刻再次触发反爬。
+"""
+
+import os
+import json
+import time
+import random
+import asyncio
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from .config import env_float
+
+
+# 各主机的初始速率（请求/秒），与原固定随机延迟的平均间隔一致：搜狗 1-3 秒，文章页 2-5 秒
+HOST_RATES: Dict[str, float] = {
+    "weixin.sogou.com": 0.5,
+    "mp.weixin.qq.com": 0.3,
+}
+
+
+class TokenBucket:
+    """单个主机的令牌桶"""
+
+    def __init__(self, host: str, rate: float, capacity: float, min_rate: float, max_rate: float):
+        self.host = host
+        self.rate = rate
+        self.capacity = capacity
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.tokens = capacity
+        self.updated_at = time.time()
+        self.successes = 0
+        self.throttles = 0
+        self.throttled_at: Optional[float] = None
+
+    def _refill(self, current_time: float) -> None:
+        """按当前速率补充令牌"""
+        elapsed = max(0.0, current_time - self.updated_at)
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated_at = current_time
+
+    def reserve(self) -> float:
+        """预留一个令牌，返回需要等待的秒数（令牌可为负，表示前面已有排队的请求）"""
+        self._refill(time.time())
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+    def on_success(self, increase: float) -> None:
+        """加性恢复速率"""
+        self.successes += 1
+        self.rate = min(self.max_rate, self.rate + increase)
+
+    def on_throttle(self, decrease: float) -> None:
+        """乘性降低速率，并清空令牌，后续请求按新速率重新排队"""
+        self._refill(time.time())
+        self.throttles += 1
+        self.throttled_at = time.time()
+        self.rate = max(self.min_rate, self.rate * decrease)
+        self.tokens = min(self.tokens, 0.0)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """持久化的状态"""
+        return {
+            "rate": self.rate,
+            "tokens": self.tokens,
+            "updated_at": self.updated_at,
+            "successes": self.successes,
+            "throttles": self.throttles,
+            "throttled_at": self.throttled_at
+        }
+
+    def restore(self, state: Dict[str, Any]) -> None:
+        """恢复上次保存的状态（速率限制在当前配置的范围内）"""
+        self.rate = min(self.max_rate, max(self.min_rate, float(state.get("rate", self.rate))))
+        self.tokens = min(self.capacity, float(state.get("tokens", self.tokens)))
+        self.updated_at = float(state.get("updated_at", self.updated_at))
+        self.successes = int(state.get("successes", 0))
+        self.throttles = int(state.get("throttles", 0))
+        self.throttled_at = state.get("throttled_at")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """令牌桶状态"""
+        self._refill(time.time())
+        stats = {
+            "rate": round(self.rate, 3),
+            "interval": round(1 / self.rate, 2),
+            "tokens": round(self.tokens, 2),
+            "capacity": self.capacity,
+            "successes": self.successes,
+            "throttles": self.throttles
+        }
+        if self.throttled_at is not None:
+            stats["last_throttle_ago"] = round(time.time() - self.throttled_at, 1)
+        return stats
+
+
+class AdaptiveRateLimiter:
+    """按主机的 AIMD 令牌桶节流器"""
+
+    def __init__(self, state_file: str = ".cache/rate_limiter.json"):
+        self.state_file = Path(state_file)
+        self.default_rate = env_float("WECHAT_PACING_RATE", 0.5)
+        self.capacity = max(1.0, env_float("WECHAT_PACING_BURST", 3))
+        self.min_rate = env_float("WECHAT_PACING_MIN_RATE", 0.02)
+        self.max_rate = env_float("WECHAT_PACING_MAX_RATE", 1.0)
+        self.increase = env_float("WECHAT_PACING_INCREASE", 0.01)
+        self.decrease = env_float("WECHAT_PACING_DECREASE", 0.5)
+        self.jitter = env_float("WECHAT_PACING_JITTER", 0.3)
+        self.save_interval = env_float("WECHAT_PACING_SAVE_INTERVAL", 30)
+        self.buckets: Dict[str, TokenBucket] = {}
+        self._saved_state: Dict[str, Dict[str, Any]] = {}
+        self._saved_at = 0.0
+        self._load()
+
+    def _load(self) -> None:
+        """加载上次保存的各主机状态"""
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                self._saved_state = json.load(f).get("hosts", {})
+        except (OSError, json.JSONDecodeError, AttributeError):
+            self._saved_state = {}
+
+    def save(self) -> None:
+        """原子写入磁盘（临时文件按进程区分，再 os.replace 覆盖）"""
+        try:
+            self.state_file.parent.mkdir(parents=True, exist_ok=True)
+            hosts = {**self._saved_state, **{host: bucket.to_dict() for host, bucket in self.buckets.items()}}
+            tmp_file = self.state_file.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump({"hosts": hosts}, f, ensure_ascii=False)
+            os.replace(tmp_file, self.state_file)
+            self._saved_at = time.time()
+        except OSError:
+            pass  # 状态持久化失败不影响功能
+
+    def bucket(self, host: str) -> TokenBucket:
+        """获取主机的令牌桶，首次使用时按上次保存的状态恢复"""
+        if host not in self.buckets:
+            rate = min(self.max_rate, max(self.min_rate, HOST_RATES.get(host, self.default_rate)))
+            bucket = TokenBucket(host, rate, self.capacity, self.min_rate, self.max_rate)
+            if host in self._saved_state:
+                bucket.restore(self._saved_state[host])
+            self.buckets[host] = bucket
+        return self.buckets[host]
+
+    async def acquire(self, host: str) -> float:
+        """等待主机的发送许可，返回实际等待的秒数；有空闲令牌时立即返回"""
+        wait = self.bucket(host).reserve()
+        if wait <= 0:
+            return 0.0
+        # 排队的请求加入抖动，避免按固定节拍发出
+        wait += random.uniform(0, self.jitter * wait)
+        await asyncio.sleep(wait)
+        return wait
+
+    def on_success(self, host: str) -> None:
+        """记录一次成功请求（加性恢复速率），定期持久化"""
+        self.bucket(host).on_success(self.increase)
+        if time.time() - self._saved_at >= self.save_interval:
+            self.save()
+
+    def on_throttle(self, host: str) -> None:
+        """记录一次限流或验证码（乘性降低速率），立即持久化"""
+        self.bucket(host).on_throttle(self.decrease)
+        self.save()
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """各主机的速率、令牌和限流次数"""
+        return {host: bucket.get_stats() for host, bucket in self.buckets.items()}
+
+
+# 全局节流器实例
+rate_limiter = AdaptiveRateLimiter(str(Path(os.getenv("CACHE_DIR", ".cache")) / "rate_limiter.json"))
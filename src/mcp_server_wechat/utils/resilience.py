@@ -0,0 +1,198 @@
+"""
+重试与熔断
+
+按错误类型（临时 / 限流 / 永久）决定是否重试，使用带抖动的指数退避，
+并为每个主机维护熔断器，主机持续故障时快速失败，直到半开探测成功。
+同样按错误类型决定失败结果的负缓存时间。
+"""
+
+import time
+import random
+import asyncio
+import httpx
+from typing import Any, Awaitable, Callable, Dict
+from urllib.parse import urlsplit
+
+from .config import env_int, env_float
+from .errors import (
+    WeChatAPIError,
+    RateLimitError,
+    QuotaExhaustedError,
+    AntiCrawlError,
+    SearchHTTPError,
+    handle_circuit_open
+)
+
+
+# 错误分类
+TRANSIENT = "transient"    # 临时故障：网络错误、5xx、微信 -1 系统繁忙，可重试
+THROTTLED = "throttled"    # 限流：45009、429、验证码，不重试
+PERMANENT = "permanent"    # 永久错误：参数错误、权限不足等，不重试
+ANTI_CRAWL = "anti_crawl"  # 限流中的验证码页面，仅用于区分负缓存时间
+
+# 微信错误码分类
+WECHAT_TRANSIENT_CODES = {-1}
+WECHAT_THROTTLED_CODES = {45009, 45011}
+
+# 熔断器状态
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+def classify_error(error: BaseException) -> str:
+    """将异常归类为 transient / throttled / permanent"""
+    if isinstance(error, QuotaExhaustedError):
+        return PERMANENT  # 本地配额判定，上游并未出错
+    if isinstance(error, RateLimitError):
+        return THROTTLED
+    if isinstance(error, WeChatAPIError):
+        if error.error_code in WECHAT_TRANSIENT_CODES:
+            return TRANSIENT
+        if error.error_code in WECHAT_THROTTLED_CODES:
+            return THROTTLED
+        return PERMANENT
+    if isinstance(error, httpx.HTTPStatusError):
+        return _classify_status(error.response.status_code)
+    if isinstance(error, SearchHTTPError):
+        return _classify_status(error.status_code)
+    if isinstance(error, httpx.RequestError):
+        return TRANSIENT
+    return PERMANENT
+
+
+def _classify_status(status_code: int) -> str:
+    """按 HTTP 状态码分类"""
+    if status_code == 429:
+        return THROTTLED
+    if status_code >= 500:
+        return TRANSIENT
+    return PERMANENT
+
+
+class CircuitBreaker:
+    """单个主机的熔断器"""
+
+    def __init__(self, host: str, failure_threshold: int, recovery_timeout: float):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+
+    def before_call(self) -> None:
+        """调用前检查：熔断打开时快速失败，恢复期过后只放行一个探测请求"""
+        if self.state == CLOSED:
+            return
+
+        if self.state == OPEN:
+            retry_after = self.opened_at + self.recovery_timeout - time.time()
+            if retry_after > 0:
+                handle_circuit_open(self.host, self.state, retry_after)
+            self.state = HALF_OPEN
+
+        if self._probe_in_flight:
+            handle_circuit_open(self.host, self.state, 0)
+        self._probe_in_flight = True
+
+    def record_success(self) -> None:
+        """调用成功：关闭熔断"""
+        self.state = CLOSED
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        """调用失败：连续失败达到阈值或半开探测失败时打开熔断"""
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = OPEN
+            self.opened_at = time.time()
+
+    def release(self) -> None:
+        """调用结果与主机健康无关（如永久错误），不改变状态"""
+        self._probe_in_flight = False
+
+    def get_stats(self) -> Dict[str, Any]:
+        """熔断器状态"""
+        stats = {"state": self.state, "failures": self.failures}
+        if self.state == OPEN:
+            stats["retry_after"] = round(max(0.0, self.opened_at + self.recovery_timeout - time.time()), 1)
+        return stats
+
+
+class ResiliencePolicy:
+    """按主机熔断、按错误类型重试的调用策略"""
+
+    def __init__(self):
+        self.max_attempts = env_int("WECHAT_RETRY_MAX_ATTEMPTS", 3)
+        self.base_delay = env_float("WECHAT_RETRY_BASE_DELAY", 0.5)
+        self.max_delay = env_float("WECHAT_RETRY_MAX_DELAY", 8.0)
+        self.failure_threshold = env_int("WECHAT_CIRCUIT_FAILURE_THRESHOLD", 5)
+        self.recovery_timeout = env_float("WECHAT_CIRCUIT_RECOVERY_TIMEOUT", 30.0)
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.negative_ttls = {
+            TRANSIENT: env_int("WECHAT_NEGATIVE_TTL_TRANSIENT", 30),
+            THROTTLED: env_int("WECHAT_NEGATIVE_TTL_THROTTLED", 300),
+            ANTI_CRAWL: env_int("WECHAT_NEGATIVE_TTL_ANTI_CRAWL", 1200),
+            PERMANENT: env_int("WECHAT_NEGATIVE_TTL_PERMANENT", 600),
+        }
+
+    def breaker(self, url: str) -> CircuitBreaker:
+        """获取 URL 所属主机的熔断器"""
+        host = urlsplit(url).hostname or url
+        if host not in self.breakers:
+            self.breakers[host] = CircuitBreaker(host, self.failure_threshold, self.recovery_timeout)
+        return self.breakers[host]
+
+    def backoff(self, attempt: int) -> float:
+        """带完全抖动的指数退避时间"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    async def call(self, url: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        """执行调用：临时错误按退避重试，限流和永久错误直接抛出"""
+        breaker = self.breaker(url)
+        for attempt in range(self.max_attempts):
+            breaker.before_call()
+            try:
+                result = await func()
+            except asyncio.CancelledError:
+                breaker.release()
+                raise
+            except Exception as e:
+                error_class = classify_error(e)
+                if error_class == PERMANENT:
+                    breaker.release()
+                    raise
+
+                breaker.record_failure()
+                if error_class == THROTTLED or attempt >= self.max_attempts - 1:
+                    raise
+                await asyncio.sleep(self.backoff(attempt))
+                continue
+
+            breaker.record_success()
+            return result
+
+    def negative_ttl(self, error: BaseException) -> int:
+        """失败结果的负缓存时间，0 表示不缓存
+
+        只缓存上游返回的错误；本地配额判定、熔断拒绝、解析失败和已来自缓存的错误不缓存。
+        """
+        if getattr(error, "from_cache", False) or isinstance(error, QuotaExhaustedError):
+            return 0
+        if not isinstance(error, (WeChatAPIError, RateLimitError, SearchHTTPError, httpx.HTTPError)):
+            return 0
+        if isinstance(error, AntiCrawlError):
+            return self.negative_ttls[ANTI_CRAWL]
+        return self.negative_ttls[classify_error(error)]
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """各主机熔断器状态"""
+        return {host: breaker.get_stats() for host, breaker in self.breakers.items()}
+
+
+# 全局重试与熔断策略实例
+resilience = ResiliencePolicy()
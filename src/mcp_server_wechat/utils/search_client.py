@@ -4,17 +4,61 @@
 提供搜狗微信搜索功能，用于访问公开的微信文章。
 """
 
-import re
 import httpx
 import asyncio
-import random
-from typing import List, Dict, Any, Optional
-from urllib.parse import quote, urljoin
-from bs4 import BeautifulSoup
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import quote, urljoin, urlsplit, parse_qsl, urlencode
 from fastmcp.exceptions import ToolError
 
-from .errors import handle_search_error
+from .errors import AntiCrawlError, RateLimitError, handle_search_error, describe_error, raise_cached_error
 from .cache import cache_manager
+from .http_client import http_pool
+from .coalesce import request_coalescer
+from .resilience import resilience
+from .html_extract import extract_search_results, extract_account_results, ArticleStreamParser
+from .parse_pool import parse_pool
+from .rate_limiter import rate_limiter
+from .config import env_int
+
+
+# 搜狗每页返回的结果数
+SOGOU_PAGE_SIZE = 10
+
+# 长链接中标识文章的参数，其余参数（chksm、scene、from 等）为分享追踪信息
+_ARTICLE_ID_PARAMS = ("__biz", "mid", "idx", "sn")
+
+
+def canonical_article_url(url: str) -> str:
+    """规范化微信文章链接，同一篇文章的不同分享链接得到相同结果
+    
+    短链接 /s/<id> 去掉查询参数和锚点；长链接 /s?__biz=...&mid=...&idx=...&sn=... 只保留标识文章的参数，
+    按固定顺序排列。统一使用 https 和小写主机名。非微信文章链接原样返回。
+    """
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or "").lower()
+    if host != "mp.weixin.qq.com":
+        return url
+    
+    path = parts.path.rstrip("/") or "/"
+    if path.startswith("/s/"):
+        return f"https://{host}{path}"
+    
+    params = dict(parse_qsl(parts.query))
+    if path == "/s" and all(params.get(name) for name in _ARTICLE_ID_PARAMS):
+        return f"https://{host}/s?" + urlencode([(name, params[name]) for name in _ARTICLE_ID_PARAMS])
+    return url
+
+
+def _article_result_key(item: Dict[str, Any]) -> Any:
+    """文章搜索结果的去重键
+    
+    微信文章链接使用规范化链接；搜狗跳转链接（/link?url=...&token=...）的参数每次请求都不同，
+    无法标识文章，改用标题和公众号名称。
+    """
+    url = canonical_article_url(item.get("url", ""))
+    if urlsplit(url).hostname == "mp.weixin.qq.com":
+        return url
+    return (item.get("title", ""), item.get("account", ""))
 
 
 class SogouWeChatSearchClient:
@@ -30,279 +74,319 @@ class SogouWeChatSearchClient:
             "Connection": "keep-alive",
             "Upgrade-Insecure-Requests": "1",
         }
+        # 文章页最多读取的字节数（解码后），超出时按已读取的部分解析
+        self.article_max_bytes = env_int("WECHAT_ARTICLE_MAX_BYTES", 4 * 1024 * 1024)
+        self.article_downloads = 0
+        self.early_stops = 0
+        self.capped_downloads = 0
+        self.bytes_read = 0
+        self.bytes_saved = 0
+        
+    async def _fetch(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+        force_retry: bool = False,
+        read: Optional[Callable[[httpx.Response], Awaitable[Any]]] = None
+    ) -> Any:
+        """抓取页面，相同 URL 和参数的并发请求合并为一次
+        
+        read 从响应流中读取并返回结果，默认读取完整的 HTML 文本。
+        主机触发验证码后，在负缓存期内对该主机的请求直接返回缓存的错误；force_retry=True 时忽略。
+        """
+        host = urlsplit(url).hostname or url
+        if not force_retry:
+            cached_error = await cache_manager.aget_negative("anti_crawl", host=host)
+            if cached_error:
+                raise_cached_error(*cached_error)
+        
+        key = request_coalescer.make_key(f"GET {url}", params)
+        try:
+            return await request_coalescer.run(key, lambda: self._do_fetch(url, params, timeout, read or self._read_text))
+        except AntiCrawlError as e:
+            self._remember_failure("anti_crawl", e, host=host)
+            raise
+    
+    def _remember_failure(self, prefix: str, error: BaseException, label: Optional[str] = None, **kwargs) -> BaseException:
+        """按错误类型缓存失败结果（负缓存），返回应抛出的异常
+        
+        网络错误包装为带 label 前缀的 ToolError，缓存的记录使用同一段文本，
+        首次失败与负缓存重放返回相同的错误信息。
+        """
+        if label is not None and isinstance(error, httpx.RequestError):
+            message = f"{label}：{str(error)}"
+            cache_manager.set_negative(prefix, describe_error(error, message), resilience.negative_ttl(error), **kwargs)
+            return ToolError(message)
+        cache_manager.set_negative(prefix, describe_error(error), resilience.negative_ttl(error), **kwargs)
+        return error
+    
+    async def _do_fetch(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]],
+        timeout: Optional[float],
+        read: Callable[[httpx.Response], Awaitable[Any]]
+    ) -> Any:
+        """执行实际的页面请求
+        
+        每次发送（包括重试）前按主机的令牌桶节流；限流和验证码降低该主机的速率，成功请求逐步恢复。
+        """
+        host = urlsplit(url).hostname or url
+        kwargs = {"params": params, "headers": self.headers}
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        
+        async def fetch() -> Any:
+            await rate_limiter.acquire(host)
+            async with http_pool.client.stream("GET", url, **kwargs) as response:
+                if response.status_code != 200:
+                    await response.aread()
+                    try:
+                        # 反爬时搜狗会重定向到 antispider 页面
+                        handle_search_error(response.status_code, response.text + response.headers.get("location", ""))
+                    except RateLimitError:
+                        rate_limiter.on_throttle(host)
+                        raise
+                
+                rate_limiter.on_success(host)
+                return await read(response)
+        
+        return await resilience.call(url, fetch)
+    
+    @staticmethod
+    async def _read_text(response: httpx.Response) -> str:
+        """读取完整的响应文本"""
+        await response.aread()
+        return response.text
+    
+    async def _read_article(self, response: httpx.Response, url: str) -> Dict[str, Any]:
+        """边下载边解析文章页，正文闭合或达到 article_max_bytes 后停止读取，其余部分不再下载
+        
+        解析按块增量进行；页面较大（Content-Length 不小于解析池的 inline_chars，或未知）时，
+        解析器的创建、feed 和 close 都在解析池分配的同一个线程中执行，避免解析和正文提取占用事件循环。
+        节省的字节数按 Content-Length 与实际下载的字节数（压缩前）之差计算，无 Content-Length 的响应不计入。
+        """
+        content_length = response.headers.get("content-length", "")
+        session = parse_pool.session(int(content_length) if content_length.isdigit() else self.article_max_bytes)
+        parser = await session.run(ArticleStreamParser, response.charset_encoding or "utf-8")
+        async for chunk in response.aiter_bytes():
+            chunk = chunk[:self.article_max_bytes - parser.bytes_fed]
+            if await session.run(parser.feed, chunk) or parser.bytes_fed >= self.article_max_bytes:
+                break
         
+        self.article_downloads += 1
+        self.bytes_read += parser.bytes_fed
+        if parser.complete:
+            self.early_stops += 1
+        elif parser.bytes_fed >= self.article_max_bytes:
+            self.capped_downloads += 1
+        if content_length.isdigit():
+            self.bytes_saved += max(0, int(content_length) - response.num_bytes_downloaded)
+        
+        try:
+            return await session.run(parser.close, url)
+        except Exception as e:
+            raise ToolError(f"解析文章内容失败：{str(e)}")
+    
+    def get_download_stats(self) -> Dict[str, Any]:
+        """文章页流式下载统计"""
+        return {
+            "max_bytes": self.article_max_bytes,
+            "downloads": self.article_downloads,
+            "early_stops": self.early_stops,
+            "capped": self.capped_downloads,
+            "bytes_read": self.bytes_read,
+            "bytes_saved": self.bytes_saved
+        }
+    
     async def search_articles(
         self, 
         query: str, 
         account_name: Optional[str] = None, 
-        limit: int = 10
+        limit: int = 10,
+        force_retry: bool = False
     ) -> List[Dict[str, Any]]:
-        """搜索微信文章"""
-        # 检查缓存
-        cache_key = f"search_{query}_{account_name}_{limit}"
-        cached_results = cache_manager.get("search_results", query=query, account_name=account_name, limit=limit)
-        if cached_results:
-            return cached_results
-        
-        # 随机延迟避免反爬
-        await asyncio.sleep(random.uniform(1, 3))
-        
-        search_url = f"{self.base_url}/weixin"
-        params = {
-            "query": query,
-            "type": 2,  # 文章搜索
-            "page": 1,
-            "ie": "utf8"
-        }
+        """搜索微信文章
         
+        按需抓取多页结果，按 _article_result_key 去重；每页单独缓存，不同 limit 的请求共用已抓取的页面。
+        """
+        params = {"query": query, "type": 2, "ie": "utf8"}  # type=2：文章搜索
         if account_name:
             params["account"] = account_name
-            
+        
         try:
-            async with httpx.AsyncClient(headers=self.headers, timeout=30) as client:
-                response = await client.get(search_url, params=params)
-                
-                if response.status_code != 200:
-                    handle_search_error(response.status_code, response.text)
-                
-                # 解析搜索结果
-                results = self._parse_search_results(response.text, limit)
+            return await self._search_pages(
+                "search_results", params, limit, self._parse_search_results,
+                _article_result_key,
+                force_retry, tags=(f"search:{query}",), query=query, account_name=account_name
+            )
+            
+        except Exception as e:
+            error = self._remember_failure("search_results", e, "搜索请求失败", query=query, account_name=account_name)
+            if error is e:
+                raise
+            raise error
+    
+    async def _search_pages(
+        self,
+        prefix: str,
+        params: Dict[str, Any],
+        limit: int,
+        parse: Callable[[str], Awaitable[List[Dict[str, Any]]]],
+        dedupe_key: Callable[[Dict[str, Any]], Any],
+        force_retry: bool,
+        tags: Iterable[str] = (),
+        **cache_kwargs
+    ) -> List[Dict[str, Any]]:
+        """逐页获取搜狗搜索结果，直到去重后的结果达到 limit 或结果已取完
+        
+        第 n 页缓存在区间 [(n - 1) * SOGOU_PAGE_SIZE, n * SOGOU_PAGE_SIZE)，某页不足一页时视为最后一页并记录结果总数。
+        缺少的页面并发请求，由 rate_limiter 按主机节流；最多比 limit 所需多抓取一页，用于补足去重掉的结果。
+        第一页之后的页面请求失败时返回已获取的结果。
+        """
+        max_pages = -(-limit // SOGOU_PAGE_SIZE) + 1
+        results: List[Dict[str, Any]] = []
+        seen = set()
+        page_count = 0
+        exhausted = False
+        
+        while len(results) < limit and not exhausted and page_count < max_pages:
+            needed = -(-(limit - len(results)) // SOGOU_PAGE_SIZE)
+            numbers = range(page_count + 1, min(max_pages, page_count + needed) + 1)
+            pages = await asyncio.gather(
+                *(self._search_page(prefix, params, page, parse, force_retry, cache_kwargs) for page in numbers),
+                return_exceptions=True
+            )
+            
+            for page, outcome in zip(numbers, pages):
+                if isinstance(outcome, BaseException):
+                    if page == 1:
+                        raise outcome
+                    exhausted = True
+                    break
                 
-                # 缓存 1 小时
-                cache_manager.set("search_results", results, ttl=3600, query=query, account_name=account_name, limit=limit)
-                return results
+                items, fetched = outcome
+                if fetched:
+                    # 按页顺序依次写入，避免并发合并区间时互相覆盖
+                    start = (page - 1) * SOGOU_PAGE_SIZE
+                    total = start + len(items) if len(items) < SOGOU_PAGE_SIZE else None
+                    await cache_manager.set_range(
+                        prefix, start, items, total=total, ttl=3600, tags=tags, **cache_kwargs
+                    )
                 
-        except httpx.RequestError as e:
-            raise ToolError(f"搜索请求失败：{str(e)}")
+                page_count = page
+                for item in items:
+                    key = dedupe_key(item)
+                    if key not in seen:
+                        seen.add(key)
+                        results.append(item)
+                if len(items) < SOGOU_PAGE_SIZE:
+                    exhausted = True
+                    break
+        
+        return results[:limit]
+    
+    async def _search_page(
+        self,
+        prefix: str,
+        params: Dict[str, Any],
+        page: int,
+        parse: Callable[[str], Awaitable[List[Dict[str, Any]]]],
+        force_retry: bool,
+        cache_kwargs: Dict[str, Any]
+    ) -> Tuple[List[Dict[str, Any]], bool]:
+        """获取一页搜索结果，返回 (结果, 是否为新抓取)；已缓存的页面直接返回"""
+        start = (page - 1) * SOGOU_PAGE_SIZE
+        cached_items = await cache_manager.aget_range(prefix, start, SOGOU_PAGE_SIZE, **cache_kwargs)
+        if cached_items is not None:
+            return cached_items, False
+        
+        if not force_retry:
+            cached_error = await cache_manager.aget_negative(prefix, **cache_kwargs)
+            if cached_error:
+                raise_cached_error(*cached_error)
+        
+        html = await self._fetch(f"{self.base_url}/weixin", {**params, "page": page}, force_retry=force_retry)
+        return await parse(html), True
     
-    def _parse_search_results(self, html: str, limit: int) -> List[Dict[str, Any]]:
-        """解析搜索结果HTML"""
+    async def _parse_search_results(self, html: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """解析搜索结果HTML，limit 为 None 时返回整页结果（大页面在解析池中执行）
+        
+        结果中的链接为相对于搜狗的跳转链接，转为绝对链接。
+        """
         try:
-            soup = BeautifulSoup(html, 'lxml')
-            results = []
-            
-            # 查找文章结果
-            result_items = soup.find_all('div', class_='news-box')
-            
-            for item in result_items[:limit]:
-                try:
-                    # 提取标题和链接
-                    title_elem = item.find('h3')
-                    if not title_elem:
-                        continue
-                        
-                    title_link = title_elem.find('a')
-                    if not title_link:
-                        continue
-                        
-                    title = title_link.get_text(strip=True)
-                    url = title_link.get('href', '')
-                    
-                    # 提取公众号名称
-                    account_elem = item.find('a', class_='account')
-                    account = account_elem.get_text(strip=True) if account_elem else "未知公众号"
-                    
-                    # 提取摘要
-                    digest_elem = item.find('p', class_='txt-info')
-                    digest = digest_elem.get_text(strip=True) if digest_elem else ""
-                    
-                    # 提取发布时间
-                    time_elem = item.find('span', class_='s2')
-                    publish_time = time_elem.get_text(strip=True) if time_elem else ""
-                    
-                    # 清理时间格式
-                    if publish_time:
-                        publish_time = re.sub(r'[^\d\-\s:]', '', publish_time).strip()
-                    
-                    result = {
-                        "title": title,
-                        "account": account,
-                        "url": url,
-                        "digest": digest,
-                        "publish_time": publish_time
-                    }
-                    
-                    results.append(result)
-                    
-                except Exception as e:
-                    # 单个结果解析失败不影响其他结果
-                    continue
-            
-            return results
-            
+            results = await parse_pool.run(extract_search_results, html, limit)
         except Exception as e:
             raise ToolError(f"解析搜索结果失败：{str(e)}")
+        for item in results:
+            if item.get("url"):
+                item["url"] = urljoin(self.base_url, item["url"])
+        return results
     
-    async def search_accounts(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
-        """搜索公众号"""
-        # 检查缓存
-        cached_results = cache_manager.get("account_search", query=query, limit=limit)
-        if cached_results:
-            return cached_results
-        
-        # 随机延迟避免反爬
-        await asyncio.sleep(random.uniform(1, 3))
-        
-        search_url = f"{self.base_url}/weixin"
-        params = {
-            "query": query,
-            "type": 1,  # 公众号搜索
-            "page": 1,
-            "ie": "utf8"
-        }
+    async def search_accounts(self, query: str, limit: int = 10, force_retry: bool = False) -> List[Dict[str, Any]]:
+        """搜索公众号（按需抓取多页，按名称去重；每页单独缓存，不同 limit 的请求共用已抓取的页面）"""
+        params = {"query": query, "type": 1, "ie": "utf8"}  # type=1：公众号搜索
         
         try:
-            async with httpx.AsyncClient(headers=self.headers, timeout=30) as client:
-                response = await client.get(search_url, params=params)
-                
-                if response.status_code != 200:
-                    handle_search_error(response.status_code, response.text)
-                
-                # 解析搜索结果
-                results = self._parse_account_results(response.text, limit)
-                
-                # 缓存 1 小时
-                cache_manager.set("account_search", results, ttl=3600, query=query, limit=limit)
-                return results
-                
-        except httpx.RequestError as e:
-            raise ToolError(f"搜索请求失败：{str(e)}")
+            return await self._search_pages(
+                "account_search", params, limit, self._parse_account_results, lambda item: item["name"],
+                force_retry, tags=(f"search:{query}",), query=query
+            )
+            
+        except Exception as e:
+            error = self._remember_failure("account_search", e, "搜索请求失败", query=query)
+            if error is e:
+                raise
+            raise error
     
-    def _parse_account_results(self, html: str, limit: int) -> List[Dict[str, Any]]:
-        """解析公众号搜索结果"""
+    async def _parse_account_results(self, html: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """解析公众号搜索结果，limit 为 None 时返回整页结果（大页面在解析池中执行）"""
         try:
-            soup = BeautifulSoup(html, 'lxml')
-            results = []
-            
-            # 查找公众号结果
-            result_items = soup.find_all('div', class_='results')
-            
-            for item in result_items[:limit]:
-                try:
-                    # 提取公众号名称
-                    name_elem = item.find('h3')
-                    if not name_elem:
-                        continue
-                        
-                    name_link = name_elem.find('a')
-                    if not name_link:
-                        continue
-                        
-                    name = name_link.get_text(strip=True)
-                    
-                    # 提取描述
-                    desc_elem = item.find('dd')
-                    description = desc_elem.get_text(strip=True) if desc_elem else ""
-                    
-                    # 提取认证信息
-                    auth_elem = item.find('span', class_='sp-ico')
-                    verified = bool(auth_elem)
-                    
-                    result = {
-                        "name": name,
-                        "description": description,
-                        "verified": verified
-                    }
-                    
-                    results.append(result)
-                    
-                except Exception as e:
-                    # 单个结果解析失败不影响其他结果
-                    continue
-            
-            return results
-            
+            return await parse_pool.run(extract_account_results, html, limit)
         except Exception as e:
             raise ToolError(f"解析公众号搜索结果失败：{str(e)}")
     
-    async def get_article_content(self, article_url: str) -> Dict[str, Any]:
-        """获取文章内容"""
+    async def get_article_content(self, article_url: str, force_retry: bool = False) -> Dict[str, Any]:
+        """获取文章内容
+        
+        链接先规范化（canonical_article_url），同一篇文章的不同分享链接共用一份缓存；
+        正文按内容哈希存储，与其他条目中相同的正文只保存一份。
+        """
+        article_url = canonical_article_url(article_url)
+        
         # 检查缓存
-        cached_content = cache_manager.get("public_article", url=article_url)
+        cached_content = await cache_manager.aget("public_article", url=article_url)
         if cached_content:
             return cached_content
         
         # 验证 URL 格式
-        if not article_url.startswith("https://mp.weixin.qq.com/s/"):
+        if not article_url.startswith(("https://mp.weixin.qq.com/s/", "https://mp.weixin.qq.com/s?")):
             raise ToolError("无效的微信文章链接格式")
         
-        # 随机延迟避免反爬
-        await asyncio.sleep(random.uniform(2, 5))
+        if not force_retry:
+            cached_error = await cache_manager.aget_negative("public_article", url=article_url)
+            if cached_error:
+                raise_cached_error(*cached_error)
         
         try:
-            async with httpx.AsyncClient(headers=self.headers, timeout=60) as client:
-                response = await client.get(article_url)
-                
-                if response.status_code != 200:
-                    handle_search_error(response.status_code, response.text)
-                
-                # 解析文章内容
-                content = self._parse_article_content(response.text, article_url)
-                
-                # 缓存 24 小时
-                cache_manager.set("public_article", content, ttl=86400, url=article_url)
-                return content
-                
-        except httpx.RequestError as e:
-            raise ToolError(f"获取文章内容失败：{str(e)}")
-    
-    def _parse_article_content(self, html: str, url: str) -> Dict[str, Any]:
-        """解析文章内容"""
-        try:
-            soup = BeautifulSoup(html, 'lxml')
-            
-            # 提取标题
-            title_elem = soup.find('h1', class_='rich_media_title')
-            title = title_elem.get_text(strip=True) if title_elem else "无标题"
+            # 流式下载并解析，正文结束后停止读取
+            content = await self._fetch(
+                article_url, timeout=60, force_retry=force_retry,
+                read=lambda response: self._read_article(response, article_url)
+            )
             
-            # 提取作者
-            author_elem = soup.find('a', class_='rich_media_meta_link')
-            author = author_elem.get_text(strip=True) if author_elem else "未知作者"
-            
-            # 提取发布时间
-            time_elem = soup.find('em', id='publish_time')
-            publish_time = time_elem.get_text(strip=True) if time_elem else ""
-            
-            # 提取正文内容
-            content_elem = soup.find('div', class_='rich_media_content')
-            if content_elem:
-                # 移除脚本和样式
-                for script in content_elem(["script", "style"]):
-                    script.decompose()
-                
-                # 获取纯文本内容
-                content = content_elem.get_text(separator='\n', strip=True)
-                
-                # 提取图片链接
-                images = []
-                img_tags = content_elem.find_all('img')
-                for img in img_tags:
-                    src = img.get('data-src') or img.get('src')
-                    if src:
-                        images.append(src)
-            else:
-                content = "无法获取文章内容"
-                images = []
-            
-            # 估算字数和阅读时间
-            word_count = len(content)
-            read_time_minutes = max(1, word_count // 300)
-            
-            article = {
-                "title": title,
-                "author": author,
-                "publish_time": publish_time,
-                "content": content,
-                "url": url,
-                "images": images,
-                "word_count": word_count,
-                "read_time_minutes": read_time_minutes
-            }
-            
-            return article
+            # 缓存 24 小时
+            cache_manager.set(
+                "public_article", content, ttl=86400, tags=("public_article",), bodies=("content",), url=article_url
+            )
+            return content
             
         except Exception as e:
-            raise ToolError(f"解析文章内容失败：{str(e)}")
+            error = self._remember_failure("public_article", e, "获取文章内容失败", url=article_url)
+            if error is e:
+                raise
+            raise error
 
 
 # 全局搜索客户端实例
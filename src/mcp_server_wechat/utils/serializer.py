@@ -0,0 +1,134 @@
+"""
+缓存序列化
+
+将缓存数据编码为带版本头的二进制格式：紧凑 JSON（或已安装 msgpack 时使用 msgpack），
+超过阈值的数据使用 zstd（需安装 zstandard）或 zlib 压缩。
+没有版本头的旧数据按 JSON 文本解析，升级后旧缓存仍可读取。
+"""
+
+import os
+import json
+import zlib
+from typing import Any, Optional, Tuple
+
+from .config import env_int
+
+try:
+    import msgpack
+except ImportError:  # 可选依赖
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # 可选依赖
+    zstandard = None
+
+
+# 格式版本头：<版本><编码><压缩>
+FORMAT_VERSION = 1
+
+ENCODING_JSON = 0
+ENCODING_MSGPACK = 1
+
+COMPRESSION_NONE = 0
+COMPRESSION_ZLIB = 1
+COMPRESSION_ZSTD = 2
+
+_ENCODINGS = {"json": ENCODING_JSON, "msgpack": ENCODING_MSGPACK}
+_COMPRESSIONS = {"none": COMPRESSION_NONE, "zlib": COMPRESSION_ZLIB, "zstd": COMPRESSION_ZSTD}
+
+# 解压 / 解码失败时可能抛出的异常
+_DECODE_ERRORS: tuple = (zlib.error,)
+if zstandard is not None:
+    _DECODE_ERRORS += (zstandard.ZstdError,)
+if msgpack is not None:
+    _DECODE_ERRORS += (msgpack.UnpackException, msgpack.ExtraData)
+
+
+class CacheSerializer:
+    """带版本头的缓存序列化器
+
+    encoding 为 "json" 或 "msgpack"，compression 为 "none"、"zlib" 或 "zstd"；
+    编码后不小于 compress_threshold 字节的数据才压缩。所需可选依赖未安装时回退到 json / zlib。
+    """
+
+    def __init__(self, encoding: str = "json", compression: str = "zlib", compress_threshold: int = 1024, level: int = 3):
+        if encoding == "msgpack" and msgpack is None:
+            encoding = "json"
+        if compression == "zstd" and zstandard is None:
+            compression = "zlib"
+
+        self.encoding = _ENCODINGS.get(encoding, ENCODING_JSON)
+        self.compression = _COMPRESSIONS.get(compression, COMPRESSION_ZLIB)
+        self.compress_threshold = compress_threshold
+        self.level = level
+
+    @property
+    def name(self) -> str:
+        """序列化方式描述"""
+        encoding = "msgpack" if self.encoding == ENCODING_MSGPACK else "json"
+        compression = {COMPRESSION_NONE: "none", COMPRESSION_ZLIB: "zlib", COMPRESSION_ZSTD: "zstd"}[self.compression]
+        return f"{encoding}+{compression}"
+
+    def encode(self, data: Any) -> Tuple[bytes, int]:
+        """编码数据，返回 (payload, 未压缩字节数)；无法序列化时抛出 TypeError / ValueError"""
+        if self.encoding == ENCODING_MSGPACK:
+            body = msgpack.packb(data, use_bin_type=True)
+        else:
+            body = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+        raw_size = len(body)
+        compression = COMPRESSION_NONE
+        if self.compression != COMPRESSION_NONE and raw_size >= self.compress_threshold:
+            compressed = self._compress(body)
+            if len(compressed) < raw_size:
+                body, compression = compressed, self.compression
+
+        return bytes((FORMAT_VERSION, self.encoding, compression)) + body, raw_size
+
+    def decode(self, payload: Any) -> Tuple[Any, int]:
+        """解码数据，返回 (data, 未压缩字节数)；数据损坏时抛出 ValueError"""
+        if isinstance(payload, str):
+            # 旧格式：JSON 文本
+            return json.loads(payload), len(payload.encode("utf-8"))
+
+        payload = bytes(payload)
+        if len(payload) < 3 or payload[0] != FORMAT_VERSION:
+            return json.loads(payload), len(payload)
+
+        encoding, compression, body = payload[1], payload[2], payload[3:]
+        try:
+            if compression == COMPRESSION_ZLIB:
+                body = zlib.decompress(body)
+            elif compression == COMPRESSION_ZSTD:
+                if zstandard is None:
+                    raise ValueError("缓存条目使用 zstd 压缩，但未安装 zstandard")
+                body = zstandard.ZstdDecompressor().decompress(body)
+            elif compression != COMPRESSION_NONE:
+                raise ValueError(f"未知的压缩方式：{compression}")
+
+            if encoding == ENCODING_MSGPACK:
+                if msgpack is None:
+                    raise ValueError("缓存条目使用 msgpack 编码，但未安装 msgpack")
+                return msgpack.unpackb(body, raw=False), len(body)
+            if encoding == ENCODING_JSON:
+                return json.loads(body), len(body)
+        except _DECODE_ERRORS as e:
+            raise ValueError(f"缓存条目解码失败：{e}")
+        raise ValueError(f"未知的编码方式：{encoding}")
+
+    def _compress(self, body: bytes) -> bytes:
+        """压缩编码后的数据"""
+        if self.compression == COMPRESSION_ZSTD:
+            return zstandard.ZstdCompressor(level=self.level).compress(body)
+        return zlib.compress(body, self.level)
+
+
+def default_serializer(encoding: Optional[str] = None, compression: Optional[str] = None) -> CacheSerializer:
+    """按环境变量创建序列化器"""
+    return CacheSerializer(
+        encoding=encoding or os.getenv("WECHAT_CACHE_ENCODING", "json"),
+        compression=compression or os.getenv("WECHAT_CACHE_COMPRESSION", "zlib"),
+        compress_threshold=env_int("WECHAT_CACHE_COMPRESS_THRESHOLD", 1024),
+        level=env_int("WECHAT_CACHE_COMPRESS_LEVEL", 3)
+    )